@@ -1,33 +1,151 @@
 import sqlite3
 import os
+import codecs
+import bisect
+import csv
+import gzip
+import hashlib
+import io
 import json
-from flask import Flask, jsonify, request, send_from_directory
+import logging
+import logging.handlers
+import mimetypes
+import multiprocessing
+import queue
+import random
+import re
+import secrets
+import shutil
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter, OrderedDict, deque
+from datetime import date, timedelta
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import lru_cache
+import click
+from flask import Blueprint, Flask, Response, current_app, g, has_request_context, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai import types # 🌟 نحتاجها لـ Schema
-# 🌟🌟🌟 إزالة: from google.generativeai.tools import GoogleSearchRetrieval # هذا المسار غير موجود في إصدارك
+try:
+    import orjson  # اختياري: أسرع عدة مرات من json في ترميز الاستجابات
+except ImportError:
+    orjson = None
+# 🌟 google.generativeai يُستورد عند أول استدعاء للذكاء الاصطناعي (gemini_sdk) لا عند تشغيل العملية
+# و numpy عند أول حساب لأسعار المقارنة (PriceEngine)
 
 # ----------------------------------------------------
 # 1. إعدادات Gemini و Flask
 # ----------------------------------------------------
 load_dotenv()
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
 
-DATABASE_FILE = "my_app_data.db"
+DATABASE_FILE = os.environ.get("DATABASE_FILE", "my_app_data.db")
+
+# 🌟 إعدادات طبقة الاتصال بـ SQLite (يمكن تعديلها من متغيرات البيئة)
+# DB_POOL_SIZE=0 يعيد السلوك القديم: اتصال جديد لكل عملية
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+DB_BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", 5.0))          # بالثواني
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 64 * 1024 * 1024))     # بالبايت
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", 16 * 1024))    # بالكيلوبايت لكل اتصال
+DB_STATEMENT_CACHE = int(os.environ.get("DB_STATEMENT_CACHE", 256))      # عدد الاستعلامات المُجهزة المحفوظة
+# DB_GROUP_COMMIT=1 يمرر إدراج الحجوزات والمفضلة عبر كاتب وحيد يجمعها في معاملة واحدة
+DB_GROUP_COMMIT = os.environ.get("DB_GROUP_COMMIT", "0") == "1"
+DB_GROUP_COMMIT_MAX_BATCH = int(os.environ.get("DB_GROUP_COMMIT_MAX_BATCH", 256))
+DB_GROUP_COMMIT_MAX_DELAY = float(os.environ.get("DB_GROUP_COMMIT_MAX_DELAY", 0.0002))  # بالثواني، 0 = ما في الطابور فقط
+
+# 🌟 إعدادات ذاكرة نتائج تحليل Gemini المؤقتة
+ANALYSIS_CACHE_TTL = float(os.environ.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))  # بالثواني
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", 50000))  # في SQLite
+ANALYSIS_CACHE_MEMORY_SIZE = int(os.environ.get("ANALYSIS_CACHE_MEMORY_SIZE", 1000))    # الطبقة الساخنة في الذاكرة
+
+# 🌟 جلسات الدردشة على الخادم: سجل محدود بميزانية رموز، والأدوار القديمة تُلخص تلقائياً
+CHAT_TOKEN_BUDGET = int(os.environ.get("CHAT_TOKEN_BUDGET", 2000))            # رموز السجل المرسل مع كل رسالة (ملخص + أحدث الأدوار)
+CHAT_KEEP_MESSAGES = int(os.environ.get("CHAT_KEEP_MESSAGES", 6))            # رسائل تبقى حرفية بعد التلخيص
+CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get("CHAT_SUMMARY_MAX_TOKENS", 300))  # حد طول الملخص
+CHAT_SESSIONS_MEMORY = int(os.environ.get("CHAT_SESSIONS_MEMORY", 1000))     # جلسات نشطة في الذاكرة، والبقية في SQLite
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", 7 * 24 * 3600))  # بالثواني منذ آخر رسالة
+CHAT_PROMPT_MAX_CHARS = 4000
+
+# 🌟 إعدادات مجمع خيوط Gemini (عزل استدعاءات الذكاء الاصطناعي عن مسارات CRUD)
+GEMINI_WORKERS = int(os.environ.get("GEMINI_WORKERS", 4))
+GEMINI_MAX_QUEUE = int(os.environ.get("GEMINI_MAX_QUEUE", 16))
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 30))             # بالثواني، يشمل الانتظار في الطابور
+ANALYZE_BATCH_CONCURRENCY = int(os.environ.get("ANALYZE_BATCH_CONCURRENCY", 4))  # لكل طلب تحليل جماعي
+ANALYZE_BATCH_MAX = int(os.environ.get("ANALYZE_BATCH_MAX", 50))                  # أقصى عدد حجوزات في الطلب
+
+FAVORITES_BATCH_MAX = int(os.environ.get("FAVORITES_BATCH_MAX", 500))
+
+# 🌟 تصدير واستيراد الحجوزات بالجملة
+BOOKINGS_EXPORT_CHUNK = int(os.environ.get("BOOKINGS_EXPORT_CHUNK", 2000))    # صفوف لكل استعلام/دفعة مكتوبة
+BOOKINGS_IMPORT_BATCH = int(os.environ.get("BOOKINGS_IMPORT_BATCH", 10000))   # صفوف لكل معاملة استيراد
+BOOKINGS_IMPORT_MAX_ERRORS = 20                                               # أخطاء تُعاد في التقرير
+# حجزان متقاطعان للمستخدم نفسه مرفوضان (409)؛ إعداد خادم فقط، لا يملك العميل تجاوزه
+BOOKINGS_ALLOW_OVERLAP = os.environ.get("BOOKINGS_ALLOW_OVERLAP", "0") == "1"
+
+# 🌟 ترقيم قوائم الحجوزات والمفضلة (after_id/limit)
+COLLECTION_PAGE_SIZE = int(os.environ.get("COLLECTION_PAGE_SIZE", 50))
+COLLECTION_MAX_PAGE_SIZE = int(os.environ.get("COLLECTION_MAX_PAGE_SIZE", 200))
 
-# 🌟 تحسين: تحديد مجلد 'static' لتقديم ملفات الواجهة الأمامية (HTML/JS/CSS)
-# هذا يحل مشكلة file:/// و CORS
-app = Flask(__name__, static_folder='static', static_url_path='')
+# 🌟 ذاكرة قوائم الحجوزات والمفضلة لكل مستخدم (داخل DBManager)، محدودة بعدد الصفوف المخزنة
+COLLECTION_CACHE_MAX_ROWS = int(os.environ.get("COLLECTION_CACHE_MAX_ROWS", 100000))  # 0 يعطلها
 
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_very_secret_key_for_session')
-CORS(app, supports_credentials=True)
+# 🌟 تجزئة كلمات المرور خارج خيط الطلب
+# الطريقة والتكلفة بصيغة werkzeug: "scrypt:N:r:p" أو "pbkdf2:sha256:iterations"
+# تغييرها يرقّي التجزئات المخزنة تلقائياً عند أول تسجيل دخول ناجح
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))  # 0 = في خيط الطلب
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 5))  # بالثواني، يشمل الانتظار
+
+# 🌟 الملفات الثابتة المبنية (flask build-assets): أسماء ببصمة المحتوى + نسخ gzip/brotli مضغوطة مسبقاً
+ASSETS_BUILD_DIR = os.environ.get("ASSETS_BUILD_DIR",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "static"))
+ASSETS_IMMUTABLE_MAX_AGE = 365 * 24 * 3600                                    # بالثواني
+ASSETS_COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".txt"}      # الصور مضغوطة أصلاً
+
+# 🌟 ضغط استجابات API الكبيرة (قوائم الحجوزات، تقارير التحليل) بـ gzip
+API_GZIP_MIN_SIZE = int(os.environ.get("API_GZIP_MIN_SIZE", 1024))   # بالبايت، 0 يعطله
+API_GZIP_LEVEL = int(os.environ.get("API_GZIP_LEVEL", 5))            # 1-9: المستويات الأعلى بطيئة بفائدة ضئيلة
+
+# 🌟 القياسات بصيغة Prometheus على /api/metrics (لكل عملية عاملة)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"       # 0 يلغي قياس استعلامات SQLite
+# إن وُجد: Authorization: Bearer <token>؛ بدونه القياسات والمُحلل من loopback المباشر فقط (لا عبر وكيل)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+# المُحلل بالعينات: يُفعّل لطلب واحد بالترويسة X-Profile: 1 (معطل افتراضياً)
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))    # بالثواني بين العينات
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))                 # آخر النتائج المحفوظة للجلب
+
+# 🌟 محرك مقارنة الأسعار (NumPy): مصفوفة فنادق × مواقع × أيام تُحسب على دفعات وتُنشر كلقطات بإصدار
+PRICE_ENGINE_DAYS = int(os.environ.get("PRICE_ENGINE_DAYS", 14))              # أيام المقارنة بدءاً من اليوم
+PRICE_ENGINE_CHUNK = int(os.environ.get("PRICE_ENGINE_CHUNK", 2048))          # فنادق لكل تمريرة متجهة
+PRICE_SNAPSHOT_MAX_AGE = int(os.environ.get("PRICE_SNAPSHOT_MAX_AGE", 300))   # بالثواني قبل إعادة فحص الكتالوج
+PRICE_QUERY_MAX_HOTELS = 50                                                    # hotel_id في الطلب الواحد
+
+# 🌟 السجلات المنظمة: سطر JSON لكل حدث يُكتب من خيط خلفي، وأحداث النجاح الكثيفة تؤخذ بالعينات
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))           # سجلات تنتظر الكتابة قبل إسقاط INFO
+LOG_BLOCK_TIMEOUT = float(os.environ.get("LOG_BLOCK_TIMEOUT", 1.0))      # بالثواني: انتظار WARNING فما فوق لمكان في الطابور
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))          # نسبة أحداث النجاح المكتوبة (0-1)
+# نسب لكل حدث تتقدم على LOG_SAMPLE_RATE، مثل: "login_succeeded=0.1,http_request=0"
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "http_request=0.01")
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# 🌟 إعدادات ذاكرة المستخدمين المؤقتة (user_loader)
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 300))            # بالثواني
+
+# 🌟 المسارات وأوامر CLI تُسجل على Blueprint ويُبنى التطبيق في create_app() (انظر القسم 9)
+# cli_group=None يبقي الأوامر في المستوى الأعلى: flask export-bookings
+bp = Blueprint('restavo', __name__, cli_group=None)
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login' # 🌟 سيقوم Flask-Login بإعادة التوجيه إلى هنا (يفترض أنه مسار API)
+login_manager.login_view = 'restavo.login' # 🌟 سيقوم Flask-Login بإعادة التوجيه إلى هنا (يفترض أنه مسار API)
 # 🌟 ملاحظة: يمكننا لاحقاً جعل هذا يعيد خطأ 401 بدلاً من إعادة التوجيه
 @login_manager.unauthorized_handler
 def unauthorized():
@@ -42,442 +160,3361 @@ class User(UserMixin):
         self.id = id
         self.username = username
 
+class LRUCache:
+    """ذاكرة مؤقتة محدودة الحجم (LRU) مع مدة صلاحية (TTL) وعدادات إصابة/إخفاق، آمنة بين الخيوط."""
+
+    def __init__(self, maxsize: int, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# ----------------------------------------------------
+# 🌟 القياسات (عدادات ومدرجات بصيغة Prometheus النصية)
+# ----------------------------------------------------
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class MetricCounter:
+    """عداد تراكمي لكل مجموعة قيم من الوسوم (labels)."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labels, values)} {total}" for values, total in items]
+
+
+class MetricHistogram:
+    """مدرج تكراري بحدود ثابتة (le) مع المجموع والعدد، لكل مجموعة قيم من الوسوم."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [عدد كل حد..., ما فوق آخر حد, المجموع]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((values, list(series)) for values, series in self._series.items())
+        lines = []
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), values + (bound,))} {cumulative}")
+            labels = format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """يجمع العدادات والمدرجات، ويعرض أيضاً القيم العددية من دوال stats() المسجلة كـ gauges."""
+
+    def __init__(self, prefix="restavo"):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = {}
+
+    def counter(self, name, help_text, labels=()):
+        metric = MetricCounter(f"{self.prefix}_{name}", help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = MetricHistogram(f"{self.prefix}_{name}", help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, stats):
+        """stats() تعيد قاموساً؛ كل قيمة عددية فيه تظهر باسم prefix_name_key."""
+        self._collectors[name] = stats
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for name, stats in self._collectors.items():
+            try:
+                values = stats()
+            except Exception:
+                logger.exception("تعذر جمع قياسات %s", name)
+                continue
+            for key, value in (values or {}).items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                gauge = f"{self.prefix}_{name}_{key}"
+                lines.append(f"# TYPE {gauge} gauge")
+                lines.append(f"{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "زمن معالجة الطلب حتى إرجاع الاستجابة (دون جسم البث).",
+    ("method", "route", "status"))
+db_query_seconds = metrics.histogram(
+    "db_query_duration_seconds", "زمن تنفيذ استعلامات SQLite حسب نوع العملية.", ("operation",), DB_BUCKETS)
+db_rows = metrics.counter("db_rows_total", "الصفوف المقروءة أو المعدلة في SQLite.", ("operation",))
+db_errors = metrics.counter("db_query_errors_total", "استعلامات SQLite الفاشلة.", ("operation",))
+password_hash_seconds = metrics.histogram(
+    "password_hash_duration_seconds", "زمن تجزئة/تحقق كلمة المرور شاملاً الانتظار في الطابور.", ("operation",))
+gemini_call_seconds = metrics.histogram(
+    "gemini_call_duration_seconds", "زمن استدعاءات generate_content (حتى آخر جزء في البث).",
+    ("model", "outcome"))
+gemini_tokens = metrics.counter("gemini_tokens_total", "رموز Gemini المستهلكة من usage_metadata.", ("model", "kind"))
+gemini_errors = metrics.counter("gemini_errors_total", "أخطاء استدعاء Gemini حسب نوع الاستثناء.", ("model", "error"))
+log_records = metrics.counter(
+    "log_records_total", "سجلات التطبيق حسب المستوى والمصير (queued/sampled_out/dropped).", ("level", "outcome"))
+
+
+# ----------------------------------------------------
+# 🌟 السجلات المنظمة (JSON) عبر طابور: خيط الطلب يضع السجل فقط، والتنسيق والكتابة في خيط خلفي
+# ----------------------------------------------------
+class RequestContextFilter(logging.Filter):
+    """يضيف request_id من g في خيط الطلب نفسه، قبل الطابور (g غير متاح في خيط الكتابة)."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = g.get("request_id") if has_request_context() else None
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    """سطر JSON لكل سجل: الوقت والمستوى والحدث ورقم الطلب، ثم الحقول الإضافية (fields) في المستوى نفسه."""
+
+    def format(self, record):
+        entry = dict(getattr(record, "fields", None) or ())
+        entry.update({
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "event": getattr(record, "event", None) or record.funcName,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "pid": record.process,
+        })
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler بطابور محدود أمام QueueListener يكتب إلى target في خيط خلفي.
+
+    الطابور ممتلئ (مخرج بطيء): سجلات ما دون WARNING تُسقط وتُعد بدل أن توقف الطلب، والتحذيرات
+    والأخطاء تنتظر مكاناً حتى LOG_BLOCK_TIMEOUT فلا تضيع. الخيط يبدأ عند أول سجل، ومن جديد في
+    العملية الابنة بعد fork (خيط الأب لا ينتقل مع fork)، لذا لا يحتاج عمال gunicorn إعداداً إضافياً.
+    """
+
+    def __init__(self, target, maxsize=LOG_QUEUE_SIZE, block_timeout=LOG_BLOCK_TIMEOUT):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self.addFilter(RequestContextFilter())
+
+    def start(self):
+        with self._start_lock:
+            if self._listener is None or self._pid != os.getpid():
+                # طابور جديد أيضاً: ما بقي في طابور الأب يكتبه الأب، وأقفاله قد تكون محجوزة لحظة fork
+                self.queue = queue.Queue(self.maxsize)
+                self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+        return self
+
+    def stop(self):
+        """يكتب ما في الطابور ثم يوقف الخيط؛ السجلات اللاحقة تُكتب مباشرة (إيقاف العملية)."""
+        with self._start_lock:
+            self._closed = True
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+
+    def prepare(self, record):
+        # 🌟 السجل يبقى في نفس العملية: لا تنسيق للرسالة ولا للـ traceback في خيط الطلب
+        return record
+
+    def enqueue(self, record):
+        if self._closed:
+            self.target.handle(record)
+            return
+        if self._listener is None or self._pid != os.getpid():
+            self.start()
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._start_lock:
+                self.dropped += 1
+            log_records.inc(record.levelname, "dropped")
+            return
+        log_records.inc(record.levelname, "queued")
+
+    def close(self):
+        self.stop()
+        super().close()
+
+    def stats(self):
+        return {"queued": self.queue.qsize(), "maxsize": self.maxsize, "dropped": self.dropped,
+                "running": self._listener is not None and self._pid == os.getpid()}
+
+
+def parse_sample_rates(spec):
+    """يحول "event=rate,event=rate" إلى {event: rate}؛ القيم تُحصر بين 0 و1."""
+    rates = {}
+    for item in (spec or "").split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+logger = logging.getLogger("restavo")
+log_handler = None
+log_sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    """يثبت معالج الطابور مرة واحدة على مسجل restavo ويعيده (الاستدعاءات اللاحقة تغير المستوى فقط)."""
+    global log_handler
+    logger.setLevel(level)
+    if log_handler is None:
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JsonLogFormatter())
+        log_handler = NonBlockingQueueHandler(target)
+        logger.addHandler(log_handler)
+        logger.propagate = False
+    return log_handler
+
+
+def log_event(event, message, level=logging.INFO, exc_info=None, **fields):
+    """سجل منظم باسم حدث ثابت وحقول إضافية.
+
+    🌟 أحداث النجاح (ما دون WARNING) تؤخذ بالعينات حسب LOG_SAMPLE_RATES/LOG_SAMPLE_RATE قبل إنشاء
+    السجل أصلاً، مع sample_rate في السطر المكتوب لإعادة الوزن عند التجميع. التحذيرات والأخطاء تُكتب دائماً.
+    request_id يُمرر صراحة من المولّدات التي تعمل بعد انتهاء سياق الطلب (البث).
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = log_sample_rates.get(event, LOG_SAMPLE_RATE)
+        if rate < 1.0:
+            if random.random() >= rate:
+                log_records.inc(logging.getLevelName(level), "sampled_out")
+                return
+            fields["sample_rate"] = rate
+    extra = {"event": event, "fields": fields}
+    if "request_id" in fields:
+        extra["request_id"] = fields.pop("request_id")
+    logger.log(level, message, exc_info=exc_info, extra=extra)
+
+
+configure_logging()
+
+
+class PasswordHasherBusy(Exception):
+    """عمال التجزئة مشغولون والطابور ممتلئ (أو انتهت المهلة، أو تعطل المجمع وأُعيد إنشاؤه)."""
+
+
+class PasswordHasher:
+    """تجزئة كلمات المرور والتحقق منها في مجمع عمليات محدود بدلاً من خيط الطلب.
+
+    scrypt/pbkdf2 عمليات CPU تحتجز الـ GIL جزئياً؛ تشغيلها في عمليات منفصلة يترك خيوط الخادم
+    لبقية الطلبات أثناء موجات تسجيل الدخول. عدد المهام المعلقة محدود حتى لا تتراكم بلا نهاية.
+    العمال تبدأ بـ forkserver (أو spawn) لا fork: عامل gunicorn متعدد الخيوط، ونسخه بـ fork قد يورث
+    أقفالاً محجوزة. وإن قُتل عامل (OOM/SIGKILL) يتعطل المجمع كله، فيُستبدل بمجمع جديد ويُعاد
+    PasswordHasherBusy (503) بدلاً من أن يبدو الفشل كلمة مرور خاطئة.
+    """
+
+    def __init__(self, method: str = PASSWORD_HASH_METHOD, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING, timeout: float = PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._prefix = None
+        self._prefix_future = None
+        self.rejected = 0
+        self.restarts = 0
+
+    def _executor(self):
+        with self._lock:
+            # يُنشأ عند أول استخدام، ومن جديد في العملية الابنة بعد fork (مجمع الأب لا يعمل فيها)
+            if self._pool is None or self._pid != os.getpid():
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                if context.get_start_method() == "forkserver":
+                    context.set_forkserver_preload(["werkzeug.security"])  # العمال تبدأ والتجزئة مستوردة
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pid = os.getpid()
+                if self._prefix is None:
+                    # 🌟 بادئة الطريقة الحالية تحتاج تجزئة كاملة، فتُحسب في العامل لا في خيط أول طلب
+                    self._prefix_future = self._pool.submit(generate_password_hash, "", self.method)
+            return self._pool
+
+    def _discard(self, pool):
+        """يُسقط مجمعاً متعطلاً (إن لم يستبدله خيط آخر بعد) ليُنشأ غيره عند الاستدعاء التالي."""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, operation, fn, *args):
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            # 🌟 بلا انتظار عند امتلاء الطابور (مثل GeminiExecutor): موجة تسجيل دخول لا تحتجز خيوط الخادم
+            if not self._slots.acquire(blocking=False):
+                with self._lock:
+                    self.rejected += 1
+                raise PasswordHasherBusy()
+            pool = self._executor()
+            try:
+                return pool.submit(fn, *args).result(timeout=self.timeout)
+            except FutureTimeoutError:
+                with self._lock:
+                    self.rejected += 1
+                raise PasswordHasherBusy()
+            except BrokenProcessPool:
+                logger.error("تعطل مجمع تجزئة كلمات المرور (عامل أُنهي فجأة)؛ سيُعاد إنشاؤه")
+                self._discard(pool)
+                raise PasswordHasherBusy()
+            finally:
+                self._slots.release()
+        finally:
+            password_hash_seconds.observe(time.perf_counter() - started, operation)
+
+    def hash(self, password):
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run("verify", check_password_hash, password_hash, password)
+
+    def stats(self):
+        return {"workers": self.workers, "rejected": self.rejected, "restarts": self.restarts}
+
+    def _hash_prefix(self):
+        # werkzeug يكمل المعاملات الافتراضية في البادئة المخزنة ("scrypt" -> "scrypt:32768:8:1")
+        if self._prefix is None:
+            if self.workers <= 0:
+                self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+            else:
+                # طُلبت عند إنشاء المجمع؛ إن سقطت مع مجمع متعطل فالمجمع التالي يطلبها من جديد
+                future = self._prefix_future
+                if future is not None and future.done() and not future.cancelled() and future.exception() is None:
+                    self._prefix = future.result().split("$", 1)[0]
+        return self._prefix
+
+    def needs_rehash(self, password_hash):
+        """هل خُزنت التجزئة بطريقة/تكلفة غير الحالية؟ False حتى تجهز البادئة (تُرقى في الدخول التالي)."""
+        prefix = self._hash_prefix()
+        return prefix is not None and password_hash.split("$", 1)[0] != prefix
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
+
+# 🌟 تحسين: ذاكرة مؤقتة لهوية المستخدم حتى لا يكلف كل طلب مصادق عليه استعلاماً في SQLite
+user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 @login_manager.user_loader
 def load_user(user_id):
-    conn = None
     try:
-        # 🌟 تحسين: استخدام دالة مخصصة لضمان فتح/إغلاق الاتصال
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        if user_data:
-            return User(user_data[0], user_data[1])
-        return None
-    except Exception as e:
-        print(f"خطأ في load_user: {e}")
+        user_id = int(user_id)
+    except (TypeError, ValueError):
         return None
-    finally:
-        if conn:
-            conn.close()
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    user = db_manager.fetch_user_by_id(user_id)
+    if user:
+        user_cache.set(user_id, user)
+    return user
 
 # ----------------------------------------------------
 # 3. كلاس إدارة قاعدة البيانات (تمت إعادة هيكلته وإصلاحه)
 # ----------------------------------------------------
+@lru_cache(maxsize=1024)
+def sql_operation(sql):
+    """نوع الاستعلام (SELECT/INSERT/...) كوسم للقياسات؛ نص الاستعلام نفسه يرفع عدد السلاسل بلا حد."""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else "EMPTY"
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """مؤشر SQLite يسجل زمن كل استعلام وعدد الصفوف المقروءة/المعدلة في القياسات."""
+
+    def _timed(self, method, sql, parameters):
+        operation = sql_operation(sql)
+        started = time.perf_counter()
+        try:
+            result = method(sql, parameters)
+        except sqlite3.Error:
+            db_errors.inc(operation)
+            raise
+        finally:
+            db_query_seconds.observe(time.perf_counter() - started, operation)
+        if self.rowcount > 0:
+            db_rows.inc(operation, amount=self.rowcount)
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            db_rows.inc("SELECT")
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        db_rows.inc("SELECT", amount=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        db_rows.inc("SELECT", amount=len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        db_rows.inc("SELECT")
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """اتصال يمرر execute() عبر InstrumentedCursor ويقيس زمن الـ commit (حيث يقع fsync)."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            db_query_seconds.observe(time.perf_counter() - started, "COMMIT")
+
+
+class ConnectionPool:
+    """مجمع اتصالات SQLite طويلة العمر وآمن للاستخدام من عدة خيوط (threads)."""
+
+    def __init__(self, connect, size: int, timeout: float = DB_BUSY_TIMEOUT):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        # LIFO: الاتصال الأحدث استخداماً يملك ذاكرة الصفحات الأدفأ
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        # 🌟 جميع الاتصالات مشغولة: ننتظر عودة أحدها بدلاً من فتح اتصال جديد
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("انتهت مهلة انتظار اتصال متاح بقاعدة البيانات.")
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                # لا نعيد اتصالاً بمعاملة مفتوحة إلى المجمع
+                conn.rollback()
+        except sqlite3.Error:
+            # اتصال تالف: نغلقه ونسمح بإنشاء بديل له
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put_nowait(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+class GroupCommitWriter:
+    """كاتب وحيد (write-behind) يجمع عمليات الكتابة المعلقة في معاملة واحدة (group commit).
+
+    كل عملية دالة fn(cursor, *args) تُنفذ داخل SAVEPOINT خاص بها: فشل إحداها لا يلغي البقية.
+    النتيجة (مثل lastrowid) أو الاستثناء يصل للمستدعي عبر Future بعد نجاح الـ commit فقط.
+    """
+
+    # حدود مدرج أحجام الدفعات
+    BATCH_BUCKETS = (1, 4, 16, 64, 256)
+
+    def __init__(self, connect, max_batch: int = DB_GROUP_COMMIT_MAX_BATCH,
+                 max_delay: float = DB_GROUP_COMMIT_MAX_DELAY):
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = None
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self.commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        self.batch_histogram = {bound: 0 for bound in self.BATCH_BUCKETS + (float("inf"),)}
+        self._thread = threading.Thread(target=self._run, name="db-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("كاتب قاعدة البيانات متوقف.")
+            self._queue.put((fn, args, future))
+        return future
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self):
+        """ينتظر أول عملية ثم يضم كل ما وصل حتى max_batch أو انقضاء max_delay."""
+        first = self._queue.get()
+        if first is None:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._commit(batch)
+        if self._conn is not None:
+            self._conn.close()
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            if self._conn is None:
+                # اتصال مخصص للكاتب خارج المجمع حتى لا يزاحم القراء
+                self._conn = self._connect()
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute('SAVEPOINT group_write')
+                try:
+                    outcomes.append((future, True, fn(cursor, *args)))
+                    cursor.execute('RELEASE group_write')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO group_write')
+                    cursor.execute('RELEASE group_write')
+                    outcomes.append((future, False, e))
+            self._conn.commit()
+        except Exception as e:
+            logger.exception("خطأ في الكتابة الجماعية لقاعدة البيانات")
+            try:
+                self._conn.rollback()
+            except Exception:
+                # اتصال تالف: يُفتح غيره مع الدفعة التالية
+                self._conn = None
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            with self._lock:
+                self.failed += len(batch)
+            return
+
+        elapsed = time.perf_counter() - started
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        with self._lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.commit_seconds += elapsed
+            self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+            self.batch_histogram[next(b for b in self.batch_histogram if len(batch) <= b)] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "writes": self.writes,
+                "failed": self.failed,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": round(self.writes / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "avg_commit_ms": round(self.commit_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+                "max_commit_ms": round(self.max_commit_seconds * 1000, 3),
+                "batch_histogram": {str(b): n for b, n in self.batch_histogram.items()},
+            }
+
+
+class CollectionCache:
+    """ذاكرة write-through لقوائم كل مستخدم (الحجوزات/المفضلة)، محدودة بعدد الصفوف مع إخلاء LRU.
+
+    القارئ يأخذ رقم جيل المدخل قبل الاستعلام، والكتابة ترفع الجيل بعد الـ commit؛ فإذا تزامنتا
+    لا تُحفظ نتيجة القراءة القديمة ولا تعود بيانات سابقة إلى الذاكرة.
+    كل مدخل مربوط بإصدار المجموعة المقروء من SQLite: كتابة من عامل آخر ترفع الإصدار فيُفرغ المدخل
+    عند أول قراءة بعدها، لأن الإبطال المحلي لا يصل إلى ذاكرة العمليات الأخرى.
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._data = OrderedDict()  # (collection, user_id) -> {"generation", "values": {slot: value}, "rows"}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    def lookup(self, key, slot, version):
+        """يعيد (القيمة، None) عند الإصابة أو (None، رقم الجيل) عند الإخفاق لتمريره إلى store.
+
+        version إصدار المجموعة الحالي في SQLite (None عند تعذر قراءته: لا ذاكرة لهذا الطلب).
+        """
+        if self.max_rows <= 0 or version is None:
+            return None, None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                # المدخل نفسه يُحسب بصف واحد حتى يبقى عدد المستخدمين المتتبعين محدوداً
+                self._generation += 1
+                entry = self._data[key] = {"generation": self._generation, "version": version, "values": {}, "rows": 1}
+                self.rows += 1
+                self._evict()
+            elif entry["version"] != version:
+                # كتابة من عملية أخرى (أو قراءة سابقة لكتابة محلية): الصفحات المحفوظة لإصدار آخر
+                self._reset(entry)
+                entry["version"] = version
+                self.stale += 1
+            self._data.move_to_end(key)
+            value = entry["values"].get(slot)
+            if value is not None:
+                self.hits += 1
+                return value, None
+            self.misses += 1
+            return None, entry["generation"]
+
+    def store(self, key, generation, slot, value, rows=0):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry["generation"] != generation:
+                return
+            # كل قيمة تُحسب بصف واحد على الأقل حتى تبقى الصفحات الفارغة والإصدارات محدودة أيضاً
+            weight = rows + 1
+            if entry["values"].get(slot) is None:
+                entry["rows"] += weight
+                self.rows += weight
+            entry["values"][slot] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while self.rows > self.max_rows and self._data:
+            _, evicted = self._data.popitem(last=False)
+            self.rows -= evicted["rows"]
+            self.evictions += 1
+
+    def _reset(self, entry):
+        self._generation += 1
+        entry["generation"] = self._generation
+        self.rows -= entry["rows"] - 1
+        entry["values"], entry["rows"] = {}, 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            self._reset(entry)
+            entry["version"] = None
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.rows = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._data),
+                "rows": self.rows,
+                "max_rows": self.max_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# 🌟 كتالوج الفنادق (تم نقله من script.js إلى الخادم) - يُستخدم فقط لتعبئة الجدول أول مرة
+BOOKING_SITES = ["Booking.com", "Expedia", "Hotels.com", "Direct Hotel"]
+
+SEED_HOTELS = [
+    {"name": "Grand View Towers", "city": "Dubai", "rating": 4.5, "amenities": ["مسبح", "واي فاي مجاني", "صالة رياضية"]},
+    {"name": "City Center Inn", "city": "Dubai", "rating": 3.8, "amenities": ["واي فاي مجاني", "فطور مجاني"]},
+    {"name": "Luxury Resort Oasis", "city": "Abu Dhabi", "rating": 5.0, "amenities": ["شاطئ خاص", "سبا", "مسبح"]},
+    {"name": "The Budget Stay", "city": "Abu Dhabi", "rating": 3.0, "amenities": ["موقف سيارات", "واي فاي مجاني"]},
+    {"name": "Nile Panorama Hotel", "city": "Cairo", "rating": 4.2, "amenities": ["إطلالة نهرية", "مطعم"]},
+    {"name": "Historical Boutique", "city": "Cairo", "rating": 4.0, "amenities": ["تراس", "فطور مجاني"]},
+    {"name": "Palm Beach Hotel", "city": "Dubai", "rating": 4.7, "amenities": ["وصول للشاطئ", "مسبح", "سبا"]},
+    {"name": "Desert Sands Villa", "city": "Abu Dhabi", "rating": 4.1, "amenities": ["صالة رياضية", "واي فاي مجاني"]},
+    {"name": "Four Seasons Hotel Nile Plaza", "city": "Cairo", "rating": 4.9, "amenities": ["سبا فاخر", "إطلالة على النيل", "مسبح على السطح"]},
+    {"name": "Marriott Mena House", "city": "Giza", "rating": 4.8, "amenities": ["إطلالة على الأهرامات", "حدائق", "مطعم فاخر"]},
+    {"name": "Sofitel Legend Old Cataract", "city": "Aswan", "rating": 5.0, "amenities": ["تاريخي", "إطلالة على النيل", "مسبح", "خدمة الأجنحة"]},
+    {"name": "Rixos Premium Seagate", "city": "Sharm El Sheikh", "rating": 4.6, "amenities": ["شامل كلياً", "أكوا بارك", "وصول للشاطئ"]},
+    {"name": "Hilton Luxor Resort & Spa", "city": "Luxor", "rating": 4.4, "amenities": ["سبا", "إطلالة نهرية", "مسبح إنفينيتي"]},
+    {"name": "The Oberoi Sahl Hasheesh", "city": "Hurghada", "rating": 4.8, "amenities": ["أجنحة فاخرة", "شاطئ خاص", "غوص"]},
+]
+
+HOTELS_PAGE_SIZE = 20
+HOTELS_MAX_PAGE_SIZE = 100
+
+
+def generate_simulated_prices(rating, rng):
+    # نفس منطق generateSimulatedPrices القديم في الواجهة، لكن بمولد ثابت حتى لا تتغير الأسعار مع كل تحميل
+    base_factor = int(rating * 50)
+    base_price = rng.randint(150 + base_factor, 450 + base_factor)
+    return {site: round(base_price * rng.uniform(0.95, 1.05)) for site in BOOKING_SITES}
+
+
+# 🌟 توحيد النص العربي للبحث: إزالة التشكيل والتطويل وتوحيد أشكال الألف والياء والتاء المربوطة
+_ARABIC_MARKS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_ARABIC_FOLD = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه"})
+
+def normalize_arabic(text):
+    return _ARABIC_MARKS.sub("", text or "").translate(_ARABIC_FOLD).lower()
+
+
+def build_fts_query(text):
+    """يحوّل نص البحث إلى تعبير FTS5: كل كلمة بادئة (prefix) ويجب أن تطابق جميعها."""
+    tokens = re.findall(r"\w+", normalize_arabic(text))
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def encode_hotels_cursor(price, hotel_id):
+    return f"{price}:{hotel_id}"
+
+
+def decode_hotels_cursor(cursor):
+    price, hotel_id = cursor.split(":", 1)
+    return float(price), int(hotel_id)
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MAX_ROWID = 2 ** 63 - 1
+
+
+def date_to_day(value):
+    """يحوّل تاريخ ISO (YYYY-MM-DD...) إلى رقم يوم صحيح منذ 1970-01-01 (قابل للفرز والفهرسة)، أو None."""
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError):
+        return None
+
+
+def day_to_date(day):
+    """عكس date_to_day: نص ISO (YYYY-MM-DD)."""
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+class BookingOverlap(Exception):
+    """حجز جديد يتقاطع مع حجوزات قائمة للمستخدم نفسه؛ conflicts = معرفاتها."""
+
+    def __init__(self, conflicts):
+        super().__init__(f"يتقاطع مع الحجوزات {conflicts}")
+        self.conflicts = conflicts
+
+
+# 🌟 أعمدة تصدير/استيراد الحجوزات (بنفس الترتيب في CSV)
+BOOKING_EXPORT_FIELDS = ("id", "user_id", "user_name", "hotel_name", "city",
+                         "check_in", "check_out", "price", "hotel_image_url")
+
+
+def validate_booking_record(record, user_id=None, user_name=None):
+    """يتحقق من سجل حجز مستورد ويعيد صف الإدراج، أو يرفع ValueError برسالة الخطأ.
+
+    user_id/user_name إذا مُررا يفرضان المالك بدلاً من قيم السجل (الاستيراد عبر الـ API).
+    """
+    if not isinstance(record, dict):
+        raise ValueError("السجل ليس كائناً")
+    for field in ("hotel_name", "city", "check_in", "check_out", "price"):
+        if record.get(field) in (None, ""):
+            raise ValueError(f"الحقل {field} مفقود")
+    if user_id is None:
+        try:
+            user_id = int(record.get("user_id"))
+        except (TypeError, ValueError):
+            raise ValueError("user_id غير صالح")
+        user_name = record.get("user_name") or ""
+    try:
+        price = float(record["price"])
+    except (TypeError, ValueError):
+        raise ValueError("السعر غير صالح")
+    if price < 0:
+        raise ValueError("السعر غير صالح")
+    check_in_day = date_to_day(record["check_in"])
+    check_out_day = date_to_day(record["check_out"])
+    if check_in_day is None or check_out_day is None:
+        raise ValueError("تاريخ غير صالح")
+    if check_out_day < check_in_day:
+        raise ValueError("تاريخ المغادرة قبل تاريخ الوصول")
+    # النص المخزن يُوحَّد إلى YYYY-MM-DD حتى يطابق أرقام الأيام دائماً
+    return (user_id, user_name, str(record["hotel_name"]), str(record["city"]),
+            day_to_date(check_in_day), day_to_date(check_out_day), price,
+            record.get("hotel_image_url") or None, check_in_day, check_out_day)
+
+
+def read_booking_records(lines, fmt):
+    """يقرأ سجلات الحجز من أسطر نصية (NDJSON أو CSV) واحداً تلو الآخر: يعيد (رقم السطر، السجل أو ValueError)."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            yield line_no, ValueError("JSON غير صالح")
+
+
+# 🌟 ترحيلات المخطط بالترتيب: الإصدار = موضع الترحيل في القائمة (يُحفظ في PRAGMA user_version)
+# لا تُعدَّل الترحيلات المطبقة أبداً؛ أي تغيير جديد يُضاف كعنصر جديد في نهاية القائمة.
+MIGRATIONS = [
+    # 1: الجداول الأساسية (IF NOT EXISTS لتبني قواعد البيانات الموجودة قبل نظام الترحيل)
+    [
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            user_name TEXT NOT NULL,
+            hotel_name TEXT NOT NULL,
+            city TEXT NOT NULL,
+            check_in TEXT NOT NULL,
+            check_out TEXT NOT NULL,
+            price REAL NOT NULL,
+            hotel_image_url TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS favorites (
+            user_id INTEGER NOT NULL,
+            item_name TEXT NOT NULL,
+            city TEXT NOT NULL,
+            added_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, item_name),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS hotels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            city TEXT NOT NULL COLLATE NOCASE,
+            rating REAL NOT NULL,
+            amenities TEXT NOT NULL,
+            prices TEXT NOT NULL,
+            cheapest_price REAL NOT NULL,
+            cheapest_site TEXT NOT NULL,
+            image_url TEXT,
+            UNIQUE (name, city)
+        )''',
+        # 🌟 قوائم مرتبة مسبقاً لكل مدينة حسب السعر: الاستعلام يقرأ الفهرس بالترتيب دون فرز
+        'CREATE INDEX IF NOT EXISTS idx_hotels_city_price ON hotels (city, cheapest_price, id)',
+        'CREATE INDEX IF NOT EXISTS idx_hotels_price ON hotels (cheapest_price, id)',
+        # فهرس نصي كامل على الاسم والمرافق (النص مُوحَّد عربياً قبل الإدخال، rowid = hotels.id)
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS hotels_fts
+            USING fts5(name, amenities, tokenize = 'unicode61 remove_diacritics 2')''',
+        # 🌟 ذاكرة نتائج تحليل Gemini المؤقتة (المفتاح = بصمة المحتوى المُرسل للنموذج)
+        '''CREATE TABLE IF NOT EXISTS analysis_cache (
+            key TEXT PRIMARY KEY,
+            booking_id INTEGER,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_analysis_cache_booking ON analysis_cache (booking_id)',
+        'CREATE INDEX IF NOT EXISTS idx_analysis_cache_access ON analysis_cache (last_access)',
+    ],
+    # 2: فهرس حجوزات المستخدم بترتيب العرض (WHERE user_id = ? ORDER BY id DESC دون فحص كامل أو فرز)
+    [
+        'CREATE INDEX IF NOT EXISTS idx_bookings_user_id ON bookings (user_id, id DESC)',
+    ],
+    # 3: تمثيل التواريخ كأرقام قابلة للفرز والفهرسة
+    #    - bookings: check_in_day/check_out_day = عدد الأيام منذ 1970-01-01 (النص الأصلي يبقى للعرض)
+    #    - favorites: added_at = ثوانٍ منذ epoch (INTEGER) بدلاً من نص isoformat بالتوقيت المحلي
+    [
+        'ALTER TABLE bookings ADD COLUMN check_in_day INTEGER',
+        'ALTER TABLE bookings ADD COLUMN check_out_day INTEGER',
+        '''UPDATE bookings SET
+            check_in_day = CAST(julianday(substr(check_in, 1, 10)) - 2440587.5 AS INTEGER),
+            check_out_day = CAST(julianday(substr(check_out, 1, 10)) - 2440587.5 AS INTEGER)''',
+        'CREATE INDEX IF NOT EXISTS idx_bookings_user_check_in ON bookings (user_id, check_in_day)',
+        '''CREATE TABLE favorites_new (
+            user_id INTEGER NOT NULL,
+            item_name TEXT NOT NULL,
+            city TEXT NOT NULL,
+            added_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, item_name),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        '''INSERT INTO favorites_new (user_id, item_name, city, added_at)
+            SELECT user_id, item_name, city,
+                   COALESCE(CAST(strftime('%s', added_at, 'utc') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+            FROM favorites''',
+        'DROP TABLE favorites',
+        'ALTER TABLE favorites_new RENAME TO favorites',
+        'CREATE INDEX IF NOT EXISTS idx_favorites_user_added ON favorites (user_id, added_at)',
+    ],
+    # 4: عداد إصدار لكل مجموعة (حجوزات/مفضلة) لكل مستخدم يغذي ETag، وفهرس ترقيم المفضلة بـ rowid
+    [
+        '''CREATE TABLE IF NOT EXISTS collection_versions (
+            user_id INTEGER NOT NULL,
+            collection TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (user_id, collection)
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_favorites_user ON favorites (user_id)',
+    ],
+    # 5: فهرس R*Tree لفترات الحجز: بُعد للمستخدم (user_lo = user_hi) وبُعد للأيام [start_day, end_day)
+    #    فاستعلامات التقاطع والنطاق لكل مستخدم O(log n) بدل فحص الجدول. end_day = المغادرة، أو اليوم
+    #    التالي لحجز بلا ليالٍ. المشغلات تُبقيه متزامناً مع كل مسارات الكتابة (الإدراج الجماعي والاستيراد).
+    [
+        'CREATE VIRTUAL TABLE IF NOT EXISTS bookings_range USING rtree_i32(id, user_lo, user_hi, start_day, end_day)',
+        '''INSERT INTO bookings_range (id, user_lo, user_hi, start_day, end_day)
+            SELECT id, user_id, user_id, check_in_day, MAX(check_out_day, check_in_day + 1) FROM bookings
+            WHERE check_in_day IS NOT NULL AND check_out_day >= check_in_day''',
+        '''CREATE TRIGGER IF NOT EXISTS bookings_range_insert AFTER INSERT ON bookings
+            WHEN NEW.check_in_day IS NOT NULL AND NEW.check_out_day >= NEW.check_in_day
+            BEGIN
+                INSERT INTO bookings_range (id, user_lo, user_hi, start_day, end_day)
+                VALUES (NEW.id, NEW.user_id, NEW.user_id, NEW.check_in_day,
+                        MAX(NEW.check_out_day, NEW.check_in_day + 1));
+            END''',
+        '''CREATE TRIGGER IF NOT EXISTS bookings_range_delete AFTER DELETE ON bookings
+            BEGIN
+                DELETE FROM bookings_range WHERE id = OLD.id;
+            END''',
+        '''CREATE TRIGGER IF NOT EXISTS bookings_range_update AFTER UPDATE OF user_id, check_in_day, check_out_day ON bookings
+            BEGIN
+                DELETE FROM bookings_range WHERE id = OLD.id;
+                INSERT INTO bookings_range (id, user_lo, user_hi, start_day, end_day)
+                SELECT NEW.id, NEW.user_id, NEW.user_id, NEW.check_in_day, MAX(NEW.check_out_day, NEW.check_in_day + 1)
+                WHERE NEW.check_in_day IS NOT NULL AND NEW.check_out_day >= NEW.check_in_day;
+            END''',
+    ],
+    # 6: جلسات الدردشة: الملخص والعدادات في chat_sessions، والرسائل غير الملخصة في chat_messages
+    #    (إضافة فقط، فلا تتعارض رسائل متزامنة لنفس الجلسة من عمال مختلفين)
+    [
+        '''CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            summary TEXT NOT NULL DEFAULT '',
+            summary_tokens INTEGER NOT NULL DEFAULT 0,
+            summarized_through INTEGER NOT NULL DEFAULT 0,
+            last_message_id INTEGER NOT NULL DEFAULT 0,
+            turns INTEGER NOT NULL DEFAULT 0,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            compactions INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at)',
+        '''CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            text TEXT NOT NULL,
+            tokens INTEGER NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id)',
+    ],
+]
+
+# 🌟 حجوزات المستخدم التي تتقاطع فتراتها مع [start_day, end_day) عبر R*Tree (المعاملات: user, user, end, start)
+BOOKINGS_OVERLAP_SQL = '''
+    SELECT id FROM bookings_range
+    WHERE user_lo <= ? AND user_hi >= ? AND start_day < ? AND end_day > ?
+'''
+DAY_MIN, DAY_MAX = -(2 ** 31), 2 ** 31 - 1   # حدود إحداثيات rtree_i32
+
+# 🌟 الاستعلامات الساخنة التي يجب أن تستخدم فهرساً (يُفحص عند التشغيل بـ EXPLAIN QUERY PLAN)
+HOT_QUERIES = [
+    ("fetch_user_bookings",
+     "SELECT id FROM bookings WHERE user_id = ? ORDER BY id DESC", (0,)),
+    ("fetch_booking_by_id",
+     "SELECT id FROM bookings WHERE id = ? AND user_id = ?", (0, 0)),
+    ("fetch_user_bookings_page",
+     "SELECT id FROM bookings WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT 50", (0, 0)),
+    ("fetch_user_favorites",
+     "SELECT f.item_name FROM favorites f LEFT JOIN hotels h ON h.name = f.item_name AND h.city = f.city "
+     "WHERE f.user_id = ? AND f.rowid < ? ORDER BY f.rowid DESC LIMIT 50", (0, 0)),
+    ("bookings_overlap", BOOKINGS_OVERLAP_SQL, (0, 0, 0, 0)),
+    ("search_hotels",
+     "SELECT h.id FROM hotels h WHERE h.city = ? AND h.rating >= ? ORDER BY h.cheapest_price, h.id LIMIT 20", ("", 0)),
+]
+
+
 class DBManager:
-    def __init__(self, db_file: str):
+    def __init__(self, db_file: str, pool_size: int = DB_POOL_SIZE, group_commit: bool = DB_GROUP_COMMIT):
         self.db_file = db_file
-        # 🌟 استخدام check_same_thread=False ضروري لـ Flask
-        self.create_tables()
+        # 🌟 اتصالات يعاد استخدامها بين الطلبات بدلاً من فتح اتصال لكل عملية
+        self.pool = ConnectionPool(self.get_db_connection, pool_size) if pool_size > 0 else None
+        # 🌟 قوائم الحجوزات والمفضلة المقروءة مؤخراً؛ كل كتابة عليها تُبطل مدخل المستخدم بعد الـ commit
+        self.collections = CollectionCache(COLLECTION_CACHE_MAX_ROWS)
+        self.group_commit = group_commit
+        self._pid = os.getpid()
+        self._fork_lock = threading.Lock()
+        self.migrate()
+        self.verify_query_plans()
+        # 🌟 وضع الكتابة الجماعية (اختياري): معاملة واحدة لعدة إدراجات متزامنة
+        self.writer = GroupCommitWriter(self.get_db_connection) if group_commit else None
+
+    def _check_fork(self):
+        """بعد fork (مثل gunicorn --preload) تبدأ العملية الابنة بمجمع وكاتب خاصين بها.
+
+        اتصالات الأب لا تُستخدم ولا تُغلق في الابنة (إغلاقها قد يحرر أقفال SQLite التي يملكها الأب)،
+        وخيط الكاتب الجماعي لا ينتقل أصلاً عبر fork.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._fork_lock:
+            if self._pid == os.getpid():
+                return
+            if self.pool is not None:
+                self.pool = ConnectionPool(self.get_db_connection, self.pool.size)
+            if self.group_commit:
+                self.writer = GroupCommitWriter(self.get_db_connection)
+            self._pid = os.getpid()
 
     def get_db_connection(self):
-        # 🌟 دالة مساعدة لفتح اتصال جديد عند الحاجة
-        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        # 🌟 دالة مساعدة لفتح اتصال جديد مُهيأ بالكامل
+        # check_same_thread=False ضروري لأن الاتصال ينتقل بين خيوط الخادم عبر المجمع
+        conn = sqlite3.connect(self.db_file, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE,
+                               factory=InstrumentedConnection if METRICS_ENABLED else sqlite3.Connection)
         # استخدام row_factory يجعل النتائج كـ dicts (أسهل للـ JSON)
         conn.row_factory = sqlite3.Row
+        # WAL يسمح للقراء بالعمل بالتوازي مع كاتب واحد، و NORMAL آمن مع WAL ويوفر fsync لكل commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
         return conn
 
-    def create_tables(self):
-        conn = None
-        try:
+    @contextmanager
+    def connection(self):
+        """يستعير اتصالاً من المجمع ويعيده تلقائياً (أو يغلقه إن كان المجمع معطلاً)."""
+        self._check_fork()
+        if self.pool is None:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password_hash TEXT NOT NULL
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    user_name TEXT NOT NULL,
-                    hotel_name TEXT NOT NULL,
-                    city TEXT NOT NULL,
-                    check_in TEXT NOT NULL,
-                    check_out TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    hotel_image_url TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS favorites (
-                    user_id INTEGER NOT NULL,
-                    item_name TEXT NOT NULL,
-                    city TEXT NOT NULL,
-                    added_at TEXT NOT NULL,
-                    PRIMARY KEY (user_id, item_name),
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    def close(self):
+        self._check_fork()
+        if self.writer is not None:
+            self.writer.close()
+        if self.pool is not None:
+            self.pool.close_all()
+
+    def _write(self, fn, *args):
+        """ينفذ fn(cursor, *args) ويثبتها: عبر الكاتب الجماعي إن كان مفعلاً، وإلا في معاملة خاصة بها."""
+        self._check_fork()
+        if self.writer is not None:
+            return self.writer.submit(fn, *args).result()
+        with self.connection() as conn:
+            result = fn(conn.cursor(), *args)
             conn.commit()
-            print("تم إنشاء/تحقق جداول قاعدة البيانات بنجاح.")
+            return result
+
+    def migrate(self):
+        """يطبق ترحيلات المخطط المعلقة فقط؛ إذا كان PRAGMA user_version حديثاً لا يُنفذ أي DDL."""
+        try:
+            with self.connection() as conn:
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+                    return 0
+                # BEGIN IMMEDIATE: عمليات التشغيل المتزامنة (عدة workers) تنتظر بعضها ولا تطبق الترحيل مرتين
+                conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {target}')
+                conn.commit()
+                applied = len(MIGRATIONS) - version
+                log_event("db_migrated", f"تم ترحيل قاعدة البيانات من الإصدار {version} إلى {len(MIGRATIONS)}.",
+                          from_version=version, to_version=len(MIGRATIONS))
+        except Exception:
+            logger.exception("خطأ في ترحيل قاعدة البيانات")
+            return 0
+        if version == 0:
+            self.seed_hotels()
+        return applied
+
+    def verify_query_plans(self):
+        """فحص عند التشغيل: يتأكد عبر EXPLAIN QUERY PLAN أن الاستعلامات الساخنة تستخدم الفهارس."""
+        problems = []
+        try:
+            with self.connection() as conn:
+                for name, query, params in HOT_QUERIES:
+                    plan = " | ".join(row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+                    if "USE TEMP B-TREE" in plan or re.search(r"\bSCAN (bookings|favorites|hotels|h|f)\b(?! USING)", plan):
+                        problems.append(f"{name}: {plan}")
         except Exception as e:
-            print(f"خطأ في إنشاء الجداول: {e}")
-        finally:
-            if conn:
-                conn.close() # 🌟 إغلاق الاتصال
+            problems.append(f"تعذر فحص خطط الاستعلام: {e}")
+        for problem in problems:
+            logger.warning("خطة استعلام بدون فهرس مناسب - %s", problem)
+        return problems
 
     # ------------------------------------
     # 🌟 إصلاح: وظائف المفضلة (تم إصلاح منطق الاتصال)
     # ------------------------------------
     def is_favorite(self, user_id, item_name):
-        conn = None
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT 1 FROM favorites WHERE user_id = ? AND item_name = ?', (user_id, item_name))
-            return cursor.fetchone() is not None
-        except Exception as e:
-            print(f"خطأ في is_favorite: {e}")
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1 FROM favorites WHERE user_id = ? AND item_name = ?', (user_id, item_name))
+                return cursor.fetchone() is not None
+        except Exception:
+            logger.exception("خطأ في is_favorite")
             return False
-        finally:
-            if conn:
-                conn.close()
 
     def add_favorite(self, user_id, item_name, city):
-        from datetime import datetime
-        added_at = datetime.now().isoformat()
-        conn = None
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO favorites (user_id, item_name, city, added_at) VALUES (?, ?, ?, ?)',
-                                (user_id, item_name, city, added_at))
-            conn.commit()
+            self._write(self._add_favorite_tx, user_id, item_name, city, int(time.time()))
+            self.collections.invalidate(("favorites", user_id))
             return True
         except sqlite3.IntegrityError:
             # هذا يحدث إذا كان السجل موجودًا بالفعل
-            return True 
-        except Exception as e:
-            print(f"خطأ أثناء إضافة المفضلة: {e}")
+            return True
+        except Exception:
+            logger.exception("خطأ أثناء إضافة المفضلة")
             return False
-        finally:
-            if conn:
-                conn.close()
+
+    def _add_favorite_tx(self, cursor, user_id, item_name, city, added_at):
+        cursor.execute('INSERT INTO favorites (user_id, item_name, city, added_at) VALUES (?, ?, ?, ?)',
+                       (user_id, item_name, city, added_at))
+        self._bump_version(cursor, user_id, "favorites")
+        return True
 
     def remove_favorite(self, user_id, item_name):
-        conn = None
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM favorites WHERE user_id = ? AND item_name = ?', (user_id, item_name))
-            conn.commit()
-            return cursor.rowcount > 0
-        except Exception as e:
-            print(f"خطأ أثناء إزالة المفضلة: {e}")
+            removed = self._write(self._remove_favorite_tx, user_id, item_name)
+            if removed:
+                self.collections.invalidate(("favorites", user_id))
+            return removed
+        except Exception:
+            logger.exception("خطأ أثناء إزالة المفضلة")
             return False
-        finally:
-            if conn:
-                conn.close()
 
-    def fetch_user_favorites(self, user_id):
-        conn = None
+    def _remove_favorite_tx(self, cursor, user_id, item_name):
+        cursor.execute('DELETE FROM favorites WHERE user_id = ? AND item_name = ?', (user_id, item_name))
+        removed = cursor.rowcount > 0
+        if removed:
+            self._bump_version(cursor, user_id, "favorites")
+        return removed
+
+    def toggle_favorite(self, user_id, item_name, city):
+        """تبديل حالة المفضلة في معاملة واحدة: يعيد الحالة الجديدة (True/False) أو None عند الخطأ."""
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT item_name, city
-                FROM favorites
-                WHERE user_id = ?
-            ''', (user_id,))
-            # 🌟 تحويل النتائج (من conn.row_factory) إلى list of dicts
-            return [dict(row) for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"خطأ أثناء جلب مفضلات المستخدم: {e}")
+            is_favorite = self._write(self._toggle_favorite_tx, user_id, item_name, city, int(time.time()))
+            self.collections.invalidate(("favorites", user_id))
+            return is_favorite
+        except Exception:
+            logger.exception("خطأ أثناء تبديل المفضلة")
+            return None
+
+    def _toggle_favorite_tx(self, cursor, user_id, item_name, city, added_at):
+        # DELETE أولاً يحجز قفل الكتابة من أول عبارة (أو يمر بالكاتب الوحيد)، فلا تتسابق نقرتان على نفس العنصر
+        cursor.execute('DELETE FROM favorites WHERE user_id = ? AND item_name = ?', (user_id, item_name))
+        is_favorite = cursor.rowcount == 0
+        if is_favorite:
+            cursor.execute('INSERT INTO favorites (user_id, item_name, city, added_at) VALUES (?, ?, ?, ?)',
+                           (user_id, item_name, city, added_at))
+        self._bump_version(cursor, user_id, "favorites")
+        return is_favorite
+
+    def apply_favorites_batch(self, user_id, adds, removes):
+        """تطبيق عدة إضافات (item_name, city) وإزالات (item_name) في معاملة واحدة بـ executemany.
+
+        يعيد الحالة النهائية لكل عنصر تم لمسه {item_name: bool}، أو None عند الخطأ.
+        """
+        try:
+            self._write(self._apply_favorites_batch_tx, user_id, adds, removes, int(time.time()))
+            self.collections.invalidate(("favorites", user_id))
+        except Exception:
+            logger.exception("خطأ أثناء تطبيق دفعة المفضلة")
+            return None
+        state = {item_name: False for item_name in removes}
+        state.update({item_name: True for item_name, _ in adds})
+        return state
+
+    def _apply_favorites_batch_tx(self, cursor, user_id, adds, removes, added_at):
+        conn = cursor.connection
+        changes_before = conn.total_changes
+        cursor.executemany('DELETE FROM favorites WHERE user_id = ? AND item_name = ?',
+                           [(user_id, item_name) for item_name in removes])
+        cursor.executemany('''
+            INSERT OR IGNORE INTO favorites (user_id, item_name, city, added_at) VALUES (?, ?, ?, ?)
+        ''', [(user_id, item_name, city, added_at) for item_name, city in adds])
+        if conn.total_changes != changes_before:
+            self._bump_version(cursor, user_id, "favorites")
+
+    def fetch_user_favorites(self, user_id, after_id=None, limit=None, version=None):
+        """المفضلة من الأحدث؛ after_id/limit للترقيم بالمفتاح (id هنا هو rowid الخاص بالمفضلة).
+
+        version: إصدار المجموعة إن قرأه المستدعي للتو (لـ ETag)، وإلا يُقرأ هنا للتحقق من الذاكرة.
+        """
+        if version is None:
+            version = self.collection_version(user_id, "favorites")
+        key, page = ("favorites", user_id), (after_id, limit)
+        cached, generation = self.collections.lookup(key, page, version)
+        if cached is not None:
+            return list(cached)
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # 🌟 ضم بيانات الفندق من الكتالوج حتى لا تحتاج الواجهة إلى نسخة محلية منه
+                cursor.execute('''
+                    SELECT f.rowid AS id, f.item_name, f.city, h.rating, h.cheapest_price, h.image_url
+                    FROM favorites f
+                    LEFT JOIN hotels h ON h.name = f.item_name AND h.city = f.city
+                    WHERE f.user_id = ? AND f.rowid < ?
+                    ORDER BY f.rowid DESC
+                    LIMIT ?
+                ''', (user_id, after_id if after_id is not None else MAX_ROWID, limit if limit is not None else -1))
+                # 🌟 تحويل النتائج (من conn.row_factory) إلى list of dicts
+                favorites = [dict(row) for row in cursor.fetchall()]
+        except Exception:
+            logger.exception("خطأ أثناء جلب مفضلات المستخدم")
             return []
-        finally:
-            if conn:
-                conn.close()
+        self.collections.store(key, generation, page, favorites, rows=len(favorites))
+        return list(favorites)
 
     # ------------------------------------
     # وظائف المستخدم والحجوزات (المنطق سليم)
     # ------------------------------------
     def register_user(self, username, password):
-        conn = None
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            password_hash = generate_password_hash(password)
-            cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                                (username, password_hash))
-            conn.commit()
-            return True
+            # التجزئة قبل استعارة الاتصال حتى لا يُحجز من المجمع طوال حسابها
+            password_hash = password_hasher.hash(password)
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                                    (username, password_hash))
+                conn.commit()
+                # 🌟 أي تغيير في جدول users يُسقط النسخة المخزنة مؤقتاً لنفس المعرف
+                user_cache.invalidate(cursor.lastrowid)
+                return True
         except sqlite3.IntegrityError:
             return False
-        except Exception as e:
-            print(f"خطأ أثناء تسجيل المستخدم: {e}")
+        except PasswordHasherBusy:
+            raise
+        except Exception:
+            logger.exception("خطأ أثناء تسجيل المستخدم")
             return False
-        finally:
-            if conn:
-                conn.close() # 🌟 إغلاق الاتصال
 
-    def verify_user(self, username, password):
-        conn = None
+    def fetch_user_by_id(self, user_id):
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ?", (username,))
-            user_data = cursor.fetchone() # 🌟 user_data هو الآن Row object
-            if user_data and check_password_hash(user_data["password_hash"], password):
-                return User(user_data["id"], user_data["username"])
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
+                user_data = cursor.fetchone()
+                return User(user_data["id"], user_data["username"]) if user_data else None
+        except Exception:
+            logger.exception("خطأ في fetch_user_by_id")
             return None
-        except Exception as e:
-            print(f"خطأ أثناء التحقق من المستخدم: {e}")
+
+    def verify_user(self, username, password):
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ?", (username,))
+                user_data = cursor.fetchone() # 🌟 user_data هو الآن Row object
+            if not user_data or not password_hasher.verify(user_data["password_hash"], password):
+                return None
+            if password_hasher.needs_rehash(user_data["password_hash"]):
+                self._rehash_password(user_data["id"], user_data["password_hash"], password)
+            return User(user_data["id"], user_data["username"])
+        except PasswordHasherBusy:
+            raise
+        except Exception:
+            logger.exception("خطأ أثناء التحقق من المستخدم")
             return None
-        finally:
-            if conn:
-                conn.close() # 🌟 إغلاق الاتصال
 
-    def insert_booking(self, user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url=None):
-        conn = None
+    def _rehash_password(self, user_id, old_hash, password):
+        """ترقية تجزئة مخزنة إلى الطريقة/التكلفة الحالية بعد تحقق ناجح (كلمة المرور متاحة الآن فقط)."""
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO bookings (user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url))
-            conn.commit()
-            return cursor.lastrowid
-        except Exception as e:
-            print(f"خطأ أثناء حفظ الحجز: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close() # 🌟 إغلاق الاتصال
+            new_hash = password_hasher.hash(password)
+            with self.connection() as conn:
+                # الشرط على التجزئة القديمة يمنع الكتابة فوق تغيير متزامن لكلمة المرور
+                conn.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                             (new_hash, user_id, old_hash))
+                conn.commit()
+        except Exception:
+            # فشل الترقية لا يمنع تسجيل الدخول؛ ستُعاد المحاولة في المرة القادمة
+            logger.exception("خطأ أثناء ترقية تجزئة كلمة المرور")
 
-    def fetch_user_bookings(self, user_id):
-        conn = None
+    def insert_booking(self, user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url=None,
+                       reject_overlap=False):
+        """يعيد معرف الحجز، أو False عند الخطأ. reject_overlap يرفع BookingOverlap إن تقاطع مع حجز للمستخدم."""
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
+            booking_id = self._write(self._insert_booking_tx, (user_id, user_name, hotel_name, city, check_in,
+                                                                check_out, price, hotel_image_url,
+                                                                date_to_day(check_in), date_to_day(check_out)),
+                                     reject_overlap)
+            self.collections.invalidate(("bookings", user_id))
+            return booking_id
+        except BookingOverlap:
+            raise
+        except Exception:
+            logger.exception("خطأ أثناء حفظ الحجز")
+            return False
+
+    def _insert_booking_tx(self, cursor, row, reject_overlap=False):
+        if not reject_overlap or row[8] is None or row[9] is None:
             cursor.execute('''
-                SELECT id, hotel_name, city, check_in, check_out, price, hotel_image_url
-                FROM bookings
-                WHERE user_id = ?
-                ORDER BY id DESC
-            ''', (user_id,))
-            return [dict(row) for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"خطأ أثناء جلب حجوزات المستخدم: {e}")
+                INSERT INTO bookings (user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url,
+                                      check_in_day, check_out_day)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', row)
+        else:
+            self._insert_checked(cursor, row)
+        booking_id = cursor.lastrowid
+        self._bump_version(cursor, row[0], "bookings")
+        return booking_id
+
+    @staticmethod
+    def _insert_checked(cursor, row):
+        # الفحص والإدراج في جملة واحدة: لا نافذة بينهما يدخل فيها حجز متزامن للمستخدم نفسه
+        user_id, check_in_day, check_out_day = row[0], row[8], max(row[9], row[8] + 1)
+        overlap = (user_id, user_id, check_out_day, check_in_day)
+        cursor.execute(f'''
+            INSERT INTO bookings (user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url,
+                                  check_in_day, check_out_day)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS ({BOOKINGS_OVERLAP_SQL})
+        ''', (*row, *overlap))
+        if cursor.rowcount == 0:
+            conflicts = [r[0] for r in cursor.execute(BOOKINGS_OVERLAP_SQL + " LIMIT 20", overlap)]
+            raise BookingOverlap(sorted(conflicts))
+
+    def fetch_user_bookings(self, user_id, after_id=None, limit=None, start_day=None, end_day=None, version=None):
+        """الحجوزات من الأحدث؛ after_id/limit للترقيم بالمفتاح عبر الفهرس (user_id, id DESC).
+
+        start_day/end_day (أرقام أيام، end غير مشمول) تحصر النتيجة في الحجوزات التي تتقاطع مع الفترة:
+        تُقرأ من R*Tree ثم تُرتب المطابقات وحدها، لا كل حجوزات المستخدم.
+        version كما في fetch_user_favorites.
+        """
+        if version is None:
+            version = self.collection_version(user_id, "bookings")
+        key, page = ("bookings", user_id), (after_id, limit, start_day, end_day)
+        cached, generation = self.collections.lookup(key, page, version)
+        if cached is not None:
+            return list(cached)
+        after_id = after_id if after_id is not None else MAX_ROWID
+        limit = limit if limit is not None else -1
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                if start_day is None and end_day is None:
+                    cursor.execute('''
+                        SELECT id, hotel_name, city, check_in, check_out, price, hotel_image_url
+                        FROM bookings
+                        WHERE user_id = ? AND id < ?
+                        ORDER BY id DESC
+                        LIMIT ?
+                    ''', (user_id, after_id, limit))
+                else:
+                    # CROSS JOIN يثبت الترتيب: R*Tree أولاً ثم البحث بالمفتاح الأساسي
+                    cursor.execute('''
+                        SELECT b.id, b.hotel_name, b.city, b.check_in, b.check_out, b.price, b.hotel_image_url
+                        FROM bookings_range r CROSS JOIN bookings b ON b.id = r.id
+                        WHERE r.user_lo <= ? AND r.user_hi >= ? AND r.start_day < ? AND r.end_day > ? AND r.id < ?
+                        ORDER BY r.id DESC
+                        LIMIT ?
+                    ''', (user_id, user_id, DAY_MAX if end_day is None else end_day,
+                          DAY_MIN if start_day is None else start_day, after_id, limit))
+                bookings = [dict(row) for row in cursor.fetchall()]
+        except Exception:
+            logger.exception("خطأ أثناء جلب حجوزات المستخدم")
             return []
-        finally:
-            if conn:
-                conn.close() # 🌟 إغلاق الاتصال
+        self.collections.store(key, generation, page, bookings, rows=len(bookings))
+        return list(bookings)
         
+    def iter_booking_chunks(self, user_id=None, chunk_size=BOOKINGS_EXPORT_CHUNK):
+        """يمر على الحجوزات بترتيب id على دفعات (ترقيم بالمفتاح)، فتبقى الذاكرة ثابتة مهما كان الحجم.
+
+        كل دفعة تستعير اتصالاً من المجمع ثم تعيده، فلا يُحجز اتصال ولا لقطة قراءة طوال التصدير.
+        """
+        columns = ", ".join(BOOKING_EXPORT_FIELDS)
+        last_id = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    if user_id is None:
+                        rows = conn.execute(f'SELECT {columns} FROM bookings WHERE id > ? ORDER BY id LIMIT ?',
+                                            (last_id, chunk_size)).fetchall()
+                    else:
+                        rows = conn.execute(f'''
+                            SELECT {columns} FROM bookings WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?
+                        ''', (user_id, last_id, chunk_size)).fetchall()
+            except Exception:
+                # لا يمكن تغيير حالة استجابة بدأ بثها؛ نرفع الخطأ حتى لا يبدو الملف المبتور كاملاً
+                logger.exception("خطأ أثناء تصدير الحجوزات")
+                raise
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1]["id"]
+
+    def import_bookings(self, rows, batch_size=BOOKINGS_IMPORT_BATCH, reject_overlap=False, on_overlap=None):
+        """إدراج صفوف حجز جاهزة (من validate_booking_record) بـ executemany، كل batch_size صف في معاملة واحدة.
+
+        reject_overlap يطبق فحص R*Tree نفسه الذي في insert_booking على كل صف (بما فيها صفوف الدفعة نفسها):
+        الصف المتقاطع يُتخطى ويُمرر مع BookingOverlap إلى on_overlap(row, error) ولا يُحسب في المدرج.
+
+        🌟 rows يُقرأ خارج أي اتصال (قد يكون رفعاً بطيئاً من العميل)، والاتصال يُستعار من المجمع لكل دفعة فقط.
+        أخطاء rows نفسه (ترميز الملف، التحقق) تصل إلى المستدعي كما هي. يعيد عدد الصفوف المدرجة، أو None
+        عند خطأ في قاعدة البيانات؛ في الحالتين تبقى الدفعات السابقة محفوظة.
+        """
+        inserted = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                count = self._import_batch(batch, inserted, reject_overlap, on_overlap)
+                if count is None:
+                    return None
+                inserted += count
+                batch = []
+        if batch:
+            count = self._import_batch(batch, inserted, reject_overlap, on_overlap)
+            if count is None:
+                return None
+            inserted += count
+        return inserted
+
+    def _import_batch(self, batch, inserted_before, reject_overlap=False, on_overlap=None):
+        try:
+            with self.connection() as conn:
+                return self._insert_bookings_batch(conn, conn.cursor(), batch, reject_overlap, on_overlap)
+        except Exception:
+            logger.exception("خطأ أثناء استيراد الحجوزات (أُدرج %d قبل الخطأ)", inserted_before)
+            return None
+
+    def _insert_bookings_batch(self, conn, cursor, batch, reject_overlap=False, on_overlap=None):
+        cursor.execute('BEGIN IMMEDIATE')
+        if not reject_overlap:
+            cursor.executemany('''
+                INSERT INTO bookings (user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url,
+                                      check_in_day, check_out_day)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+        else:
+            # جملة لكل صف داخل نفس المعاملة: المشغل يضيف كل صف مدرج إلى R*Tree فيُفحص ما بعده مقابله
+            inserted = []
+            for row in batch:
+                try:
+                    self._insert_checked(cursor, row)
+                    inserted.append(row)
+                except BookingOverlap as e:
+                    if on_overlap is not None:
+                        on_overlap(row, e)
+            batch = inserted
+        user_ids = {row[0] for row in batch}
+        for user_id in user_ids:
+            self._bump_version(cursor, user_id, "bookings")
+        conn.commit()
+        for user_id in user_ids:
+            self.collections.invalidate(("bookings", user_id))
+        return len(batch)
+
+    def fetch_bookings_by_ids(self, user_id, booking_ids=None, limit=None):
+        """جلب عدة حجوزات للمستخدم في استعلام واحد (أو جميعها إن لم تُحدد المعرفات)."""
+        query = '''
+            SELECT id, hotel_name, city, check_in, check_out, price, hotel_image_url
+            FROM bookings
+            WHERE user_id = ?
+        '''
+        params = [user_id]
+        if booking_ids is not None:
+            if not booking_ids:
+                return []
+            query += f" AND id IN ({', '.join('?' * len(booking_ids))})"
+            params.extend(booking_ids)
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        try:
+            with self.connection() as conn:
+                return [dict(row) for row in conn.execute(query, params)]
+        except Exception:
+            logger.exception("خطأ أثناء جلب مجموعة حجوزات")
+            return []
+
     def fetch_booking_by_id(self, booking_id, user_id):
-        conn = None
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, hotel_name, city, check_in, check_out, price, hotel_image_url
-                FROM bookings
-                WHERE id = ? AND user_id = ?
-            ''', (booking_id, user_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        except Exception as e:
-            print(f"خطأ أثناء جلب حجز معين: {e}")
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, hotel_name, city, check_in, check_out, price, hotel_image_url
+                    FROM bookings
+                    WHERE id = ? AND user_id = ?
+                ''', (booking_id, user_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception:
+            logger.exception("خطأ أثناء جلب حجز معين")
             return None
-        finally:
-            if conn:
-                conn.close() # 🌟 إغلاق الاتصال
 
-    def delete_booking(self, booking_id, user_id):
-        conn = None
+    def delete_booking(self, booking_id, user_id):
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # التأكد من أن الحجز يخص المستخدم الذي يطلب الحذف
+                cursor.execute('''
+                    DELETE FROM bookings
+                    WHERE id = ? AND user_id = ?
+                ''', (booking_id, user_id))
+                # rowcount > 0 يعني أنه تم حذف صف واحد بنجاح
+                deleted = cursor.rowcount > 0
+                if deleted:
+                    self._bump_version(cursor, user_id, "bookings")
+                conn.commit()
+            if deleted:
+                self.collections.invalidate(("bookings", user_id))
+            return deleted
+        except Exception:
+            logger.exception("خطأ أثناء حذف الحجز")
+            return False
+
+    # ------------------------------------
+    # 🌟 إصدارات المجموعات (تغذي ETag لقوائم الحجوزات والمفضلة)
+    # ------------------------------------
+    @staticmethod
+    def _bump_version(cursor, user_id, collection):
+        # يُستدعى داخل نفس معاملة الكتابة حتى لا يظهر إصدار جديد قبل البيانات أو العكس
+        cursor.execute('''
+            INSERT INTO collection_versions (user_id, collection, version) VALUES (?, ?, 1)
+            ON CONFLICT (user_id, collection) DO UPDATE SET version = version + 1
+        ''', (user_id, collection))
+
+    def collection_version(self, user_id, collection):
+        # 🌟 الإصدار يُقرأ من SQLite في كل مرة (بحث واحد بالمفتاح الأساسي) وليس من ذاكرة العملية:
+        # العمال المتعددون يرون كتابات بعضهم، وصفحات CollectionCache تُتحقق مقابله
+        try:
+            with self.connection() as conn:
+                row = conn.execute('SELECT version FROM collection_versions WHERE user_id = ? AND collection = ?',
+                                   (user_id, collection)).fetchone()
+                version = row["version"] if row else 0
+        except Exception:
+            logger.exception("خطأ أثناء قراءة إصدار المجموعة")
+            return None
+        return version
+
+    # ------------------------------------
+    # 🌟 وظائف كتالوج الفنادق والبحث
+    # ------------------------------------
+    def upsert_hotels(self, hotels):
+        """إدخال/تحديث مجموعة فنادق في معاملة واحدة مع تحديث الفهرس النصي."""
+        rows = []
+        for hotel in hotels:
+            prices = hotel["prices"]
+            cheapest_site = min(prices, key=prices.get)
+            rows.append((
+                hotel["name"], hotel["city"], hotel["rating"],
+                json.dumps(hotel["amenities"], ensure_ascii=False),
+                json.dumps(prices, ensure_ascii=False),
+                prices[cheapest_site], cheapest_site, hotel.get("image_url"),
+            ))
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO hotels (name, city, rating, amenities, prices, cheapest_price, cheapest_site, image_url)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (name, city) DO UPDATE SET
+                        rating = excluded.rating, amenities = excluded.amenities, prices = excluded.prices,
+                        cheapest_price = excluded.cheapest_price, cheapest_site = excluded.cheapest_site,
+                        image_url = excluded.image_url
+                ''', rows)
+                fts_rows = []
+                for hotel in hotels:
+                    hotel_id = cursor.execute('SELECT id FROM hotels WHERE name = ? AND city = ?',
+                                              (hotel["name"], hotel["city"])).fetchone()["id"]
+                    fts_rows.append((hotel_id, normalize_arabic(hotel["name"]),
+                                     normalize_arabic(" ".join(hotel["amenities"]))))
+                cursor.executemany('DELETE FROM hotels_fts WHERE rowid = ?', [(row[0],) for row in fts_rows])
+                cursor.executemany('INSERT INTO hotels_fts (rowid, name, amenities) VALUES (?, ?, ?)', fts_rows)
+                conn.commit()
+            # المفضلة المخزنة تحمل أسعار وتقييمات الفنادق المضمومة
+            self.collections.clear()
+            return len(rows)
+        except Exception:
+            logger.exception("خطأ أثناء حفظ الفنادق")
+            return 0
+
+    def seed_hotels(self):
+        with self.connection() as conn:
+            if conn.execute('SELECT 1 FROM hotels LIMIT 1').fetchone():
+                return
+        hotels = []
+        for hotel in SEED_HOTELS:
+            rng = random.Random(f"{hotel['name']}|{hotel['city']}")
+            city_text = hotel["city"].replace(" ", "+")
+            hotels.append({
+                **hotel,
+                "prices": generate_simulated_prices(hotel["rating"], rng),
+                "image_url": f"https://placehold.co/150x150/f0f0f0/333?text={city_text}",
+            })
+        self.upsert_hotels(hotels)
+
+    def search_hotels(self, city=None, min_rating=None, min_price=None, max_price=None,
+                      text=None, after=None, limit=HOTELS_PAGE_SIZE):
+        """بحث مرتب من الأرخص مع ترقيم بالمفتاح (keyset): after = (cheapest_price, id) لآخر عنصر في الصفحة السابقة."""
+        clauses, params = [], []
+        if city:
+            clauses.append("h.city = ?")
+            params.append(city)
+        if min_rating is not None:
+            clauses.append("h.rating >= ?")
+            params.append(min_rating)
+        if min_price is not None:
+            clauses.append("h.cheapest_price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("h.cheapest_price <= ?")
+            params.append(max_price)
+        if text:
+            fts_query = build_fts_query(text)
+            if fts_query:
+                clauses.append("h.id IN (SELECT rowid FROM hotels_fts WHERE hotels_fts MATCH ?)")
+                params.append(fts_query)
+        if after is not None:
+            clauses.append("(h.cheapest_price, h.id) > (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # نطلب عنصراً إضافياً لمعرفة وجود صفحة تالية دون COUNT(*)
+                cursor.execute(f'''
+                    SELECT h.id, h.name, h.city, h.rating, h.amenities, h.prices,
+                           h.cheapest_price, h.cheapest_site, h.image_url
+                    FROM hotels h
+                    {where}
+                    ORDER BY h.cheapest_price, h.id
+                    LIMIT ?
+                ''', (*params, limit + 1))
+                rows = cursor.fetchall()
+        except Exception:
+            logger.exception("خطأ أثناء البحث عن الفنادق")
+            return [], None
+        results = []
+        for row in rows[:limit]:
+            hotel = dict(row)
+            hotel["amenities"] = json.loads(hotel["amenities"])
+            hotel["prices"] = json.loads(hotel["prices"])
+            results.append(hotel)
+        next_cursor = None
+        if len(rows) > limit:
+            last = results[-1]
+            next_cursor = encode_hotels_cursor(last["cheapest_price"], last["id"])
+        return results, next_cursor
+
+    def find_hotel(self, name, city):
+        """(id، cheapest_price) لفندق الكتالوج بالاسم والمدينة، أو None."""
+        with self.connection() as conn:
+            row = conn.execute('SELECT id, cheapest_price FROM hotels WHERE name = ? AND city = ?',
+                               (name, city)).fetchone()
+        return tuple(row) if row else None
+
+    def hotels_fingerprint(self):
+        """(العدد، أكبر معرف، مجموع التقييمات): يتغير عند إضافة فنادق أو تعديل تقييماتها فيُعاد حساب الأسعار."""
+        with self.connection() as conn:
+            row = conn.execute('SELECT COUNT(*), COALESCE(MAX(id), 0), TOTAL(rating) FROM hotels').fetchone()
+        return tuple(row)
+
+    def hotel_price_inputs(self):
+        """مدخلات محرك الأسعار مرتبة بالمعرف: (ids، cities، ratings)."""
+        with self.connection() as conn:
+            rows = conn.execute('SELECT id, city, rating FROM hotels ORDER BY id').fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+    def apply_hotel_prices(self, rows):
+        """يكتب أسعار اليوم من لقطة محرك الأسعار: rows = (prices_json, cheapest_price, cheapest_site, id).
+
+        المفضلة تعرض cheapest_price من جدول الفنادق، فيُرفع إصدار مفضلة كل مستخدم لديه فندق تغير سعره
+        في نفس المعاملة، وإلا بقي ETag المفضلة كما هو وأعاد العميل 304 بأسعار قديمة.
+        """
+        try:
+            with self.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                old_prices = dict(conn.execute('SELECT id, cheapest_price FROM hotels').fetchall())
+                changed = [row[3] for row in rows if old_prices.get(row[3]) != row[1]]
+                conn.executemany(
+                    'UPDATE hotels SET prices = ?, cheapest_price = ?, cheapest_site = ? WHERE id = ?', rows)
+                if changed:
+                    conn.execute('''
+                        INSERT INTO collection_versions (user_id, collection, version)
+                        SELECT DISTINCT f.user_id, 'favorites', 1
+                        FROM favorites f JOIN hotels h ON h.name = f.item_name AND h.city = f.city
+                        WHERE h.id IN (SELECT value FROM json_each(?))
+                        ON CONFLICT (user_id, collection) DO UPDATE SET version = version + 1
+                    ''', (json.dumps(changed),))
+                conn.commit()
+            self.collections.clear()
+            return len(rows)
+        except Exception:
+            logger.exception("خطأ أثناء تحديث أسعار الفنادق")
+            return 0
+
+
+class AnalysisCache:
+    """ذاكرة مؤقتة بطبقتين لنتائج تحليل الحجوزات: LRU في الذاكرة أمام جدول دائم في SQLite."""
+
+    def __init__(self, db: DBManager, ttl: float = ANALYSIS_CACHE_TTL,
+                 max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES, memory_size: int = ANALYSIS_CACHE_MEMORY_SIZE):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory = LRUCache(maxsize=memory_size, ttl=ttl)
+
+    @staticmethod
+    def make_key(prompt, system_instruction, schema_spec):
+        payload = json.dumps([prompt, system_instruction, schema_spec], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+        now = time.time()
+        try:
+            with self.db.connection() as conn:
+                row = conn.execute('SELECT response FROM analysis_cache WHERE key = ? AND created_at > ?',
+                                   (key, now - self.ttl)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE analysis_cache SET last_access = ? WHERE key = ?', (now, key))
+                conn.commit()
+        except Exception:
+            logger.exception("خطأ أثناء قراءة ذاكرة التحليل المؤقتة")
+            return None
+        data = json.loads(row["response"])
+        self.memory.set(key, data)
+        return data
+
+    def put(self, key, booking_id, data):
+        now = time.time()
+        self.memory.set(key, data)
+        try:
+            with self.db.connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO analysis_cache (key, booking_id, response, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (key, booking_id, json.dumps(data, ensure_ascii=False), now, now))
+                # 🌟 حد أعلى للحجم: حذف المنتهية ثم الأقل استخداماً
+                conn.execute('DELETE FROM analysis_cache WHERE created_at <= ?', (now - self.ttl,))
+                excess = conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute('''
+                        DELETE FROM analysis_cache WHERE key IN (
+                            SELECT key FROM analysis_cache ORDER BY last_access LIMIT ?
+                        )
+                    ''', (excess,))
+                conn.commit()
+        except Exception:
+            logger.exception("خطأ أثناء حفظ ذاكرة التحليل المؤقتة")
+
+    def invalidate_booking(self, booking_id):
+        try:
+            with self.db.connection() as conn:
+                keys = [row["key"] for row in conn.execute(
+                    'SELECT key FROM analysis_cache WHERE booking_id = ?', (booking_id,))]
+                conn.execute('DELETE FROM analysis_cache WHERE booking_id = ?', (booking_id,))
+                conn.commit()
+        except Exception:
+            logger.exception("خطأ أثناء إبطال ذاكرة التحليل المؤقتة")
+            return
+        for key in keys:
+            self.memory.invalidate(key)
+
+
+def estimate_tokens(text):
+    """تقدير محلي سريع لعدد الرموز (نحو 3 أحرف للرمز في النص العربي) لقرارات الميزانية دون استدعاء count_tokens."""
+    return len(text) // 3 + 1
+
+
+class ChatSession:
+    """حالة جلسة دردشة في الذاكرة: الملخص + الرسائل غير الملخصة + عدادات الرموز. lock يحمي التعديل."""
+
+    def __init__(self, session_id, user_id=None, summary="", summary_tokens=0, summarized_through=0,
+                 last_message_id=0, turns=0, prompt_tokens=0, completion_tokens=0, compactions=0, messages=()):
+        self.id = session_id
+        self.user_id = user_id
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+        self.summarized_through = summarized_through
+        self.last_message_id = last_message_id
+        self.turns = turns
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.compactions = compactions
+        self.messages = list(messages)   # [{"id", "role", "text", "tokens"}] بالترتيب
+        self.persisted = bool(turns or last_message_id)
+        self.compacting = False
+        self.lock = threading.Lock()
+
+    def context_tokens(self):
+        return self.summary_tokens + sum(message["tokens"] for message in self.messages)
+
+    def usage(self):
+        return {
+            "turns": self.turns,
+            "context_tokens": self.context_tokens(),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "compactions": self.compactions,
+        }
+
+
+class ChatSessionStore:
+    """جلسات الدردشة: LRU محدود في الذاكرة أمام SQLite (كل رسالة تُكتب فوراً، والجلسة المُخلاة تُقرأ من القاعدة).
+
+    الجلسة في الذاكرة تُتحقق من القاعدة باستعلام مفتاح أساسي واحد (last_message_id, summarized_through)
+    حتى لا يفوت عاملاً ما أضافه عامل آخر للجلسة نفسها.
+    """
+
+    def __init__(self, db: DBManager, memory_size: int = CHAT_SESSIONS_MEMORY, ttl: float = CHAT_SESSION_TTL):
+        self.db = db
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=memory_size)
+        self.created = 0
+        self.reloads = 0
+        self.compacted = 0
+        self.pruned = 0
+
+    def new(self, user_id=None):
+        """جلسة جديدة في الذاكرة فقط؛ تُحفظ في القاعدة مع أول رسالة ناجحة."""
+        session = ChatSession(secrets.token_urlsafe(16), user_id)
+        self.memory.set(session.id, session)
+        return session
+
+    def get(self, session_id, user_id=None):
+        """الجلسة إن وُجدت وكان للمستخدم حق الوصول (جلسة مجهولة = المعرف سر حاملها)، وإلا None."""
+        session = self.memory.get(session_id)
+        try:
+            with self.db.connection() as conn:
+                head = conn.execute('SELECT * FROM chat_sessions WHERE id = ? AND updated_at > ?',
+                                    (session_id, time.time() - self.ttl)).fetchone()
+                if head is None:
+                    if session is not None and not session.persisted:
+                        return session if session.user_id in (None, user_id) else None
+                    self.memory.invalidate(session_id)
+                    return None
+                if session is not None and (session.last_message_id, session.summarized_through) == \
+                        (head["last_message_id"], head["summarized_through"]):
+                    loaded = session
+                else:
+                    messages = [dict(row) for row in conn.execute(
+                        'SELECT id, role, text, tokens FROM chat_messages WHERE session_id = ? AND id > ? ORDER BY id',
+                        (session_id, head["summarized_through"]))]
+                    loaded = ChatSession(
+                        head["id"], head["user_id"], head["summary"], head["summary_tokens"],
+                        head["summarized_through"], head["last_message_id"], head["turns"], head["prompt_tokens"],
+                        head["completion_tokens"], head["compactions"], messages)
+                    self.reloads += 1
+        except Exception:
+            logger.exception("خطأ أثناء قراءة جلسة الدردشة")
+            return None
+        if loaded.user_id is not None and loaded.user_id != user_id:
+            return None
+        if loaded is not session:
+            self.memory.set(session_id, loaded)
+        return loaded
+
+    def append_turn(self, session, prompt, reply, prompt_tokens=0, completion_tokens=0):
+        """يكتب رسالة المستخدم ورد النموذج ويحدث عدادات الجلسة في معاملة واحدة."""
+        now = time.time()
+        turn = [("user", prompt, estimate_tokens(prompt)), ("model", reply, estimate_tokens(reply))]
+        try:
+            with self.db.connection() as conn:
+                if not session.persisted:
+                    # 🌟 الجلسات المنتهية تُحذف عند إنشاء جلسة جديدة (عبر فهرس updated_at)
+                    expired = now - self.ttl
+                    conn.execute('''DELETE FROM chat_messages WHERE session_id IN (
+                                        SELECT id FROM chat_sessions WHERE updated_at <= ?)''', (expired,))
+                    self.pruned += conn.execute('DELETE FROM chat_sessions WHERE updated_at <= ?', (expired,)).rowcount
+                    conn.execute('INSERT OR IGNORE INTO chat_sessions (id, user_id, created_at, updated_at) '
+                                 'VALUES (?, ?, ?, ?)', (session.id, session.user_id, now, now))
+                ids = []
+                for role, text, tokens in turn:
+                    ids.append(conn.execute('INSERT INTO chat_messages (session_id, role, text, tokens) VALUES (?, ?, ?, ?)',
+                                            (session.id, role, text, tokens)).lastrowid)
+                conn.execute('''
+                    UPDATE chat_sessions SET last_message_id = ?, turns = turns + 1, prompt_tokens = prompt_tokens + ?,
+                        completion_tokens = completion_tokens + ?, updated_at = ?
+                    WHERE id = ?
+                ''', (ids[-1], prompt_tokens, completion_tokens, now, session.id))
+                conn.commit()
+        except Exception:
+            logger.exception("خطأ أثناء حفظ رسالة الدردشة")
+            return False
+        with session.lock:
+            if not session.persisted:
+                self.created += 1
+            session.persisted = True
+            session.messages.extend({"id": message_id, "role": role, "text": text, "tokens": tokens}
+                                    for message_id, (role, text, tokens) in zip(ids, turn))
+            session.last_message_id = ids[-1]
+            session.turns += 1
+            session.prompt_tokens += prompt_tokens
+            session.completion_tokens += completion_tokens
+        return True
+
+    def compact(self, session, summary, through_id, prompt_tokens=0, completion_tokens=0):
+        """يستبدل الرسائل حتى through_id بالملخص؛ الشرط على summarized_through يمنع تطبيق تلخيصين متزامنين."""
+        summary_tokens = estimate_tokens(summary)
+        try:
+            with self.db.connection() as conn:
+                updated = conn.execute('''
+                    UPDATE chat_sessions SET summary = ?, summary_tokens = ?, summarized_through = ?,
+                        compactions = compactions + 1, prompt_tokens = prompt_tokens + ?,
+                        completion_tokens = completion_tokens + ?
+                    WHERE id = ? AND summarized_through = ?
+                ''', (summary, summary_tokens, through_id, prompt_tokens, completion_tokens,
+                      session.id, session.summarized_through)).rowcount
+                if updated:
+                    conn.execute('DELETE FROM chat_messages WHERE session_id = ? AND id <= ?', (session.id, through_id))
+                conn.commit()
+        except Exception:
+            logger.exception("خطأ أثناء حفظ ملخص الدردشة")
+            return False
+        if not updated:
+            self.memory.invalidate(session.id)
+            return False
+        with session.lock:
+            session.summary = summary
+            session.summary_tokens = summary_tokens
+            session.summarized_through = through_id
+            session.messages = [message for message in session.messages if message["id"] > through_id]
+            session.compactions += 1
+            session.prompt_tokens += prompt_tokens
+            session.completion_tokens += completion_tokens
+        self.compacted += 1
+        return True
+
+    def delete(self, session):
+        self.memory.invalidate(session.id)
+        try:
+            with self.db.connection() as conn:
+                conn.execute('DELETE FROM chat_messages WHERE session_id = ?', (session.id,))
+                conn.execute('DELETE FROM chat_sessions WHERE id = ?', (session.id,))
+                conn.commit()
+            return True
+        except Exception:
+            logger.exception("خطأ أثناء حذف جلسة الدردشة")
+            return False
+
+    def stats(self):
+        return {
+            **self.memory.stats(),
+            "created": self.created,
+            "reloads": self.reloads,
+            "compactions": self.compacted,
+            "pruned": self.pruned,
+        }
+
+
+# تهيئة مدير قاعدة البيانات: صريحة عبر init_db() (من create_app أو أمر flask init-db) لا عند الاستيراد
+db_manager = None
+analysis_cache = None
+chat_sessions = None
+
+
+def init_db(database_file=None):
+    """ينشئ DBManager (مع الترحيلات) ويعيده؛ لا يبقي اتصالات مفتوحة حتى لا ترثها العمليات بعد fork."""
+    global db_manager, analysis_cache, chat_sessions
+    if db_manager is not None:
+        db_manager.close()
+    db_manager = DBManager(database_file or DATABASE_FILE)
+    analysis_cache = AnalysisCache(db_manager)
+    chat_sessions = ChatSessionStore(db_manager)
+    if db_manager.pool is not None:
+        db_manager.pool.close_all()
+    return db_manager
+
+
+# ----------------------------------------------------
+# 🌟 ترميز استجابات JSON وضغطها
+# ----------------------------------------------------
+class FastJSONProvider(DefaultJSONProvider):
+    """مزود JSON للتطبيق: UTF-8 خام بدلاً من \\uXXXX (6 بايت لكل حرف عربي)، و orjson إن كان مثبتاً.
+
+    ترتيب المفاتيح لا يُفرض (sort_keys=False) لأنه يكلف وقتاً ولا يعتمد عليه أي عميل.
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+    # التواريخ تمر إلى default() لتبقى بصيغة Flask نفسها (HTTP date) مع الترميزين
+    ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def _orjson_dumps(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self.ORJSON_OPTIONS)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._orjson_dumps(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain"}
+
+
+@bp.after_app_request
+def compress_api_response(response):
+    """gzip لاستجابات /api/ التي تتجاوز API_GZIP_MIN_SIZE؛ البث والملفات الثابتة لها مسارها الخاص."""
+    if (API_GZIP_MIN_SIZE <= 0 or not request.path.startswith('/api/')
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.is_streamed or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+    data = response.get_data()
+    if len(data) < API_GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=API_GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    # الترميز غيّر البايتات: ETag القوي يصبح ضعيفاً (If-None-Match يقارن بالمقارنة الضعيفة)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# ----------------------------------------------------
+# 🌟 قياس الطلبات، المُحلل بالعينات و /api/metrics
+# ----------------------------------------------------
+class SamplingProfiler:
+    """يأخذ عينة من مكدس خيط واحد كل interval ثانية ويجمعها بصيغة collapsed stacks.
+
+    الناتج سطر لكل مكدس: "file:func;file:func;... عدد" (يقرؤه flamegraph.pl و speedscope).
+    """
+
+    def __init__(self, thread_id, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = TallyCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+# نتائج التحليل الأخيرة، تُجلب من /api/metrics/profiles/<id>
+request_profiles = LRUCache(maxsize=PROFILE_KEEP, ttl=3600)
+
+
+def metrics_authorized():
+    if METRICS_TOKEN:
+        return secrets.compare_digest(request.headers.get("Authorization", "").encode(),
+                                      f"Bearer {METRICS_TOKEN}".encode())
+    # الطلب عبر وكيل على نفس الجهاز يصل من loopback أيضاً، فيُعرف بترويسة X-Forwarded-For
+    return request.remote_addr in ("127.0.0.1", "::1") and "X-Forwarded-For" not in request.headers
+
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    # رقم الطلب: من الوكيل أمام الخادم إن أرسله (حتى 64 حرفاً)، وإلا يُولد هنا؛ يُعاد في الاستجابة
+    incoming = request.headers.get(REQUEST_ID_HEADER, "")
+    g.request_id = incoming if 0 < len(incoming) <= 64 and incoming.isprintable() else secrets.token_hex(8)
+    if PROFILE_REQUESTS and request.headers.get("X-Profile") == "1" and metrics_authorized():
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+
+@bp.after_app_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        elapsed = time.perf_counter() - started
+        http_request_seconds.observe(elapsed, request.method, route, response.status_code)
+        log_event("http_request", f"{request.method} {route} {response.status_code}",
+                  level=logging.ERROR if response.status_code >= 500 else logging.INFO,
+                  method=request.method, route=route, status=response.status_code,
+                  duration_ms=round(elapsed * 1000, 3))
+    if "request_id" in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profile_id = os.urandom(8).hex()
+        request_profiles.set(profile_id, profiler.stop())
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+@bp.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics_authorized():
+        return jsonify({"message": "خطأ: غير مصرح بقراءة القياسات."}), 401
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@bp.route('/api/metrics/profiles/<profile_id>', methods=['GET'])
+def request_profile(profile_id):
+    if not metrics_authorized():
+        return jsonify({"message": "خطأ: غير مصرح بقراءة القياسات."}), 401
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        return jsonify({"message": "لا توجد نتيجة تحليل بهذا المعرف."}), 404
+    return Response(profile, mimetype="text/plain")
+
+
+# ----------------------------------------------------
+# 4. 🌟 نقطة نهاية لتقديم الواجهة الأمامية
+# ----------------------------------------------------
+def compress_asset(path):
+    """يكتب path.gz و path.br (إن توفرت مكتبة brotli) عندما يكونان أصغر من الأصل؛ يعيد أحجامها."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    sizes = {"raw": len(raw)}
+    variants = {"gz": gzip.compress(raw, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        variants["br"] = brotli.compress(raw, quality=11)
+    except ImportError:
+        pass
+    for suffix, data in variants.items():
+        if len(data) < len(raw):
+            with open(f"{path}.{suffix}", "wb") as f:
+                f.write(data)
+            sizes[suffix] = len(data)
+    return sizes
+
+
+def build_assets(source_dir, output_dir):
+    """يبني نسخة النشر من الواجهة: assets/ بأسماء فيها بصمة المحتوى، و index.html يشير إليها.
+
+    يعيد الـ manifest (المسار الأصلي -> المسار ذو البصمة) وأحجام كل ملف قبل/بعد الضغط.
+    """
+    shutil.rmtree(output_dir, ignore_errors=True)
+    manifest, sizes = {}, {}
+    for root, _, files in os.walk(os.path.join(source_dir, "assets")):
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, source_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+            stem, ext = os.path.splitext(relative)
+            fingerprinted = f"{stem}.{digest}{ext}"
+            target = os.path.join(output_dir, fingerprinted)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            manifest[relative] = fingerprinted
+            sizes[fingerprinted] = compress_asset(target) if ext in ASSETS_COMPRESSIBLE else {"raw": os.path.getsize(target)}
+
+    with open(os.path.join(source_dir, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for relative, fingerprinted in manifest.items():
+        # "/assets/x.js" و 'assets/x.js' و url(assets/x.js)، دون لمس أسماء أطول تبدأ بنفس المسار
+        html = re.sub(r"(?<=[\"'(/])" + re.escape(relative) + r"(?=[\"')?#])", fingerprinted, html)
+    index_path = os.path.join(output_dir, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    sizes["index.html"] = compress_asset(index_path)
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest, sizes
+
+
+def send_precompressed(directory, filename, cache_control):
+    """يرسل أفضل نسخة يقبلها العميل (br ثم gzip ثم الأصل) مع ETag و Vary: Accept-Encoding."""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"message": "الملف غير موجود."}), 404
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            response = send_file(path + suffix, mimetype=mimetype, conditional=True)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=True)
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+@bp.route('/')
+def serve_index():
+    # 🌟 index.html المبني (يشير إلى الأسماء ذات البصمة) إن وُجد، وإلا الأصل من مجلد 'static'
+    # no-cache: يُعاد التحقق منه في كل زيارة (304 عبر ETag) حتى يظهر أي نشر جديد فوراً
+    directory = ASSETS_BUILD_DIR if os.path.isfile(os.path.join(ASSETS_BUILD_DIR, 'index.html')) else current_app.static_folder
+    return send_precompressed(directory, 'index.html', "no-cache")
+
+
+@bp.route('/assets/<path:filename>')
+def serve_asset(filename):
+    # مجلد البناء لا يحوي إلا نسخاً ذات بصمة: محتواها لا يتغير أبداً تحت نفس الاسم
+    if os.path.isfile(safe_join(ASSETS_BUILD_DIR, 'assets', filename) or ''):
+        return send_precompressed(os.path.join(ASSETS_BUILD_DIR, 'assets'), filename,
+                                  f"public, max-age={ASSETS_IMMUTABLE_MAX_AGE}, immutable")
+    return send_precompressed(os.path.join(current_app.static_folder, 'assets'), filename, "no-cache")
+
+
+@bp.cli.command("build-assets")
+@click.option("--output", "-o", default=ASSETS_BUILD_DIR, show_default=True)
+def build_assets_command(output):
+    """بناء الملفات الثابتة ببصمة المحتوى مع نسخ gzip/brotli."""
+    manifest, sizes = build_assets(current_app.static_folder, output)
+    for name, size in sizes.items():
+        compressed = "  ".join(f"{key}={value}" for key, value in size.items() if key != "raw")
+        click.echo(f"{name}: {size['raw']} bytes  {compressed}")
+    click.echo(f"تم بناء {len(manifest)} ملفاً في {output}")
+
+# ----------------------------------------------------
+# 5. نقاط نهاية المصادقة و CRUD (بدون تغيير عن السابق)
+# ----------------------------------------------------
+
+def auth_busy_response():
+    response = jsonify({"message": "عذراً، الخادم مشغول حالياً. يرجى المحاولة بعد قليل."})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+@bp.route('/api/register', methods=['POST'])
+def register():
+    try:
+        data = request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+        if not username or not password:
+            return jsonify({"message": "خطأ: يجب إدخال اسم المستخدم وكلمة المرور."}), 400
+
+        try:
+            registered = db_manager.register_user(username, password)
+        except PasswordHasherBusy:
+            return auth_busy_response()
+        if registered:
+            log_event("user_registered", "تم إنشاء حساب جديد", username=username)
+            return jsonify({"message": f"تم إنشاء الحساب بنجاح لـ {username}. يمكنك الآن تسجيل الدخول."}), 201
+        else:
+            log_event("register_conflict", "اسم المستخدم موجود بالفعل", level=logging.WARNING, username=username)
+            return jsonify({"message": "خطأ: اسم المستخدم موجود بالفعل، أو حدث خطأ آخر."}), 409
+    except Exception:
+        logger.exception("خطأ في register")
+        return jsonify({"message": "حدث خطأ داخلي في الخادم."}), 500
+
+@bp.route('/api/login', methods=['POST'])
+def login():
+    try:
+        data = request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+        if not username or not password:
+            return jsonify({"message": "خطأ: يجب إدخال اسم المستخدم وكلمة المرور."}), 400
+
+        try:
+            user = db_manager.verify_user(username, password)
+        except PasswordHasherBusy:
+            return auth_busy_response()
+
+        if user:
+            login_user(user) # 🌟 هنا يتم تعيين الكوكي
+            user_cache.set(user.id, user) # 🌟 تدفئة الذاكرة المؤقتة: الطلب التالي لا يحتاج استعلاماً
+            log_event("login_succeeded", "تسجيل دخول ناجح", username=username, user_id=user.id)
+            return jsonify({"message": "تم تسجيل الدخول بنجاح.", "user_id": user.id, "username": user.username}), 200
+        else:
+            log_event("login_failed", "فشل تسجيل الدخول: اسم المستخدم أو كلمة المرور غير صحيحة.",
+                      level=logging.WARNING, username=username)
+            return jsonify({"message": "خطأ: اسم المستخدم أو كلمة المرور غير صحيحة."}), 401
+    except Exception:
+        logger.exception("خطأ في login")
+        return jsonify({"message": "حدث خطأ داخلي في الخادم."}), 500
+
+@bp.route('/api/logout', methods=['POST'])
+@login_required
+def logout():
+    logout_user()
+    return jsonify({"message": "تم تسجيل الخروج بنجاح."}), 200
+
+@bp.route('/api/status', methods=['GET'])
+def status():
+    if current_user.is_authenticated:
+        return jsonify({"is_authenticated": True, "user_id": current_user.id, "username": current_user.username}), 200
+    else:
+        return jsonify({"is_authenticated": False}), 200
+
+@bp.route('/api/booking', methods=['POST'])
+@login_required
+def add_booking():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = {**data, "price": 0}   # السعر يُحسب أدناه في الخادم
+    # 🌟 التواريخ تُتحقق وتُوحَّد (YYYY-MM-DD + أرقام أيام مفهرسة) بنفس قواعد الاستيراد
+    try:
+        row = validate_booking_record(data, current_user.id, current_user.username)
+    except ValueError as e:
+        return jsonify({"message": f"خطأ: بيانات الحجز غير صالحة ({e})."}), 400
+
+    # 🌟 السعر يُحسب في الخادم من لقطة محرك الأسعار (يوم الوصول، أرخص موقع أو site المطلوب)
+    # ولا يُؤخذ من العميل؛ السعر المرسل يُتجاهل. الاستيراد (CLI/الـ API) وحده يحفظ الأسعار كما هي.
+    site = data.get('site')
+    if site is not None and site not in price_engine.sites:
+        return jsonify({"message": "خطأ: موقع الحجز غير معروف."}), 400
+    hotel = db_manager.find_hotel(row[2], row[3])
+    if hotel is None:
+        return jsonify({"message": "خطأ: الفندق غير موجود في الكتالوج."}), 404
+    price = booking_price(price_engine.current(db_manager), hotel[0], row[8], site)
+    if price is None:
+        # فندق أضيف بعد آخر لقطة: سعر اليوم المكتوب في الكتالوج إن وُجد
+        price = hotel[1] if site is None else None
+    if price is None:
+        return jsonify({"message": "خطأ: سعر الفندق غير متاح حالياً، حاول لاحقاً."}), 503
+    row = row[:6] + (float(price),) + row[7:]
+
+    # لا يُسمح بحجزين متقاطعين للمستخدم نفسه ما لم يسمح الخادم بذلك (BOOKINGS_ALLOW_OVERLAP)
+    try:
+        booking_id = db_manager.insert_booking(*row[:8], reject_overlap=not BOOKINGS_ALLOW_OVERLAP)
+    except BookingOverlap as e:
+        return jsonify({
+            "message": "خطأ: لديك حجز آخر في نفس الفترة.",
+            "conflicts": e.conflicts,
+        }), 409
+
+    if booking_id:
+        return jsonify({
+            "message": "تم تأكيد الحجز بنجاح!",
+            "booking_id": booking_id,
+            "price": row[6],
+        }), 201
+    else:
+        return jsonify({"message": "فشل في حفظ الحجز في قاعدة البيانات."}), 500
+
+
+def parse_page_args():
+    """يقرأ after_id و limit من الطلب (ValueError إذا كانت غير صالحة)."""
+    after_id = request.args.get('after_id')
+    after_id = int(after_id) if after_id else None
+    limit = int(request.args.get('limit', COLLECTION_PAGE_SIZE))
+    if limit < 1 or (after_id is not None and after_id < 1):
+        raise ValueError("invalid page")
+    return after_id, min(limit, COLLECTION_MAX_PAGE_SIZE)
+
+
+def parse_date_range_args():
+    """يقرأ from/to (YYYY-MM-DD، to مشمول) ويعيد (start_day, end_day) بنهاية غير مشمولة، أو ValueError."""
+    start_day = end_day = None
+    if request.args.get('from'):
+        start_day = date_to_day(request.args['from'])
+        if start_day is None:
+            raise ValueError("invalid from")
+    if request.args.get('to'):
+        end_day = date_to_day(request.args['to'])
+        if end_day is None:
+            raise ValueError("invalid to")
+        end_day += 1
+    if start_day is not None and end_day is not None and end_day <= start_day:
+        raise ValueError("empty range")
+    return start_day, end_day
+
+
+def collection_page_response(collection, fetch_page, variant=""):
+    """صفحة من مجموعة المستخدم مع ETag مبني على عداد الإصدار: القائمة غير المتغيرة تعود 304 دون استعلامها.
+
+    variant يميز ETag للمرشحات الإضافية (مثل نطاق التواريخ) على نفس المجموعة.
+    """
+    try:
+        after_id, limit = parse_page_args()
+    except ValueError:
+        return jsonify({"message": "خطأ: معايير الترقيم غير صالحة."}), 400
+
+    user_id = current_user.id
+    version = db_manager.collection_version(user_id, collection)
+    etag = f"{collection}-{user_id}-v{version}-a{after_id or 0}-l{limit}{variant}" if version is not None else None
+    if etag and request.if_none_match.contains_weak(etag):
+        not_modified = Response(status=304)
+        not_modified.set_etag(etag)
+        not_modified.headers['Cache-Control'] = 'private, no-cache'
+        return not_modified
+
+    # نطلب عنصراً إضافياً لمعرفة وجود صفحة تالية
+    items = fetch_page(user_id, after_id=after_id, limit=limit + 1, version=version)
+    response = jsonify(items[:limit])
+    if len(items) > limit:
+        response.headers['X-Next-After-Id'] = str(items[limit - 1]['id'])
+    if etag:
+        response.set_etag(etag)
+    # no-cache: المتصفح يحتفظ بالنسخة ويعيد التحقق منها بـ If-None-Match في كل مرة
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@bp.route('/api/bookings', methods=['GET'])
+@login_required
+def get_user_bookings():
+    """?from=&to= (YYYY-MM-DD) تعيد فقط الحجوزات التي تتقاطع مع الفترة، مثل "النشطة الأسبوع القادم"."""
+    try:
+        start_day, end_day = parse_date_range_args()
+    except ValueError:
+        return jsonify({"message": "خطأ: نطاق التواريخ غير صالح."}), 400
+    if start_day is None and end_day is None:
+        return collection_page_response("bookings", db_manager.fetch_user_bookings)
+
+    def fetch_page(user_id, after_id=None, limit=None, version=None):
+        return db_manager.fetch_user_bookings(user_id, after_id=after_id, limit=limit,
+                                              start_day=start_day, end_day=end_day, version=version)
+    return collection_page_response("bookings", fetch_page, variant=f"-r{start_day}-{end_day}")
+
+
+@bp.route('/api/booking/<int:booking_id>', methods=['DELETE'])
+@login_required
+def delete_booking(booking_id):
+    """نقطة نهاية لحذف حجز معين."""
+    if db_manager.delete_booking(booking_id, current_user.id):
+        analysis_cache.invalidate_booking(booking_id)
+        log_event("booking_deleted", "تم حذف الحجز", booking_id=booking_id, user_id=current_user.id)
+        return jsonify({"message": "تم إلغاء الحجز بنجاح."}), 200
+    else:
+        # قد يكون السبب أن الحجز غير موجود أو لا يخص المستخدم
+        return jsonify({"message": "فشل إلغاء الحجز. قد يكون غير موجود أو لا تملك الصلاحية."}), 404
+
+
+# 🌟 تصدير واستيراد الحجوزات بالبث (NDJSON أو CSV)
+def export_format(value, default="ndjson"):
+    fmt = (value or default).lower()
+    if fmt not in ("ndjson", "csv"):
+        raise ValueError(fmt)
+    return fmt
+
+
+def serialize_booking_chunks(chunks, fmt):
+    """يحوّل دفعات الصفوف إلى نص NDJSON/CSV؛ كل دفعة تُكتب كقطعة واحدة."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(BOOKING_EXPORT_FIELDS)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+    for rows in chunks:
+        yield "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in rows)
+
+
+def import_booking_records(records, user_id=None, user_name=None, batch_size=BOOKINGS_IMPORT_BATCH,
+                           reject_overlap=False):
+    """يتحقق من السجلات ويدرج الصالح منها على دفعات؛ يعيد تقرير {inserted, rejected, errors}.
+
+    مع reject_overlap يُرفض أيضاً كل سجل يتقاطع مع حجز آخر للمستخدم (في القاعدة أو سابق في الملف).
+    """
+    report = {"inserted": 0, "rejected": 0, "errors": []}
+    # أرقام أسطر الدفعة الجارية فقط (الدفعة تُدرج بعد قراءة batch_size صف)، لربط التقاطع بسطره
+    pending_lines = deque(maxlen=batch_size)
+
+    def reject(line_no, error):
+        report["rejected"] += 1
+        if len(report["errors"]) < BOOKINGS_IMPORT_MAX_ERRORS:
+            report["errors"].append({"line": line_no, "error": str(error)})
+
+    def valid_rows():
+        for line_no, record in records:
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                row = validate_booking_record(record, user_id, user_name)
+            except ValueError as e:
+                reject(line_no, e)
+                continue
+            pending_lines.append((row, line_no))
+            yield row
+
+    def overlap(row, error):
+        reject(next((line_no for pending, line_no in pending_lines if pending is row), None), error)
+
+    inserted = db_manager.import_bookings(valid_rows(), batch_size=batch_size, reject_overlap=reject_overlap,
+                                          on_overlap=overlap)
+    if inserted is None:
+        return None
+    report["inserted"] = inserted
+    return report
+
+
+@bp.route('/api/bookings/export', methods=['GET'])
+@login_required
+def export_bookings():
+    """تصدير كل حجوزات المستخدم بالبث (format=ndjson|csv) بذاكرة ثابتة."""
+    try:
+        fmt = export_format(request.args.get('format'))
+    except ValueError:
+        return jsonify({"message": "خطأ: التنسيق يجب أن يكون ndjson أو csv."}), 400
+
+    chunks = db_manager.iter_booking_chunks(user_id=current_user.id)
+    mimetype = 'text/csv' if fmt == "csv" else 'application/x-ndjson'
+    response = Response(serialize_booking_chunks(chunks, fmt), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="bookings.{fmt}"'
+    return response
+
+
+@bp.route('/api/bookings/import', methods=['POST'])
+@login_required
+def import_bookings():
+    """استيراد حجوزات للمستخدم الحالي من جسم الطلب (NDJSON أو CSV) يُقرأ سطراً بسطر."""
+    default = "csv" if request.mimetype == 'text/csv' else "ndjson"
+    try:
+        fmt = export_format(request.args.get('format'), default)
+    except ValueError:
+        return jsonify({"message": "خطأ: التنسيق يجب أن يكون ndjson أو csv."}), 400
+
+    lines = codecs.iterdecode(request.stream, 'utf-8')
+    try:
+        report = import_booking_records(read_booking_records(lines, fmt), user_id=current_user.id,
+                                        user_name=current_user.username, reject_overlap=not BOOKINGS_ALLOW_OVERLAP)
+    except UnicodeDecodeError:
+        # الدفعات المستوردة قبل السطر التالف تبقى محفوظة (كل دفعة معاملة مستقلة)
+        return jsonify({"message": "خطأ: الملف يجب أن يكون بترميز UTF-8."}), 400
+    if report is None:
+        return jsonify({"message": "فشل استيراد الحجوزات."}), 500
+    return jsonify({"success": True, **report}), 200
+
+
+# 🌟 أوامر سطر الأوامر للعمليات: flask --app app export-bookings / import-bookings
+@bp.cli.command("export-bookings")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson")
+@click.option("--user-id", type=int, default=None, help="تصدير حجوزات مستخدم واحد فقط.")
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-")
+def export_bookings_command(fmt, user_id, output):
+    """تصدير الحجوزات إلى ملف (أو stdout) بتنسيق NDJSON أو CSV."""
+    for text in serialize_booking_chunks(db_manager.iter_booking_chunks(user_id=user_id), fmt):
+        output.write(text)
+
+
+@bp.cli.command("import-bookings")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default=None,
+              help="يُستنتج من امتداد الملف إذا لم يُحدد.")
+@click.option("--batch-size", type=int, default=BOOKINGS_IMPORT_BATCH)
+@click.option("--allow-overlap", is_flag=True, help="إدراج الحجوزات المتقاطعة أيضاً (مثلاً استعادة نسخة كاملة).")
+def import_bookings_command(source, fmt, batch_size, allow_overlap):
+    """استيراد حجوزات (تحتاج user_id و user_name في كل سجل) على دفعات كبيرة."""
+    fmt = fmt or ("csv" if source.name.endswith(".csv") else "ndjson")
+    started = time.perf_counter()
+    try:
+        report = import_booking_records(read_booking_records(source, fmt), batch_size=batch_size,
+                                        reject_overlap=not (allow_overlap or BOOKINGS_ALLOW_OVERLAP))
+    except UnicodeDecodeError:
+        raise click.ClickException("الملف يجب أن يكون بترميز UTF-8 (الدفعات السابقة للخطأ محفوظة).")
+    if report is None:
+        raise click.ClickException("فشل استيراد الحجوزات.")
+    elapsed = time.perf_counter() - started
+    click.echo(f"أُدرج {report['inserted']} حجزاً ورُفض {report['rejected']} في {elapsed:.2f} ثانية.")
+    for error in report["errors"]:
+        click.echo(f"  سطر {error['line']}: {error['error']}", err=True)
+
+
+# ----------------------------------------------------
+# 6. نقاط نهاية Gemini API (تم الإصلاح)
+# ----------------------------------------------------
+
+GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-2.0-flash")
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def gemini_sdk():
+    """يستورد google.generativeai ويهيئه بمفتاح API عند أول استدعاء فقط.
+
+    استيراد الحزمة (gRPC و protobuf) هو الجزء الأثقل من تشغيل العملية، ولا تحتاجه مسارات CRUD.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                started = time.perf_counter()
+                import google.generativeai as genai
+                genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+                startup_stats["gemini_import_ms"] = (time.perf_counter() - started) * 1000
+                _genai = genai
+    return _genai
+
+CHAT_SYSTEM_INSTRUCTION = (
+    "أنت مساعد حجوزات فندقية ذكي وودود. مهمتك هي الإجابة على استفسارات المستخدمين حول السفر، "
+    "تخطيط الرحلات، الأماكن السياحية، والفنادق. ردودك يجب أن تكون باللغة العربية، مختصرة، "
+    "مفيدة، ومناسبة لسياق تطبيق حجز الفنادق. تجنب طلب معلومات شخصية."
+)
+
+CHAT_SUMMARY_INSTRUCTION = (
+    "أنت تلخص محادثات مساعد حجوزات فندقية. اكتب ملخصاً موجزاً باللغة العربية يحفظ ما يحتاجه المساعد "
+    "لمتابعة المحادثة: الوجهات والتواريخ والميزانية وتفضيلات المستخدم والأسئلة المفتوحة. لا تضف معلومات جديدة."
+)
+
+ANALYZE_SYSTEM_INSTRUCTION = (
+    "أنت محلل حجوزات فندقية ذكي. مهمتك هي تحليل الحجز المقدم وتقديم تقرير structured JSON. "
+    "يجب أن يتضمن التقرير تقييمًا لقيمة السعر واقتراحات لأنشطة سياحية ممتعة في المدينة المذكورة. "
+    "يجب استخدام أداة Google Search لضمان أن المعلومات حديثة وواقعية (خاصة للأنشطة السياحية)."
+)
+
+# 🌟 وصف الـ Schema كبيانات عادية: يمكن حسابه ضمن مفتاح الذاكرة المؤقتة ثم تحويله إلى types.Schema
+ANALYSIS_SCHEMA_SPEC = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING", "description": "عنوان جذاب للتحليل"},
+        "price_analysis": {"type": "STRING", "description": "تقييم موجز لقيمة السعر (جيد/عادل/مرتفع) مع تبرير بناءً على الفندق والمدينة"},
+        "activity_suggestions": {
+            "type": "ARRAY",
+            "description": "قائمة بـ 3 أنشطة سياحية أو مطاعم أو فعاليات في مدينة الحجز، مع ذكر سبب الاقتراح.",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "name": {"type": "STRING"},
+                    "reason": {"type": "STRING"}
+                },
+                "required": ["name", "reason"]
+            }
+        },
+        "summary": {"type": "STRING", "description": "ملخص نهائي ونصيحة للمسافر."}
+    },
+    "required": ["title", "price_analysis", "activity_suggestions", "summary"]
+}
+
+
+def build_schema(spec):
+    types = gemini_sdk().types
+    kwargs = {"type": getattr(types.Type, spec["type"])}
+    if "description" in spec:
+        kwargs["description"] = spec["description"]
+    if "properties" in spec:
+        kwargs["properties"] = {name: build_schema(prop) for name, prop in spec["properties"].items()}
+    if "items" in spec:
+        kwargs["items"] = build_schema(spec["items"])
+    if "required" in spec:
+        kwargs["required"] = spec["required"]
+    return types.Schema(**kwargs)
+
+
+class ModelRegistry:
+    """يبني كل نموذج Gemini مرة واحدة لكل إعداد (عند أول استخدام) ويشاركه بين خيوط الخادم."""
+
+    def __init__(self):
+        self._factories = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self.build_seconds = {}
+        self.reuses = 0
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            self.reuses += 1
+            return model
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                started = time.perf_counter()
+                model = self._factories[name]()
+                self.build_seconds[name] = time.perf_counter() - started
+                self._models[name] = model
+        return model
+
+    def warm_up(self):
+        """يبني جميع النماذج ويفتح اتصال العميل مسبقاً حتى لا يدفع أول طلب تكلفة الإعداد."""
+        for name in self._factories:
+            self.get(name)
+        try:
+            started = time.perf_counter()
+            self.get("chat").count_tokens("ping")
+            log_event("gemini_warmup", "تم تجهيز اتصال Gemini",
+                      duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        except Exception as e:
+            logger.warning("تعذر تجهيز اتصال Gemini مسبقاً: %s", e)
+
+    def stats(self):
+        build_ms = {name: seconds * 1000 for name, seconds in self.build_seconds.items()}
+        average_build_ms = sum(build_ms.values()) / len(build_ms) if build_ms else 0.0
+        return {
+            "models": sorted(self._models),
+            "build_ms": build_ms,
+            "reuses": self.reuses,
+            # تقدير وقت الإعداد الذي كان سيُصرف لو بُني النموذج مع كل طلب
+            "setup_ms_saved": self.reuses * average_build_ms,
+        }
+
+
+def _build_chat_model():
+    genai = gemini_sdk()
+    return genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        system_instruction=CHAT_SYSTEM_INSTRUCTION,
+        tools=[]
+    )
+
+
+def _build_summary_model():
+    genai = gemini_sdk()
+    return genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        system_instruction=CHAT_SUMMARY_INSTRUCTION,
+        generation_config=genai.GenerationConfig(max_output_tokens=CHAT_SUMMARY_MAX_TOKENS),
+    )
+
+
+def _build_analyze_model():
+    genai = gemini_sdk()
+    return genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        system_instruction=ANALYZE_SYSTEM_INSTRUCTION,
+        tools=[],
+        # 🌟 طلب JSON منظم
+        generation_config=genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=build_schema(ANALYSIS_SCHEMA_SPEC)
+        )
+    )
+
+
+model_registry = ModelRegistry()
+model_registry.register("chat", _build_chat_model)
+model_registry.register("analyze", _build_analyze_model)
+model_registry.register("summarize", _build_summary_model)
+
+class GeminiOverloaded(Exception):
+    """الطابور ممتلئ: نرفض الطلب فوراً بدلاً من حجز خيط من خيوط الخادم."""
+
+
+class GeminiTimeout(Exception):
+    """تجاوز الطلب مهلته (انتظاراً في الطابور أو أثناء الاستدعاء)."""
+
+
+class GeminiExecutor:
+    """مجمع خيوط محدود لاستدعاءات Gemini مع دمج الطلبات المتطابقة (singleflight) ومهلات وقياسات."""
+
+    def __init__(self, workers: int = GEMINI_WORKERS, max_queue: int = GEMINI_MAX_QUEUE,
+                 timeout: float = GEMINI_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+        # عدد الاستدعاءات المسموح بها في آن واحد (قيد التنفيذ + في الطابور)
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._inflight = {}
+        self._lock = threading.RLock()
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queue_depth = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def run(self, key, fn, *args):
+        """ينفذ fn(*args) في المجمع وينتظر النتيجة، أو ينضم إلى استدعاء مطابق قيد التنفيذ بنفس المفتاح."""
+        future = self.submit(key, fn, *args)
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            # التأكد من أن الحجز يخص المستخدم الذي يطلب الحذف
-            cursor.execute('''
-                DELETE FROM bookings
-                WHERE id = ? AND user_id = ?
-            ''', (booking_id, user_id))
-            conn.commit()
-            # rowcount > 0 يعني أنه تم حذف صف واحد بنجاح
-            return cursor.rowcount > 0
-        except Exception as e:
-            print(f"خطأ أثناء حذف الحجز: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+            return future.result(timeout=self.timeout)
+        except (FutureTimeoutError, GeminiTimeout):
+            with self._lock:
+                self.timeouts += 1
+            raise GeminiTimeout()
 
+    def submit(self, key, fn, *args):
+        """مثل run() لكن يعيد Future (مشتركاً بين الطلبات المتطابقة) دون انتظار."""
+        deadline = time.perf_counter() + self.timeout
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                if not self._slots.acquire(blocking=False):
+                    self.rejected += 1
+                    raise GeminiOverloaded()
+                self.submitted += 1
+                self.queue_depth += 1
+                future = self._pool.submit(self._call, time.perf_counter(), deadline, fn, args)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f: self._done(key, f))
+        return future
 
-# تهيئة مدير قاعدة البيانات
-try:
-    db_manager = DBManager(DATABASE_FILE)
-except Exception as e:
-    print(f"فشل في تهيئة قاعدة البيانات: {e}")
+    def admit(self):
+        """حجز مقعد في المجمع لعمليات تُنفَّذ خارجه (مثل البث) حتى تخضع لنفس الحد؛ يُحرر بـ release()."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise GeminiOverloaded()
 
+    def release(self):
+        self._slots.release()
 
-# ----------------------------------------------------
-# 4. 🌟 نقطة نهاية لتقديم الواجهة الأمامية
-# ----------------------------------------------------
-@app.route('/')
-def serve_index():
-    # إرسال index.html من مجلد 'static'
-    return send_from_directory(app.static_folder, 'index.html')
+    def _call(self, enqueued_at, deadline, fn, args):
+        started = time.perf_counter()
+        waited = started - enqueued_at
+        with self._lock:
+            self.queue_depth -= 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if started >= deadline:
+            # انتهت المهلة أثناء الانتظار: لا فائدة من استدعاء مدفوع لن ينتظره أحد
+            raise GeminiTimeout()
+        return fn(*args)
 
-# ----------------------------------------------------
-# 5. نقاط نهاية المصادقة و CRUD (بدون تغيير عن السابق)
-# ----------------------------------------------------
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        self._slots.release()
 
-@app.route('/api/register', methods=['POST'])
-def register():
-    try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-        if not username or not password:
-            return jsonify({"message": "خطأ: يجب إدخال اسم المستخدم وكلمة المرور."}), 400
+    def stats(self):
+        with self._lock:
+            started = self.submitted - self.queue_depth
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "inflight": len(self._inflight),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": self.wait_seconds_total / started * 1000 if started else 0.0,
+                "wait_ms_max": self.wait_seconds_max * 1000,
+            }
 
-        if db_manager.register_user(username, password):
-            print(f"✅ تم إنشاء حساب جديد: {username}")
-            return jsonify({"message": f"تم إنشاء الحساب بنجاح لـ {username}. يمكنك الآن تسجيل الدخول."}), 201
-        else:
-            print(f"⚠️ اسم المستخدم موجود بالفعل: {username}")
-            return jsonify({"message": "خطأ: اسم المستخدم موجود بالفعل، أو حدث خطأ آخر."}), 409
-    except Exception as e:
-        print(f"🔥 خطأ في register: {e}")
-        return jsonify({"message": "حدث خطأ داخلي في الخادم."}), 500
 
-@app.route('/api/login', methods=['POST'])
-def login():
-    try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-        if not username or not password:
-            return jsonify({"message": "خطأ: يجب إدخال اسم المستخدم وكلمة المرور."}), 400
+def record_gemini_call(model_name, started, outcome, response=None, error=None):
+    gemini_call_seconds.observe(time.perf_counter() - started, model_name, outcome)
+    if error is not None:
+        gemini_errors.inc(model_name, type(error).__name__)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        gemini_tokens.inc(model_name, "prompt", amount=getattr(usage, "prompt_token_count", 0) or 0)
+        gemini_tokens.inc(model_name, "candidates", amount=getattr(usage, "candidates_token_count", 0) or 0)
 
-        user = db_manager.verify_user(username, password)
 
-        if user:
-            login_user(user) # 🌟 هنا يتم تعيين الكوكي
-            print(f"✅ تسجيل دخول ناجح للمستخدم: {username}")
-            return jsonify({"message": "تم تسجيل الدخول بنجاح.", "user_id": user.id, "username": user.username}), 200
-        else:
-            print(f"❌ فشل تسجيل الدخول: اسم المستخدم أو كلمة المرور غير صحيحة.")
-            return jsonify({"message": "خطأ: اسم المستخدم أو كلمة المرور غير صحيحة."}), 401
+def generate_with(model_name, prompt):
+    started = time.perf_counter()
+    try:
+        # 🌟 مهلة على مستوى الـ RPC نفسه حتى لا يبقى خيط المجمع عالقاً بعد تخلي الطلب عنه
+        response = model_registry.get(model_name).generate_content(prompt, request_options={"timeout": GEMINI_TIMEOUT})
     except Exception as e:
-        print(f"🔥 خطأ في login: {e}")
-        return jsonify({"message": "حدث خطأ داخلي في الخادم."}), 500
+        record_gemini_call(model_name, started, "error", error=e)
+        raise
+    record_gemini_call(model_name, started, "ok", response)
+    return response
 
-@app.route('/api/logout', methods=['POST'])
-@login_required
-def logout():
-    logout_user()
-    return jsonify({"message": "تم تسجيل الخروج بنجاح."}), 200
 
-@app.route('/api/status', methods=['GET'])
-def status():
-    if current_user.is_authenticated:
-        return jsonify({"is_authenticated": True, "user_id": current_user.id, "username": current_user.username}), 200
-    else:
-        return jsonify({"is_authenticated": False}), 200
+def gemini_busy_response(message_key="message"):
+    response = jsonify({message_key: "عذراً، مساعد الذكاء الاصطناعي مشغول حالياً. يرجى المحاولة بعد قليل."})
+    response.headers['Retry-After'] = '2'
+    return response, 429
 
-@app.route('/api/booking', methods=['POST'])
-@login_required
-def add_booking():
-    data = request.get_json()
-    required_fields = ['hotel_name', 'city', 'check_in', 'check_out', 'price']
-    if not all(field in data and data[field] is not None for field in required_fields):
-        return jsonify({"message": "خطأ: بيانات الحجز ناقصة."}), 400
 
-    user_id = current_user.id
-    user_name = current_user.username
-    hotel_name = data['hotel_name']
-    city = data['city']
-    check_in = data['check_in']
-    check_out = data['check_out']
-    
-    try:
-        price = float(data['price'])
-    except (ValueError, TypeError):
-        return jsonify({"message": "خطأ: السعر يجب أن يكون رقمًا صالحًا."}), 400
+def gemini_timeout_response(message_key="message"):
+    return jsonify({message_key: "عذراً، استغرق مساعد الذكاء الاصطناعي وقتاً أطول من المتوقع. يرجى المحاولة مجدداً."}), 504
 
-    hotel_image_url = data.get('hotel_image_url', None)
 
-    booking_id = db_manager.insert_booking(user_id, user_name, hotel_name, city, check_in, check_out, price, hotel_image_url)
-    
-    if booking_id:
-        return jsonify({
-            "message": "تم تأكيد الحجز بنجاح!",
-            "booking_id": booking_id
-        }), 201
-    else:
-        return jsonify({"message": "فشل في حفظ الحجز في قاعدة البيانات."}), 500
+gemini_executor = GeminiExecutor()
 
 
-@app.route('/api/bookings', methods=['GET'])
-@login_required
-def get_user_bookings():
-    bookings_data = db_manager.fetch_user_bookings(current_user.id)
-    return jsonify(bookings_data)
+def start_gemini_warmup():
+    """التجهيز المسبق في خيط خلفي حتى لا يتأخر تشغيل الخادم (يتطلب مفتاح API).
 
+    يُستدعى داخل كل عملية عاملة: عميل gRPC لا يصلح للمشاركة عبر fork.
+    """
+    if not os.environ.get("GEMINI_API_KEY"):
+        return
+    threading.Thread(target=model_registry.warm_up, name="gemini-warmup", daemon=True).start()
 
-@app.route('/api/booking/<int:booking_id>', methods=['DELETE'])
-@login_required
-def delete_booking(booking_id):
-    """نقطة نهاية لحذف حجز معين."""
-    if db_manager.delete_booking(booking_id, current_user.id):
-        print(f"🗑️ تم حذف الحجز (ID: {booking_id}) بواسطة المستخدم (ID: {current_user.id})")
-        return jsonify({"message": "تم إلغاء الحجز بنجاح."}), 200
-    else:
-        # قد يكون السبب أن الحجز غير موجود أو لا يخص المستخدم
-        return jsonify({"message": "فشل إلغاء الحجز. قد يكون غير موجود أو لا تملك الصلاحية."}), 404
 
+def response_text(response, fallback="عذراً، لم أتمكن من توليد رد واضح. يرجى المحاولة بسؤال آخر."):
+    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+        return response.candidates[0].content.parts[0].text
+    return fallback
 
-# ----------------------------------------------------
-# 6. نقاط نهاية Gemini API (تم الإصلاح)
-# ----------------------------------------------------
 
-@app.route('/api/gemini/chat', methods=['POST'])
-def gemini_chat():
-    """نقطة نهاية للدردشة باستخدام نموذج Gemini."""
-    data = request.get_json()
+def response_usage(response):
+    """(prompt_tokens, completion_tokens) الفعلية من usage_metadata إن توفرت."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+
+def parse_chat_request():
+    """جسم طلب الدردشة بعد التحقق من أنواعه؛ يعيد (data, prompt, None) أو (None, None, استجابة 400)."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
     user_prompt = data.get('prompt')
-    
     if not user_prompt:
-        return jsonify({"message": "يجب توفير رسالة دردشة."}), 400
+        return None, None, (jsonify({"message": "يجب توفير رسالة دردشة."}), 400)
+    if not isinstance(user_prompt, str):
+        return None, None, (jsonify({"message": "خطأ: الرسالة يجب أن تكون نصاً."}), 400)
+    if len(user_prompt) > CHAT_PROMPT_MAX_CHARS:
+        return None, None, (jsonify({"message": f"الرسالة أطول من {CHAT_PROMPT_MAX_CHARS} حرف."}), 400)
+    session_id = data.get('session_id')
+    if session_id is not None and not isinstance(session_id, str):
+        return None, None, (jsonify({"message": "خطأ: session_id يجب أن يكون نصاً."}), 400)
+    return data, user_prompt, None
+
+
+def resolve_chat_session(data):
+    """الجلسة المطلوبة بـ session_id أو جلسة جديدة؛ يعيد (session, None) أو (None, استجابة خطأ)."""
+    user_id = current_user.id if current_user.is_authenticated else None
+    session_id = data.get('session_id')
+    if not session_id:
+        return chat_sessions.new(user_id), None
+    session = chat_sessions.get(session_id, user_id)
+    if session is None:
+        return None, (jsonify({"message": "جلسة الدردشة غير موجودة أو انتهت صلاحيتها."}), 404)
+    return session, None
+
 
+def build_chat_contents(session, prompt):
+    """السياق المرسل للنموذج: الملخص ثم أحدث الرسائل ضمن CHAT_TOKEN_BUDGET ثم الرسالة الجديدة.
+
+    حجم الطلب لا يتجاوز الميزانية مهما طالت المحادثة؛ إن تأخر التلخيص تسقط أقدم الرسائل من الطلب فقط.
+    """
+    with session.lock:
+        summary, messages = session.summary, list(session.messages)
+    budget = CHAT_TOKEN_BUDGET - (session.summary_tokens if summary else 0)
+    recent = []
+    for message in reversed(messages):
+        budget -= message["tokens"]
+        if budget < 0:
+            break
+        recent.append(message)
+    recent.reverse()
+    # Gemini يتطلب أن يبدأ السجل برسالة من المستخدم وأن تتناوب الأدوار
+    while recent and recent[0]["role"] != "user":
+        recent.pop(0)
+    contents = []
+    if summary:
+        contents.append({"role": "user", "parts": [f"ملخص محادثتنا حتى الآن: {summary}"]})
+        contents.append({"role": "model", "parts": ["حسناً، سأتابع بناءً على هذا الملخص."]})
+    contents.extend({"role": message["role"], "parts": [message["text"]]} for message in recent)
+    contents.append({"role": "user", "parts": [prompt]})
+    return contents
+
+
+def summarize_chat(session, folded):
+    """يلخص الملخص السابق + الرسائل folded في استدعاء واحد ويطبقه على الجلسة."""
+    transcript = "\n".join(
+        f"{'المستخدم' if message['role'] == 'user' else 'المساعد'}: {message['text']}" for message in folded)
+    prompt = (f"الملخص السابق: {session.summary or 'لا يوجد'}\n\n"
+              f"رسائل جديدة يجب دمجها في الملخص:\n{transcript}\n\nاكتب الملخص المحدث.")
+    response = generate_with("summarize", prompt)
+    summary = response_text(response, fallback="")
+    if summary:
+        chat_sessions.compact(session, summary, folded[-1]["id"], *response_usage(response))
+
+
+def _compaction_done(session, future):
+    session.compacting = False
+    error = future.exception()
+    if error is not None:
+        logger.error("تعذر تلخيص جلسة الدردشة: %r", error)
+
+
+def maybe_compact_chat(session):
+    """عند تجاوز الميزانية يُلخص كل ما قبل آخر CHAT_KEEP_MESSAGES رسالة في الخلفية (خارج زمن الرد)."""
+    with session.lock:
+        if session.compacting or session.context_tokens() <= CHAT_TOKEN_BUDGET:
+            return
+        folded = session.messages[:max(len(session.messages) - CHAT_KEEP_MESSAGES, 0)]
+        # تبقى الرسائل المحفوظة بدءاً بدور المستخدم
+        if len(folded) % 2:
+            folded = folded[:-1]
+        if not folded:
+            return
+        session.compacting = True
     try:
-        system_instruction = (
-            "أنت مساعد حجوزات فندقية ذكي وودود. مهمتك هي الإجابة على استفسارات المستخدمين حول السفر، "
-            "تخطيط الرحلات، الأماكن السياحية، والفنادق. ردودك يجب أن تكون باللغة العربية، مختصرة، "
-            "مفيدة، ومناسبة لسياق تطبيق حجز الفنادق. تجنب طلب معلومات شخصية."
-        )
-        
-        # 🌟🌟🌟 إصلاح: العودة إلى استخدام السلسلة النصية (string)
-        # هذا يتوافق مع رسالة خطأ سابقة ("... 'google_search_retrieval'")
-        # ويحل مشكلة Pylance لعدم وجود موديول 'tools'
-        google_search_tool = "google_search_retrieval"
-        
-        model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash', 
-            system_instruction=system_instruction,
-            tools=[]  # 🌟🌟🌟 إصلاح: تم تمرير السلسلة
-        )
-        response = model.generate_content(user_prompt)
-        
-        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-            ai_text = response.candidates[0].content.parts[0].text
-        else:
-            ai_text = "عذراً، لم أتمكن من توليد رد واضح. يرجى المحاولة بسؤال آخر."
+        future = gemini_executor.submit(("summarize", session.id), summarize_chat, session, folded)
+        future.add_done_callback(lambda f: _compaction_done(session, f))
+    except GeminiOverloaded:
+        # المجمع مشغول: نعيد المحاولة بعد الرسالة التالية، والطلب يبقى ضمن الميزانية بالقص
+        session.compacting = False
 
-        return jsonify({"response": ai_text}), 200
 
-    except Exception as e:
-        print(f"خطأ في استدعاء Gemini API (Chat): {e}")
+@bp.route('/api/gemini/chat', methods=['POST'])
+def gemini_chat():
+    """نقطة نهاية للدردشة باستخدام نموذج Gemini.
+
+    🌟 السجل محفوظ في الخادم: يرسل العميل session_id الذي أعيد في أول رد بدل إعادة إرسال المحادثة.
+    """
+    data, user_prompt, error = parse_chat_request()
+    if error:
+        return error
+    session, error = resolve_chat_session(data)
+    if error:
+        return error
+
+    try:
+        # 🌟 النموذج مبني مسبقاً ومشترك بين الطلبات (بدلاً من بنائه مع كل رسالة)
+        # 🌟 التنفيذ في مجمع Gemini المحدود؛ الإرسال المكرر لنفس الرسالة في نفس الجلسة يُدمج في استدعاء واحد
+        contents = build_chat_contents(session, user_prompt)
+        response = gemini_executor.run(("chat", session.id, user_prompt), generate_with, "chat", contents)
+        ai_text = response_text(response)
+        prompt_tokens, completion_tokens = response_usage(response)
+        chat_sessions.append_turn(session, user_prompt, ai_text, prompt_tokens, completion_tokens)
+        maybe_compact_chat(session)
+
+        return jsonify({
+            "response": ai_text,
+            "session_id": session.id,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "session": session.usage()},
+        }), 200
+
+    except GeminiOverloaded:
+        return gemini_busy_response("response")
+    except GeminiTimeout:
+        return gemini_timeout_response("response")
+    except Exception:
+        logger.exception("خطأ في استدعاء Gemini API (Chat)")
         return jsonify({"response": "عذراً، حدث خطأ تقني في الاتصال بمساعد الذكاء الاصطناعي."}), 500
 
-@app.route('/api/gemini/analyze', methods=['POST'])
+
+@bp.route('/api/gemini/chat/sessions/<session_id>', methods=['GET', 'DELETE'])
+def gemini_chat_session(session_id):
+    """سجل الجلسة (الملخص + الرسائل غير الملخصة) وعدادات رموزها، أو حذفها."""
+    user_id = current_user.id if current_user.is_authenticated else None
+    session = chat_sessions.get(session_id, user_id)
+    if session is None:
+        return jsonify({"message": "جلسة الدردشة غير موجودة أو انتهت صلاحيتها."}), 404
+    if request.method == 'DELETE':
+        if not chat_sessions.delete(session):
+            return jsonify({"message": "فشل حذف جلسة الدردشة."}), 500
+        return jsonify({"message": "تم حذف جلسة الدردشة."}), 200
+    with session.lock:
+        messages = [{"role": message["role"], "text": message["text"]} for message in session.messages]
+    return jsonify({"session_id": session.id, "summary": session.summary, "messages": messages,
+                    "usage": session.usage()}), 200
+
+def sse_event(data, event=None):
+    """تنسيق رسالة Server-Sent Events واحدة."""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n" if event else f"data: {payload}\n\n"
+
+
+def ndjson_line(data):
+    """سطر واحد بتنسيق NDJSON."""
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def _cancel_stream(response):
+    # 🌟 إيقاف البث في الـ SDK (gRPC/REST) حتى لا يستمر التوليد بعد انقطاع العميل
+    iterator = getattr(response, "_iterator", None)
+    cancel = getattr(iterator, "cancel", None) or getattr(iterator, "close", None)
+    if cancel:
+        try:
+            cancel()
+        except Exception as e:
+            logger.warning("تعذر إيقاف بث Gemini: %s", e)
+
+
+@bp.route('/api/gemini/chat/stream', methods=['POST'])
+def gemini_chat_stream():
+    """نسخة متدفقة من الدردشة: ترسل أجزاء الرد فور توليدها عبر Server-Sent Events.
+
+    أول حدث (session) يحمل session_id للرسائل التالية، و done يحمل عدادات الرموز.
+    """
+    data, user_prompt, error = parse_chat_request()
+    if error:
+        return error
+    session, error = resolve_chat_session(data)
+    if error:
+        return error
+    contents = build_chat_contents(session, user_prompt)
+
+    # 🌟 البث يخضع لنفس حد التزامن في مجمع Gemini (يُحجز المقعد طوال مدة البث)
+    try:
+        gemini_executor.admit()
+    except GeminiOverloaded:
+        return gemini_busy_response("response")
+    request_id = g.request_id  # المولّد يعمل بعد انتهاء سياق الطلب
+
+    def generate():
+        response = None
+        completed = False
+        started = time.perf_counter()
+        outcome, error = "cancelled", None
+        try:
+            yield sse_event({"session_id": session.id}, event="session")
+            response = model_registry.get("chat").generate_content(
+                contents, stream=True, request_options={"timeout": GEMINI_TIMEOUT})
+            parts = []
+            for chunk in response:
+                if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+                    text = chunk.candidates[0].content.parts[0].text
+                    if text:
+                        parts.append(text)
+                        yield sse_event({"text": text})
+            if not parts:
+                parts.append("عذراً، لم أتمكن من توليد رد واضح. يرجى المحاولة بسؤال آخر.")
+                yield sse_event({"text": parts[0]})
+            completed = True
+            outcome = "ok"
+            # الرد المقطوع (انقطاع العميل) لا يُحفظ في السجل
+            prompt_tokens, completion_tokens = response_usage(response)
+            chat_sessions.append_turn(session, user_prompt, "".join(parts), prompt_tokens, completion_tokens)
+            maybe_compact_chat(session)
+            yield sse_event({"usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                       "session": session.usage()}}, event="done")
+        except GeneratorExit:
+            # العميل أغلق الاتصال: الخادم يستدعي close() على المولّد
+            log_event("chat_stream_cancelled", "تم إلغاء بث الدردشة بعد انقطاع اتصال العميل.", request_id=request_id)
+            raise
+        except Exception as e:
+            outcome, error = "error", e
+            logger.exception("خطأ في استدعاء Gemini API (Chat Stream)", extra={"request_id": request_id})
+            yield sse_event({"response": "عذراً، حدث خطأ تقني في الاتصال بمساعد الذكاء الاصطناعي."}, event="error")
+        finally:
+            if response is not None and not completed:
+                _cancel_stream(response)
+            record_gemini_call("chat", started, outcome, response if completed else None, error)
+
+    stream = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # تعطيل التخزين المؤقت في nginx حتى تصل الأجزاء فوراً
+    })
+    # يُستدعى عند إغلاق الاستجابة دائماً، حتى لو لم يبدأ المولّد
+    stream.call_on_close(gemini_executor.release)
+    return stream
+
+def build_analysis_prompt(booking):
+    booking_details = (
+        f"تفاصيل الحجز المطلوب تحليلها: "
+        f"الفندق: {booking['hotel_name']}، "
+        f"المدينة: {booking['city']}، "
+        f"تاريخ الدخول: {booking['check_in']}، "
+        f"تاريخ الخروج: {booking['check_out']}، "
+        f"السعر الإجمالي: {booking['price']}."
+    )
+    return (
+        f"بناءً على تفاصيل الحجز التالية، قم بإنشاء تقرير تحليل مفصل باللغة العربية في تنسيق JSON. "
+        f"{booking_details}"
+    )
+
+
+def parse_analysis_response(response):
+    json_text = response.candidates[0].content.parts[0].text
+    return json.loads(json_text)
+
+
+@bp.route('/api/gemini/analyze', methods=['POST'])
 @login_required
 def gemini_analyze_booking():
     """نقطة نهاية لتحليل حجز محدد باستخدام نموذج Gemini."""
@@ -492,78 +3529,101 @@ def gemini_analyze_booking():
     if not booking:
         return jsonify({"message": "الحجز غير موجود أو لا تملك صلاحية الوصول إليه."}), 404
     
-    booking_details = (
-        f"تفاصيل الحجز المطلوب تحليلها: "
-        f"الفندق: {booking['hotel_name']}، "
-        f"المدينة: {booking['city']}، "
-        f"تاريخ الدخول: {booking['check_in']}، "
-        f"تاريخ الخروج: {booking['check_out']}، "
-        f"السعر الإجمالي: {booking['price']}."
-    )
-
-    try:
-        system_instruction = (
-            "أنت محلل حجوزات فندقية ذكي. مهمتك هي تحليل الحجز المقدم وتقديم تقرير structured JSON. "
-            "يجب أن يتضمن التقرير تقييمًا لقيمة السعر واقتراحات لأنشطة سياحية ممتعة في المدينة المذكورة. "
-            "يجب استخدام أداة Google Search لضمان أن المعلومات حديثة وواقعية (خاصة للأنشطة السياحية)."
-        )
+    prompt = build_analysis_prompt(booking)
 
-        response_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "title": types.Schema(type=types.Type.STRING, description="عنوان جذاب للتحليل"),
-                "price_analysis": types.Schema(type=types.Type.STRING, description="تقييم موجز لقيمة السعر (جيد/عادل/مرتفع) مع تبرير بناءً على الفندق والمدينة"),
-                "activity_suggestions": types.Schema(
-                    type=types.Type.ARRAY,
-                    description="قائمة بـ 3 أنشطة سياحية أو مطاعم أو فعاليات في مدينة الحجز، مع ذكر سبب الاقتراح.",
-                    items=types.Schema(
-                        type=types.Type.OBJECT,
-                        properties={
-                            "name": types.Schema(type=types.Type.STRING),
-                            "reason": types.Schema(type=types.Type.STRING)
-                        },
-                        required=["name", "reason"]
-                    )
-                ),
-                "summary": types.Schema(type=types.Type.STRING, description="ملخص نهائي ونصيحة للمسافر.")
-            },
-            required=["title", "price_analysis", "activity_suggestions", "summary"]
-        )
-        
-        prompt = (
-            f"بناءً على تفاصيل الحجز التالية، قم بإنشاء تقرير تحليل مفصل باللغة العربية في تنسيق JSON. "
-            f"{booking_details}"
-        )
+    # 🌟 نفس الحجز (نفس المحتوى والتعليمات والـ Schema) لا يُرسل للنموذج مرتين
+    cache_key = AnalysisCache.make_key(prompt, ANALYZE_SYSTEM_INSTRUCTION, ANALYSIS_SCHEMA_SPEC)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached), 200
 
-        # 🌟🌟🌟 إصلاح: العودة إلى استخدام السلسلة النصية
-        google_search_tool = "google_search_retrieval"
-
-        model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash',
-            system_instruction=system_instruction,
-            tools=[],  # 🌟🌟🌟 إصلاح: تم تمرير السلسلة
-            # 🌟 طلب JSON منظم
-            generation_config=genai.GenerationConfig(
-                response_mime_type="application/json",
-                response_schema=response_schema
-            )
-        )
-        response = model.generate_content(prompt)
+    try:
+        response = gemini_executor.run(("analyze", cache_key), generate_with, "analyze", prompt)
         
-        json_text = response.candidates[0].content.parts[0].text
-        analysis_data = json.loads(json_text)
+        analysis_data = parse_analysis_response(response)
+        analysis_cache.put(cache_key, booking['id'], analysis_data)
         
         return jsonify(analysis_data), 200
 
-    except Exception as e:
-        print(f"خطأ في استدعاء Gemini API (Analyze): {e}")
+    except GeminiOverloaded:
+        return gemini_busy_response()
+    except GeminiTimeout:
+        return gemini_timeout_response()
+    except Exception:
+        logger.exception("خطأ في استدعاء Gemini API (Analyze)")
         return jsonify({"message": "عذراً، فشل التحليل. تأكد من أن تفاصيل الحجز واضحة."}), 500
 
+
+@bp.route('/api/gemini/analyze/batch', methods=['POST'])
+@login_required
+def gemini_analyze_batch():
+    """تحليل عدة حجوزات (أو جميعها) بالتوازي، وإرسال كل نتيجة فور اكتمالها بتنسيق NDJSON."""
+    data = request.get_json(silent=True) or {}
+    booking_ids = data.get('booking_ids')
+
+    if booking_ids is not None:
+        if not isinstance(booking_ids, list) or not all(isinstance(i, int) for i in booking_ids):
+            return jsonify({"message": "خطأ: booking_ids يجب أن تكون قائمة أرقام."}), 400
+        if len(booking_ids) > ANALYZE_BATCH_MAX:
+            return jsonify({"message": f"خطأ: الحد الأقصى {ANALYZE_BATCH_MAX} حجزاً في الطلب الواحد."}), 400
+
+    # 🌟 استعلام واحد لجميع الحجوزات بدلاً من fetch_booking_by_id لكل حجز
+    bookings = db_manager.fetch_bookings_by_ids(current_user.id, booking_ids, limit=ANALYZE_BATCH_MAX)
+    request_id = g.request_id  # المولّد يعمل بعد انتهاء سياق الطلب
+
+    def generate():
+        pending = {}   # future -> (booking_id, cache_key)
+        queued = []
+        for booking in bookings:
+            prompt = build_analysis_prompt(booking)
+            cache_key = AnalysisCache.make_key(prompt, ANALYZE_SYSTEM_INSTRUCTION, ANALYSIS_SCHEMA_SPEC)
+            cached = analysis_cache.get(cache_key)
+            if cached is not None:
+                yield ndjson_line({"booking_id": booking['id'], "status": 200, "analysis": cached})
+            else:
+                queued.append((booking['id'], cache_key, prompt))
+
+        while queued or pending:
+            # نملأ حتى سقف التزامن، ولا نرسل المزيد إن أغلق العميل الاتصال (GeneratorExit)
+            while queued and len(pending) < ANALYZE_BATCH_CONCURRENCY:
+                booking_id, cache_key, prompt = queued.pop(0)
+                try:
+                    future = gemini_executor.submit(("analyze", cache_key), generate_with, "analyze", prompt)
+                except GeminiOverloaded:
+                    yield ndjson_line({"booking_id": booking_id, "status": 429,
+                                       "message": "عذراً، مساعد الذكاء الاصطناعي مشغول حالياً."})
+                    continue
+                pending[future] = (booking_id, cache_key)
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                booking_id, cache_key = pending.pop(future)
+                try:
+                    analysis_data = parse_analysis_response(future.result())
+                except GeminiTimeout:
+                    yield ndjson_line({"booking_id": booking_id, "status": 504,
+                                       "message": "عذراً، استغرق التحليل وقتاً أطول من المتوقع."})
+                    continue
+                except Exception:
+                    logger.exception("خطأ في استدعاء Gemini API (Analyze Batch)", extra={"request_id": request_id})
+                    yield ndjson_line({"booking_id": booking_id, "status": 500,
+                                       "message": "عذراً، فشل التحليل. تأكد من أن تفاصيل الحجز واضحة."})
+                    continue
+                analysis_cache.put(cache_key, booking_id, analysis_data)
+                yield ndjson_line({"booking_id": booking_id, "status": 200, "analysis": analysis_data})
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
 # ----------------------------------------------------
 # 7. نقاط نهاية المفضلة (تم إصلاح المنطق الداخلي)
 # ----------------------------------------------------
 
-@app.route('/api/favorites/toggle', methods=['POST'])
+@bp.route('/api/favorites/toggle', methods=['POST'])
 @login_required
 def toggle_favorite():
     data = request.get_json()
@@ -573,40 +3633,521 @@ def toggle_favorite():
     if not item_name or not city:
         return jsonify({"message": "يجب توفير اسم العنصر والمدينة."}), 400
 
-    user_id = current_user.id
-    
-    # 🌟 تم إصلاح منطق db_manager
-    if db_manager.is_favorite(user_id, item_name):
-        # إلغاء التفضيل
-        db_manager.remove_favorite(user_id, item_name)
-        is_favorite = False
-        message = "تم إلغاء التفضيل بنجاح."
-    else:
-        # التفضيل
-        db_manager.add_favorite(user_id, item_name, city)
-        is_favorite = True
-        message = "تم التفضيل بنجاح."
+    # 🌟 معاملة واحدة بدلاً من is_favorite ثم add/remove (ثلاثة اتصالات وتسابق بين النقرات)
+    is_favorite = db_manager.toggle_favorite(current_user.id, item_name, city)
+    if is_favorite is None:
+        return jsonify({"success": False, "message": "فشل تحديث المفضلة."}), 500
 
+    message = "تم التفضيل بنجاح." if is_favorite else "تم إلغاء التفضيل بنجاح."
     return jsonify({"success": True, "is_favorite": is_favorite, "message": message}), 200
 
-@app.route('/api/favorites', methods=['GET'])
+@bp.route('/api/favorites/batch', methods=['POST'])
+@login_required
+def favorites_batch():
+    """تطبيق عدة تغييرات على المفضلة دفعة واحدة: items = [{item_name, city, is_favorite}, ...]."""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"message": "يجب توفير قائمة التغييرات (items)."}), 400
+    if len(items) > FAVORITES_BATCH_MAX:
+        return jsonify({"message": f"خطأ: الحد الأقصى {FAVORITES_BATCH_MAX} تغييراً في الطلب الواحد."}), 400
+
+    # الحالة المطلوبة لكل عنصر (آخر تغيير للعنصر نفسه هو المعتمد)
+    desired = {}
+    for item in items:
+        if not isinstance(item, dict) or not item.get('item_name') or not isinstance(item.get('is_favorite'), bool):
+            return jsonify({"message": "خطأ: كل عنصر يحتاج item_name و is_favorite."}), 400
+        if item['is_favorite'] and not item.get('city'):
+            return jsonify({"message": "يجب توفير اسم العنصر والمدينة."}), 400
+        desired[item['item_name']] = item
+
+    adds = [(name, item['city']) for name, item in desired.items() if item['is_favorite']]
+    removes = [name for name, item in desired.items() if not item['is_favorite']]
+    state = db_manager.apply_favorites_batch(current_user.id, adds, removes)
+    if state is None:
+        return jsonify({"success": False, "message": "فشل تحديث المفضلة."}), 500
+    return jsonify({"success": True, "favorites": state}), 200
+
+@bp.route('/api/favorites', methods=['GET'])
 @login_required
 def get_favorites():
-    """جلب قائمة المفضلة للمستخدم."""
-    user_id = current_user.id
-    favorites = db_manager.fetch_user_favorites(user_id)
-    return jsonify(favorites), 200
+    """جلب قائمة المفضلة للمستخدم (مرقمة، مع ETag)."""
+    return collection_page_response("favorites", db_manager.fetch_user_favorites)
+
+
+# ----------------------------------------------------
+# 8. 🌟 نقاط نهاية كتالوج الفنادق والبحث
+# ----------------------------------------------------
+
+@bp.route('/api/hotels/search', methods=['GET'])
+def search_hotels():
+    """بحث في كتالوج الفنادق مرتب من الأرخص مع ترقيم بالمؤشر (cursor)."""
+    args = request.args
+    try:
+        min_rating = args.get('min_rating', type=float)
+        min_price = args.get('min_price', type=float)
+        max_price = args.get('max_price', type=float)
+        limit = min(max(args.get('limit', HOTELS_PAGE_SIZE, type=int), 1), HOTELS_MAX_PAGE_SIZE)
+        after = decode_hotels_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError):
+        return jsonify({"message": "خطأ: معايير البحث غير صالحة."}), 400
+
+    results, next_cursor = db_manager.search_hotels(
+        city=args.get('city') or None,
+        min_rating=min_rating,
+        min_price=min_price,
+        max_price=max_price,
+        text=args.get('q') or None,
+        after=after,
+        limit=limit,
+    )
+    return jsonify({"results": results, "next_cursor": next_cursor}), 200
+
+
+# 🌟 محرك مقارنة الأسعار: السعر(فندق، موقع، يوم) = الأساس × معامل الموقع للفندق × عرض الموقع لليوم × موسم اليوم.
+# كل معامل مشتق بتجزئة ثابتة من (المعرف، الموقع، التاريخ) فتتطابق الأسعار بين العمال وعبر إعادة التشغيل دون تخزينها،
+# والمصفوفة الكاملة لا تُحفظ: تُبنى على دفعات لحساب الأرخص والفارق، ويُعاد بناء صف فندق واحد عند طلبه.
+_HASH_GOLDEN = 0x9E3779B97F4A7C15
+_HASH_MIX_1 = 0xBF58476D1CE4E5B9
+_HASH_MIX_2 = 0x94D049BB133111EB
+PRICE_KEY_BASE = 1
+PRICE_KEY_SITE = 2
+PRICE_KEY_PROMO = 3
+PRICE_WEEKEND_FACTOR = 1.12   # الجمعة والسبت
+
+
+def hash_uniform(np, seed, *keys):
+    """أعداد منتظمة في [0, 1) ثابتة لكل تركيبة مفاتيح (splitmix64)، متجهة على مصفوفات مفاتيح قابلة للبث."""
+    h = np.asarray(seed, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for key in keys:
+            h = h ^ (np.asarray(key, dtype=np.uint64) + np.uint64(_HASH_GOLDEN))
+            h = (h ^ (h >> np.uint64(30))) * np.uint64(_HASH_MIX_1)
+            h = (h ^ (h >> np.uint64(27))) * np.uint64(_HASH_MIX_2)
+            h = h ^ (h >> np.uint64(31))
+    return (h >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+class PriceSnapshot:
+    """نتيجة تمريرة كاملة لمحرك الأسعار؛ لا تتغير بعد نشرها فيقرؤها أي خيط دون قفل.
+
+    المصفوفات بشكل (فنادق، أيام) بترتيب hotel_ids، وإحصاءات المدن بشكل (مدن، أيام).
+    """
+
+    def __init__(self, version, fingerprint, start, dates, sites, hotel_ids, ratings, today_prices,
+                 cheapest_price, cheapest_site, spread, cities, city_counts, city_min, city_mean, city_spread,
+                 compute_ms):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.start = start
+        self.dates = dates
+        self.sites = sites
+        self.hotel_ids = hotel_ids
+        self.ratings = ratings
+        self.today_prices = today_prices
+        self.cheapest_price = cheapest_price
+        self.cheapest_site = cheapest_site
+        self.spread = spread
+        self.cities = cities
+        self.city_counts = city_counts
+        self.city_min = city_min
+        self.city_mean = city_mean
+        self.city_spread = city_spread
+        self.compute_ms = compute_ms
+        self.generated_at = time.time()
+
+    def positions(self, hotel_ids):
+        """مواقع المعرفات في اللقطة (بحث ثنائي)؛ -1 للمعرف غير الموجود."""
+        import numpy as np
+        ids = np.asarray(hotel_ids, dtype=np.int64)
+        found = np.searchsorted(self.hotel_ids, ids)
+        found[found >= len(self.hotel_ids)] = 0
+        return np.where(self.hotel_ids[found] == ids, found, -1) if len(self.hotel_ids) else np.full(len(ids), -1)
+
+
+class PriceEngine:
+    """يحسب لقطات مقارنة الأسعار بتمريرات NumPy متجهة وينشرها بإصدار ثابت يصلح ETag.
+
+    current() يعيد اللقطة المنشورة ويعيد الحساب فقط عند تغير اليوم أو الكتالوج (مع فحص الكتالوج
+    مرة كل max_age ثانية)؛ أثناء إعادة الحساب يستمر بقية الخيوط في خدمة اللقطة السابقة.
+    ensure_today() يبدأ ذلك في خيط خلفي عند التشغيل وأول طلب بعد تغير التاريخ، فتُكتب أسعار اليوم
+    في جدول الفنادق دون انتظار طلب مقارنة.
+    """
+
+    def __init__(self, sites=BOOKING_SITES, days=PRICE_ENGINE_DAYS, chunk=PRICE_ENGINE_CHUNK,
+                 max_age=PRICE_SNAPSHOT_MAX_AGE):
+        self.sites = list(sites)
+        self.days = days
+        self.chunk = chunk
+        self.max_age = max_age
+        self._snapshot = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._pending = False
+        self._pid = os.getpid()
+        self.builds = 0
+        self.write_backs = 0
+
+    def _check_fork(self):
+        """بعد fork قد يكون قفل الحساب أو علم الخيط الخلفي موروثاً من خيط لم ينتقل إلى الابنة."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._pending = False
+
+    def _site_keys(self, np):
+        return np.array([int(hashlib.sha256(site.encode("utf-8")).hexdigest()[:15], 16) for site in self.sites],
+                        dtype=np.uint64)
+
+    def _day_factors(self, np, start):
+        """(مواقع، أيام): عرض كل موقع في كل يوم (±3%) مضروباً في موسم اليوم."""
+        ordinals = np.arange(start.toordinal(), start.toordinal() + self.days, dtype=np.int64)
+        # date.weekday(): الاثنين = 0، فالجمعة والسبت 4 و 5؛ وordinal 1 (0001-01-01) كان اثنين
+        weekend = np.isin((ordinals - 1) % 7, (4, 5))
+        season = np.where(weekend, PRICE_WEEKEND_FACTOR, 1.0)
+        promo = 0.97 + 0.06 * hash_uniform(np, PRICE_KEY_PROMO, self._site_keys(np)[:, None], ordinals[None, :])
+        return (promo * season[None, :]).astype(np.float32)
+
+    def _price_block(self, np, hotel_ids, ratings, site_keys, day_factors):
+        """الأسعار (مواقع، أيام، فنادق) لدفعة فنادق، بنفس مدى generate_simulated_prices.
+
+        المواقع في المحور الأول: min/max عبرها عمليات عنصرية على شرائح متجاورة بدل اختزال متقطع،
+        والفنادق في الأخير: حلقة الضرب الداخلية بطول الدفعة لا بطول الأيام.
+        """
+        base = (150 + np.floor(ratings * 50)
+                + np.floor(hash_uniform(np, PRICE_KEY_BASE, hotel_ids) * 301)).astype(np.float32)
+        site_factor = (0.95 + 0.10 * hash_uniform(np, PRICE_KEY_SITE, site_keys[:, None], hotel_ids[None, :])
+                       ).astype(np.float32)
+        block = np.multiply((site_factor * base[None, :])[:, None, :], day_factors[:, :, None])
+        return np.rint(block, out=block)
+
+    def compute(self, hotel_ids, cities, ratings, start=None, fingerprint=None):
+        """لقطة جديدة من مدخلات الكتالوج (hotel_ids مرتبة تصاعدياً)؛ لا تلمس قاعدة البيانات."""
+        import numpy as np
+        started = time.perf_counter()
+        start = start or date.today()
+        ids = np.asarray(hotel_ids, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        count, n_sites = len(ids), len(self.sites)
+        site_keys = self._site_keys(np)
+        day_factors = self._day_factors(np, start)
+
+        today_prices = np.empty((count, n_sites), dtype=np.float32)
+        cheapest_price = np.empty((count, self.days), dtype=np.float32)
+        cheapest_site = np.empty((count, self.days), dtype=np.int16)
+        spread = np.empty((count, self.days), dtype=np.float32)
+        # مفتاح = السعر × عدد المواقع + رقم الموقع: تمريرة min واحدة تعطي الأرخص وموقعه (أول موقع عند التعادل
+        # مثل argmin) بدل argmin البطيء؛ دقيق في float32 ما دام السعر × عدد المواقع < 2^24
+        site_index = np.arange(n_sites, dtype=np.float32)[:, None, None]
+        for lo in range(0, count, self.chunk):
+            hi = min(lo + self.chunk, count)
+            block = self._price_block(np, ids[lo:hi], ratings[lo:hi], site_keys, day_factors)
+            today_prices[lo:hi] = block[:, 0, :].T
+            highest = block.max(axis=0)
+            block *= n_sites
+            block += site_index
+            keys = block.min(axis=0)
+            sites = np.fmod(keys, n_sites)
+            cheapest_site[lo:hi] = sites.T
+            cheapest_price[lo:hi] = ((keys - sites) / n_sites).T
+            spread[lo:hi] = highest.T - cheapest_price[lo:hi]
+
+        # إحصاءات المدن: فرز الفنادق حسب رمز المدينة ثم اختزال كل مقطع متجاور (reduceat)
+        names = list(dict.fromkeys(cities))
+        city_index = {name: code for code, name in enumerate(names)}
+        codes = np.fromiter(map(city_index.__getitem__, cities), dtype=np.int64, count=count)
+        if count:
+            order = np.argsort(codes, kind="stable")
+            sorted_codes = codes[order]
+            starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+            counts = np.diff(np.r_[starts, count])
+            by_city = cheapest_price[order]
+            city_min = np.minimum.reduceat(by_city, starts, axis=0)
+            city_mean = np.add.reduceat(by_city.astype(np.float64), starts, axis=0) / counts[:, None]
+            city_spread = np.add.reduceat(spread[order].astype(np.float64), starts, axis=0) / counts[:, None]
+            cities = [names[code] for code in sorted_codes[starts]]
+        else:
+            counts = city_min = city_mean = city_spread = np.empty((0, self.days))
+            cities = []
+
+        dates = [(start + timedelta(days=offset)).isoformat() for offset in range(self.days)]
+        fingerprint = fingerprint if fingerprint is not None else (count, int(ids[-1]) if count else 0,
+                                                                   float(ratings.sum()))
+        version = hashlib.sha256(json.dumps([dates[0], self.days, self.sites, list(fingerprint)]).encode()
+                                 ).hexdigest()[:16]
+        return PriceSnapshot(version, fingerprint, start, dates, list(self.sites), ids, ratings, today_prices,
+                             cheapest_price, cheapest_site, spread, cities, counts, city_min, city_mean,
+                             city_spread, (time.perf_counter() - started) * 1000)
+
+    def hotel_matrix(self, snapshot, positions):
+        """يعيد بناء (فنادق، مواقع، أيام) لفنادق محددة من اللقطة؛ نفس الحساب فلا حاجة لتخزين المصفوفة."""
+        import numpy as np
+        block = self._price_block(np, snapshot.hotel_ids[positions], snapshot.ratings[positions],
+                                  self._site_keys(np), self._day_factors(np, snapshot.start))
+        return block.transpose(2, 0, 1)
+
+    def ensure_today(self, db):
+        """يبدأ حساب لقطة اليوم وكتابتها في خيط خلفي إن لم توجد أو تغير التاريخ؛ لا ينتظر."""
+        self._check_fork()
+        snapshot = self._snapshot
+        if (snapshot is not None and snapshot.start == date.today()) or self._pending:
+            return
+        self._pending = True
+        threading.Thread(target=self._refresh_pending, args=(db,), name="price-refresh", daemon=True).start()
+
+    def _refresh_pending(self, db):
+        try:
+            self.current(db)
+        except Exception:
+            logger.exception("فشل تحديث لقطة الأسعار")
+        finally:
+            self._pending = False
+
+    def current(self, db):
+        self._check_fork()
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and snapshot.start == date.today() and now - self._checked < self.max_age:
+            return snapshot
+        # خيط واحد يعيد الفحص/الحساب؛ البقية تخدم اللقطة الحالية إن وُجدت بدل الانتظار
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.start != date.today() or time.monotonic() - self._checked >= self.max_age:
+                if snapshot is None or snapshot.start != date.today() or db.hotels_fingerprint() != snapshot.fingerprint:
+                    snapshot = self.refresh(db)
+                self._checked = time.monotonic()
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def refresh(self, db, background=True):
+        """يحسب لقطة من الكتالوج الحالي وينشرها، ثم يكتب أسعار اليوم في جدول الفنادق (بخيط خلفي افتراضياً)
+        حتى يعرض البحث والمفضلة ويحفظ الحجز نفس السعر الذي تعرضه المقارنة."""
+        fingerprint = db.hotels_fingerprint()
+        hotel_ids, cities, ratings = db.hotel_price_inputs()
+        snapshot = self.compute(hotel_ids, cities, ratings, fingerprint=fingerprint)
+        self._snapshot = snapshot
+        self._checked = time.monotonic()
+        self.builds += 1
+        log_event("price_snapshot", f"لقطة أسعار {snapshot.version}", version=snapshot.version, hotels=len(hotel_ids),
+                  sites=len(self.sites), days=self.days, compute_ms=round(snapshot.compute_ms, 1))
+        if background:
+            threading.Thread(target=self.write_back, args=(db, snapshot), daemon=True).start()
+        else:
+            self.write_back(db, snapshot)
+        return snapshot
+
+    def write_back(self, db, snapshot):
+        sites = snapshot.sites
+        cheapest = snapshot.cheapest_site[:, 0].tolist()
+        rows = [
+            (json.dumps(dict(zip(sites, prices)), ensure_ascii=False), prices[site], sites[site], hotel_id)
+            for hotel_id, prices, site in zip(snapshot.hotel_ids.tolist(),
+                                              snapshot.today_prices.astype(int).tolist(), cheapest)
+        ]
+        db.apply_hotel_prices(rows)
+        self.write_backs += 1
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "builds": self.builds,
+            "write_backs": self.write_backs,
+            "hotels": len(snapshot.hotel_ids) if snapshot else 0,
+            "sites": len(self.sites),
+            "days": self.days,
+            "last_compute_ms": snapshot.compute_ms if snapshot else 0.0,
+        }
+
+
+price_engine = PriceEngine()
+
+
+@bp.before_app_request
+def refresh_prices_for_today():
+    # فحص رخيص (تاريخ اللقطة فقط)؛ الحساب نفسه في خيط خلفي والطلب الحالي لا ينتظره
+    if current_app.config["PRICE_AUTO_REFRESH"] and db_manager is not None:
+        price_engine.ensure_today(db_manager)
+
+
+def price_summary(snapshot, city=None):
+    """ملخص المدن: أرخص سعر ومتوسط الأرخص ومتوسط الفارق بين أغلى وأرخص موقع، لكل يوم."""
+    rows = []
+    for index, name in enumerate(snapshot.cities):
+        if city and name != city:
+            continue
+        rows.append({
+            "city": name,
+            "hotels": int(snapshot.city_counts[index]),
+            "min_price": snapshot.city_min[index].astype(int).tolist(),
+            "avg_cheapest": snapshot.city_mean[index].round(2).tolist(),
+            "avg_spread": snapshot.city_spread[index].round(2).tolist(),
+        })
+    return rows
+
+
+def price_details(snapshot, hotel_ids):
+    """أسعار كل موقع لكل يوم لفنادق محددة، مع الأرخص والفارق؛ والمعرفات غير الموجودة في missing."""
+    positions = snapshot.positions(hotel_ids)
+    found = positions[positions >= 0]
+    matrix = price_engine.hotel_matrix(snapshot, found).astype(int) if len(found) else []
+    hotels = []
+    for row, position in enumerate(found.tolist()):
+        hotels.append({
+            "id": int(snapshot.hotel_ids[position]),
+            "prices": dict(zip(snapshot.sites, matrix[row].tolist())),
+            "cheapest_price": snapshot.cheapest_price[position].astype(int).tolist(),
+            "cheapest_site": [snapshot.sites[site] for site in snapshot.cheapest_site[position].tolist()],
+            "spread": snapshot.spread[position].astype(int).tolist(),
+        })
+    missing = [hotel_id for hotel_id, position in zip(hotel_ids, positions.tolist()) if position < 0]
+    return hotels, missing
+
+
+def booking_price(snapshot, hotel_id, day, site=None):
+    """سعر الليلة لفندق في يوم الوصول من اللقطة: أرخص موقع، أو موقع محدد. None إذا لم يكن الفندق في اللقطة.
+
+    يوم خارج نافذة اللقطة يُسعَّر بأسعار اليوم الأول (نفس ما يعرضه البحث).
+    """
+    position = int(snapshot.positions([hotel_id])[0])
+    if position < 0:
+        return None
+    offset = day - date_to_day(snapshot.dates[0])
+    if not 0 <= offset < len(snapshot.dates):
+        offset = 0
+    if site is None:
+        return int(snapshot.cheapest_price[position, offset])
+    matrix = price_engine.hotel_matrix(snapshot, snapshot.positions([hotel_id]))
+    return int(matrix[0, snapshot.sites.index(site), offset])
+
+
+@bp.route('/api/hotels/prices', methods=['GET'])
+def hotel_prices():
+    """مقارنة الأسعار لأيام PRICE_ENGINE_DAYS القادمة من آخر لقطة.
+
+    بدون hotel_id: ملخص المدن (اختيارياً ?city=). مع hotel_id (يتكرر حتى PRICE_QUERY_MAX_HOTELS):
+    أسعار كل موقع لكل يوم. ETag هو إصدار اللقطة، فالعميل يعيد التحقق بـ 304 حتى تتغير.
+    """
+    try:
+        hotel_ids = [int(value) for value in request.args.getlist('hotel_id')]
+    except ValueError:
+        return jsonify({"message": "خطأ: hotel_id يجب أن يكون رقماً صحيحاً."}), 400
+    if len(hotel_ids) > PRICE_QUERY_MAX_HOTELS:
+        return jsonify({"message": f"خطأ: الحد الأقصى {PRICE_QUERY_MAX_HOTELS} فندقاً في الطلب."}), 400
+    try:
+        snapshot = price_engine.current(db_manager)
+    except ImportError:
+        return jsonify({"message": "خدمة مقارنة الأسعار غير متاحة حالياً (numpy غير مثبت)."}), 503
+
+    etag = f"prices-{snapshot.version}"
+    cache_control = f"public, max-age={price_engine.max_age}"
+    if request.if_none_match.contains_weak(etag):
+        not_modified = Response(status=304)
+        not_modified.set_etag(etag)
+        not_modified.headers['Cache-Control'] = cache_control
+        return not_modified
+
+    payload = {
+        "version": snapshot.version,
+        "generated_at": snapshot.generated_at,
+        "dates": snapshot.dates,
+        "sites": snapshot.sites,
+    }
+    if hotel_ids:
+        payload["hotels"], payload["missing"] = price_details(snapshot, hotel_ids)
+    else:
+        payload["cities"] = price_summary(snapshot, request.args.get('city') or None)
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+@bp.cli.command("reprice")
+def reprice_command():
+    """حساب لقطة أسعار جديدة وكتابة أسعار اليوم في جدول الفنادق."""
+    snapshot = price_engine.refresh(db_manager, background=False)
+    click.echo(f"الإصدار {snapshot.version}: {len(snapshot.hotel_ids)} فندق خلال {snapshot.compute_ms:.0f}ms")
 
 
 # ----------------------------------------------------
-# 8. تشغيل الخادم
+# 9. مصنع التطبيق وتشغيل الخادم
 # ----------------------------------------------------
+
+# أزمنة تشغيل العملية الحالية (بالمللي ثانية)؛ تُملأ في create_app() و gemini_sdk()
+startup_stats = {}
+
+# 🌟 دوال stats() الحالية تظهر في /api/metrics كـ gauges
+metrics.register_collector("user_cache", user_cache.stats)
+metrics.register_collector("password_hasher", lambda: password_hasher.stats())
+metrics.register_collector("collection_cache", lambda: db_manager.collections.stats() if db_manager else {})
+metrics.register_collector("group_commit", lambda: db_manager.writer.stats() if db_manager and db_manager.writer else {})
+metrics.register_collector("analysis_cache", lambda: analysis_cache.memory.stats() if analysis_cache else {})
+metrics.register_collector("chat_sessions", lambda: chat_sessions.stats() if chat_sessions else {})
+metrics.register_collector("gemini_executor", gemini_executor.stats)
+metrics.register_collector("gemini_models", model_registry.stats)
+metrics.register_collector("price_engine", price_engine.stats)
+metrics.register_collector("logging", lambda: log_handler.stats())
+metrics.register_collector("startup", lambda: startup_stats)
+
+
+@bp.cli.command("init-db")
+def init_db_command():
+    """تطبيق ترحيلات المخطط دون تشغيل الخادم (مثلاً قبل نشر إصدار جديد)."""
+    started = time.perf_counter()
+    init_db(current_app.config["DATABASE_FILE"])
+    click.echo(f"قاعدة البيانات جاهزة خلال {(time.perf_counter() - started) * 1000:.0f}ms.")
+
+
+def create_app(config=None):
+    """يبني تطبيق Flask: الإعدادات، CORS، Flask-Login، المسارات، ثم تهيئة قاعدة البيانات.
+
+    config قاموس اختياري يغلب الإعدادات الافتراضية، مثل:
+      DATABASE_FILE، SECRET_KEY، INIT_DB (False لتأجيل init_db)، GEMINI_WARMUP، PRICE_AUTO_REFRESH.
+    آمن مع gunicorn --preload: لا يبقي اتصالات SQLite مفتوحة ولا يستورد Gemini.
+    """
+    started = time.perf_counter()
+    # 🌟 تحسين: تحديد مجلد 'static' لتقديم ملفات الواجهة الأمامية (HTML/JS/CSS)
+    # هذا يحل مشكلة file:/// و CORS
+    app = Flask(__name__, static_folder='static', static_url_path='')
+    app.json = FastJSONProvider(app)
+    app.config.update(
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'a_very_secret_key_for_session'),
+        DATABASE_FILE=DATABASE_FILE,
+        INIT_DB=True,
+        GEMINI_WARMUP=os.environ.get("GEMINI_WARMUP", "1") == "1",
+        PRICE_AUTO_REFRESH=os.environ.get("PRICE_AUTO_REFRESH", "1") == "1",
+    )
+    if config:
+        app.config.update(config)
+
+    CORS(app, supports_credentials=True, expose_headers=['ETag', 'X-Next-After-Id'])
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+
+    if app.config["INIT_DB"]:
+        db_started = time.perf_counter()
+        try:
+            init_db(app.config["DATABASE_FILE"])
+        except Exception:
+            logger.exception("فشل في تهيئة قاعدة البيانات")
+        startup_stats["db_init_ms"] = (time.perf_counter() - db_started) * 1000
+    if app.config["GEMINI_WARMUP"]:
+        start_gemini_warmup()
+    if app.config["PRICE_AUTO_REFRESH"] and db_manager is not None:
+        price_engine.ensure_today(db_manager)
+
+    startup_stats["create_app_ms"] = (time.perf_counter() - started) * 1000
+    log_event("app_ready", "تم تجهيز التطبيق", create_app_ms=round(startup_stats["create_app_ms"], 1),
+              db_init_ms=round(startup_stats.get("db_init_ms", 0), 1))
+    return app
+
+
 if __name__ == '__main__':
-    # db_manager.create_tables() # 🌟 يتم استدعاؤها الآن في __init__
+    # خادم التطوير فقط؛ للإنتاج: gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
     print(">>> تشغيل الخادم على http://127.0.0.1:5000 <<<")
     print(">>> اضغط CTRL+C للإيقاف <<<")
-<<<<<<< HEAD
-    app.run(debug=True, host='0.0.0.0', port=5000)
-=======
     app.run(debug=True, host='0.0.0.0', port=5000)
->>>>>>> 9bd2d8d55bf9254d1298665f3a13d2fdb9312f0d
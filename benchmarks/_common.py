@@ -0,0 +1,49 @@
+"""أدوات مشتركة بين المقاييس: مسار المستودع، بيئة بقاعدة بيانات مؤقتة، وتوقيت الاستدعاءات.
+
+كل مقياس يبدأ بـ `from _common import ...` (مجلد السكربت على sys.path عند تشغيله مباشرة)،
+فيُضاف جذر المستودع إلى sys.path هنا ويصبح `import app` متاحاً.
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def bench_env(**overrides):
+    """يوجه التطبيق إلى قاعدة بيانات في مجلد مؤقت جديد ويعطل الأعمال الخلفية عند التشغيل؛ يعيد المجلد.
+
+    يُستدعى قبل `import app`: إعدادات الوحدة تُقرأ من البيئة عند الاستيراد. overrides تغلب القيم الافتراضية.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="restavo_bench_")
+    os.environ["DATABASE_FILE"] = os.path.join(tmpdir, "bench.db")
+    os.environ["GEMINI_WARMUP"] = "0"
+    os.environ["PRICE_AUTO_REFRESH"] = "0"
+    os.environ.update(overrides)
+    return tmpdir
+
+
+def setup_app(config=None, quiet=True):
+    """bench_env() ثم create_app(config)؛ يعيد (app_module, flask_app). quiet يسكت سجلات التطبيق."""
+    bench_env()
+    import app as app_module
+    flask_app = app_module.create_app(config)
+    if quiet:
+        app_module.logger.disabled = True
+    return app_module, flask_app
+
+
+def per_call_us(fn, calls):
+    """متوسط زمن الاستدعاء بالميكروثانية: calls عدد مرات fn()، أو قائمة معاملات لكل استدعاء fn(*args)."""
+    started = time.perf_counter()
+    if isinstance(calls, int):
+        for _ in range(calls):
+            fn()
+    else:
+        for args in calls:
+            fn(*args)
+        calls = len(calls)
+    return (time.perf_counter() - started) / calls * 1e6
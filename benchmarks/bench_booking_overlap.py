@@ -0,0 +1,88 @@
+"""قياس فحص تقاطع الحجوزات واستعلام النطاق مع نمو جدول الحجوزات.
+
+لكل حجم: قاعدة جديدة تُملأ بالاستيراد الجماعي (إقامات متتالية غير متقاطعة لكل مستخدم)، ثم يُقاس
+فحص التقاطع عبر R*Tree (bookings_range) مقابل الطريقة القديمة: جلب حجوزات المستخدم وتحليل
+تواريخها النصية في Python، ثم زمن insert_booking مع reject_overlap واستعلام ?from=&to=.
+
+الاستخدام:
+    python benchmarks/bench_booking_overlap.py --sizes 10000 100000 1000000 --users 1000
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+from _common import bench_env, per_call_us
+
+FIRST_DAY = date(2020, 1, 1)
+
+
+def seed_rows(app_module, size, users):
+    """إقامة ليلتين كل ثلاثة أيام لكل مستخدم، موزعة بالتناوب على المستخدمين."""
+    for n in range(size):
+        user_id = n % users + 1
+        check_in = FIRST_DAY + timedelta(days=3 * (n // users))
+        yield (user_id, f"user_{user_id}", "فندق", "دبي", check_in.isoformat(),
+               (check_in + timedelta(days=2)).isoformat(), 300.0, None,
+               app_module.date_to_day(check_in), app_module.date_to_day(check_in) + 2)
+
+
+def scan_overlaps(db, user_id, check_in, check_out):
+    """الطريقة القديمة: كل حجوزات المستخدم ثم مقارنة التواريخ النصية بعد تحليلها."""
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, check_in, check_out FROM bookings WHERE user_id = ?", (user_id,)).fetchall()
+    return [row["id"] for row in rows
+            if date.fromisoformat(row["check_in"][:10]) < check_out and date.fromisoformat(row["check_out"][:10]) > check_in]
+
+
+def rtree_overlaps(db, user_id, check_in, check_out, app_module):
+    start, end = app_module.date_to_day(check_in), app_module.date_to_day(check_out)
+    with db.connection() as conn:
+        return [row[0] for row in conn.execute(app_module.BOOKINGS_OVERLAP_SQL, (user_id, user_id, end, start))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmpdir = bench_env()
+    import app as app_module
+    app_module.create_app()
+    app_module.logger.disabled = True
+
+    rng = random.Random(1)
+    print(f"{'bookings':>10}{'per user':>10}{'scan us':>10}{'rtree us':>10}{'insert us':>11}{'range us':>10}")
+    for size in args.sizes:
+        db = app_module.init_db(os.path.join(tmpdir, f"bench_{size}.db"))
+        db.import_bookings(seed_rows(app_module, size, args.users))
+        span = 3 * (size // args.users + 1)
+        probes = []
+        for _ in range(args.queries):
+            check_in = FIRST_DAY + timedelta(days=rng.randrange(span))
+            probes.append((rng.randrange(args.users) + 1, check_in, check_in + timedelta(days=rng.randint(1, 7))))
+        user_id, check_in, check_out = probes[0]
+        assert sorted(scan_overlaps(db, user_id, check_in, check_out)) == \
+            sorted(rtree_overlaps(db, user_id, check_in, check_out, app_module))
+
+        scan = per_call_us(lambda *p: scan_overlaps(db, *p), probes[:max(len(probes) // 10, 1)])
+        rtree = per_call_us(lambda *p: rtree_overlaps(db, *p, app_module), probes)
+        # إدراجات بعد آخر إقامة لكل مستخدم: تمر بالفحص ثم تُكتب
+        future = FIRST_DAY + timedelta(days=span + 10)
+        inserts = [(n % args.users + 1, future + timedelta(days=2 * (n // args.users)))
+                   for n in range(min(args.queries, 500))]
+        insert = per_call_us(lambda user, day: db.insert_booking(
+            user, f"user_{user}", "فندق", "دبي", day.isoformat(), (day + timedelta(days=1)).isoformat(), 300.0,
+            reject_overlap=True), inserts)
+        ranges = [(p[0], app_module.date_to_day(p[1]), app_module.date_to_day(p[2])) for p in probes]
+        db.collections.max_rows = 0
+        in_range = per_call_us(lambda user, start, end: db.fetch_user_bookings(
+            user, limit=50, start_day=start, end_day=end), ranges)
+        print(f"{size:>10}{size // args.users:>10}{scan:>10.1f}{rtree:>10.1f}{insert:>11.1f}{in_range:>10.1f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
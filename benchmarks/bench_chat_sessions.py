@@ -0,0 +1,91 @@
+"""قياس حجم الطلب وزمن كل رسالة مع طول المحادثة: جلسات الخادم مقابل إعادة إرسال السجل كاملاً.
+
+نموذج بديل يحسب الرموز المرسلة (نفس تقدير estimate_tokens) ويحاكي زمناً يتناسب معها:
+latency = --base-latency + رموز الطلب × --token-latency. الوضع "resend" يرسل المحادثة كاملة
+كل مرة (ما كان على العميل فعله مع نقطة نهاية بلا حالة)، و"session" يمر عبر /api/gemini/chat
+مع session_id فيُرسل الملخص وأحدث الرسائل ضمن CHAT_TOKEN_BUDGET فقط.
+
+الاستخدام:
+    python benchmarks/bench_chat_sessions.py --turns 200 --token-latency 0.00002
+"""
+import argparse
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+from _common import setup_app
+
+REPLY = "يمكنك الإقامة في فندق قريب من الشاطئ، والأسعار في هذا الموسم معتدلة مع عروض للإقامة الطويلة. " * 3
+
+
+class TokenModel:
+    def __init__(self, text, base_latency, token_latency, estimate):
+        self.text = text
+        self.base_latency = base_latency
+        self.token_latency = token_latency
+        self.estimate = estimate
+        self.prompt_tokens = []
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        tokens = self.estimate(contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False))
+        self.prompt_tokens.append(tokens)
+        time.sleep(self.base_latency + tokens * self.token_latency)
+        part = SimpleNamespace(text=self.text)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+                               usage_metadata=SimpleNamespace(prompt_token_count=tokens,
+                                                              candidates_token_count=self.estimate(self.text)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--base-latency", type=float, default=0.002, help="بالثواني لكل استدعاء.")
+    parser.add_argument("--token-latency", type=float, default=0.00002, help="بالثواني لكل رمز في الطلب.")
+    args = parser.parse_args()
+
+    app_module, flask_app = setup_app()
+    estimate = app_module.estimate_tokens
+    chat = TokenModel(REPLY, args.base_latency, args.token_latency, estimate)
+    summarize = TokenModel("ملخص: المستخدم يخطط لرحلة عائلية ويقارن الفنادق القريبة من الشاطئ.",
+                           args.base_latency, args.token_latency, estimate)
+    app_module.model_registry.register("chat", lambda: chat)
+    app_module.model_registry.register("summarize", lambda: summarize)
+    prompts = [f"سؤال {n}: ما أفضل فندق للعائلات قرب الشاطئ وما المطاعم القريبة منه؟" for n in range(args.turns)]
+
+    # resend: العميل يرسل السجل كاملاً مع كل رسالة
+    history, resend = [], []
+    for prompt in prompts:
+        history.append({"role": "user", "parts": [prompt]})
+        started = time.perf_counter()
+        response = chat.generate_content(history)
+        resend.append((chat.prompt_tokens[-1], time.perf_counter() - started))
+        history.append({"role": "model", "parts": [response.candidates[0].content.parts[0].text]})
+
+    client = flask_app.test_client()
+    session_id, session = None, []
+    for prompt in prompts:
+        started = time.perf_counter()
+        body = client.post("/api/gemini/chat", json={"prompt": prompt, "session_id": session_id}).get_json()
+        session.append((chat.prompt_tokens[-1], time.perf_counter() - started))
+        session_id = body["session_id"]
+    app_module.gemini_executor._pool.shutdown(wait=True)
+    usage = client.get(f"/api/gemini/chat/sessions/{session_id}").get_json()["usage"]
+
+    print(f"turns={args.turns} budget={app_module.CHAT_TOKEN_BUDGET} tokens, "
+          f"compactions={usage['compactions']} (summary calls={len(summarize.prompt_tokens)})")
+    print(f"{'mode':<10}{'turn':>6}{'prompt tokens':>15}{'latency ms':>12}")
+    checkpoints = sorted({1, 10, 50, args.turns // 2, args.turns} & set(range(1, args.turns + 1)))
+    for mode, results in (("resend", resend), ("session", session)):
+        for turn in checkpoints:
+            tokens, seconds = results[turn - 1]
+            print(f"{mode:<10}{turn:>6}{tokens:>15}{seconds * 1000:>12.1f}")
+        total = sum(tokens for tokens, _ in results)
+        median_ms = statistics.median(seconds for _, seconds in results) * 1000
+        print(f"{mode:<10}{'all':>6}{total:>15}{median_ms:>12.1f}  (total tokens / median latency)")
+    print(f"session accounting: prompt={usage['prompt_tokens']} completion={usage['completion_tokens']} "
+          f"(includes summaries: {sum(summarize.prompt_tokens)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""قياس أداء طبقة الاتصال بـ SQLite (قبل/بعد مجمع الاتصالات).
+
+يشغّل نقاط نهاية الحجوزات والمفضلة عبر Flask test client من عدة خيوط،
+مرة بالسلوك القديم (اتصال جديد لكل عملية) ومرة بمجمع الاتصالات، ويطبع
+عدد الطلبات في الثانية لكل نقطة نهاية.
+
+الاستخدام:
+    python benchmarks/bench_db_pool.py --threads 8 --seconds 5 --bookings 500
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+from _common import setup_app
+
+
+def legacy_db_manager(app_module, db_file):
+    """يُعيد سلوك ما قبل المجمع: اتصال افتراضي جديد يُفتح ويُغلق في كل عملية."""
+    class _LegacyDBManager(app_module.DBManager):
+        def get_db_connection(self):
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            return conn
+    return _LegacyDBManager(db_file, pool_size=0)
+
+
+def seed(app_module, n_bookings, n_favorites):
+    db = app_module.db_manager
+    db.register_user("bench_user", "bench_password")
+    user = db.verify_user("bench_user", "bench_password")
+    for i in range(n_bookings):
+        db.insert_booking(user.id, user.username, f"Hotel {i}", "Dubai", "2025-01-01", "2025-01-05", 100.0 + i)
+    for i in range(n_favorites):
+        db.add_favorite(user.id, f"Hotel {i}", "Dubai")
+
+
+def run_endpoint(flask_app, method, path, body, threads, seconds):
+    counts = [0] * threads
+    stop = time.perf_counter() + seconds
+
+    def worker(idx):
+        client = flask_app.test_client()
+        client.post("/api/login", json={"username": "bench_user", "password": "bench_password"})
+        call = client.get if method == "GET" else client.post
+        while time.perf_counter() < stop:
+            resp = call(path, json=body) if body is not None else call(path)
+            assert resp.status_code < 500, resp.status_code
+            counts[idx] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+ENDPOINTS = [
+    ("GET", "/api/bookings", None),
+    ("GET", "/api/favorites", None),
+    ("POST", "/api/favorites/toggle", {"item_name": "Bench Toggle", "city": "Dubai"}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--favorites", type=int, default=50)
+    args = parser.parse_args()
+
+    app_module, flask_app = setup_app(quiet=False)
+
+    seed(app_module, args.bookings, args.favorites)
+    pooled = app_module.db_manager
+    modes = [
+        ("قبل (اتصال لكل عملية)", legacy_db_manager(app_module, pooled.db_file)),
+        ("بعد (مجمع اتصالات)", pooled),
+    ]
+
+    results = {}
+    for label, manager in modes:
+        app_module.db_manager = manager
+        for method, path, body in ENDPOINTS:
+            results[(label, path)] = run_endpoint(flask_app, method, path, body, args.threads, args.seconds)
+
+    print(f"\nthreads={args.threads} seconds={args.seconds} bookings={args.bookings}")
+    print(f"{'endpoint':<28}{'before req/s':>14}{'after req/s':>14}{'speedup':>10}")
+    for method, path, _ in ENDPOINTS:
+        before = results[(modes[0][0], path)]
+        after = results[(modes[1][0], path)]
+        print(f"{method + ' ' + path:<28}{before:>14.0f}{after:>14.0f}{after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""قياس معدل الكتابة في SQLite (قبل/بعد وضع الكتابة الجماعية group commit).
+
+يشغّل عدة خيوط تستدعي insert_booking و toggle_favorite (مسار /api/favorites/toggle) مباشرة على DBManager،
+مرة بمعاملة لكل عملية ومرة عبر GroupCommitWriter، ويطبع عدد الكتابات في
+الثانية وإحصاءات أحجام الدفعات وزمن الـ commit.
+
+الاستخدام:
+    python benchmarks/bench_group_commit.py --threads 16 --seconds 5 --synchronous FULL
+"""
+import argparse
+import threading
+import time
+
+from _common import bench_env
+
+
+def run_writes(manager, user_id, threads, seconds, run):
+    counts = [0] * threads
+    stop = time.perf_counter() + seconds
+
+    def worker(idx):
+        i = 0
+        while time.perf_counter() < stop:
+            if i % 4 == 3:
+                assert manager.toggle_favorite(user_id, f"Hotel {run}-{idx}-{i}", "Dubai") is True
+            else:
+                assert manager.insert_booking(user_id, "bench_user", f"Hotel {i}", "Dubai",
+                                              "2025-01-01", "2025-01-05", 100.0 + i)
+            i += 1
+            counts[idx] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="NORMAL",
+                        help="FULL يجعل كل commit يستدعي fsync (يوضح أثر تجميع المعاملات).")
+    args = parser.parse_args()
+
+    bench_env()
+    import app as app_module
+    app_module.init_db()
+
+    class BenchDBManager(app_module.DBManager):
+        def get_db_connection(self):
+            conn = super().get_db_connection()
+            conn.execute(f"PRAGMA synchronous={args.synchronous}")
+            return conn
+
+    db_file = app_module.db_manager.db_file
+    app_module.db_manager.register_user("bench_user", "bench_password")
+    user_id = app_module.db_manager.verify_user("bench_user", "bench_password").id
+
+    results = {}
+    for run, (label, group_commit) in enumerate((("قبل (commit لكل عملية)", False), ("بعد (group commit)", True))):
+        manager = BenchDBManager(db_file, group_commit=group_commit)
+        # أسماء مفضلة جديدة في كل تشغيل حتى يبقى كل تبديل إضافة
+        results[label] = run_writes(manager, user_id, args.threads, args.seconds, run)
+        if manager.writer is not None:
+            print(manager.writer.stats())
+        manager.close()
+
+    before, after = results.values()
+    print(f"\nthreads={args.threads} seconds={args.seconds} synchronous={args.synchronous}")
+    print(f"{'before writes/s':>16}{'after writes/s':>16}{'speedup':>10}")
+    print(f"{before:>16.0f}{after:>16.0f}{after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""قياس حجم استجابات JSON على الشبكة وزمن ترميزها لكل نقطة نهاية.
+
+يقارن ثلاثة أوضاع: مزود Flask الافتراضي (ensure_ascii: كل حرف عربي \\uXXXX)، ثم
+FastJSONProvider (UTF-8 خام، و orjson إن كان مثبتاً)، ثم نفسه مع gzip. زمن الترميز
+يُقاس على نفس الكائن بالمزودين خارج دورة الطلب.
+
+الاستخدام:
+    python benchmarks/bench_json_responses.py --bookings 200 --iterations 500
+"""
+import argparse
+import gzip
+
+from _common import per_call_us, setup_app
+
+ENDPOINTS = [
+    "/api/status",
+    "/api/bookings?limit=200",
+    "/api/favorites?limit=200",
+    "/api/hotels/search?limit=50",
+]
+
+# شكل تقرير /api/gemini/analyze (لا يُستدعى Gemini في القياس)
+ANALYSIS_REPORT = {
+    "title": "إقامة مريحة بسعر مناسب في قلب دبي",
+    "price_analysis": "السعر عادل مقارنة بفنادق الفئة نفسها في المنطقة خلال هذا الموسم، خاصة مع الإفطار المجاني.",
+    "activity_suggestions": [
+        {"name": "برج خليفة", "reason": "إطلالة بانورامية على المدينة عند الغروب."},
+        {"name": "سوق الذهب", "reason": "تجربة تسوق تقليدية قريبة من الفندق."},
+        {"name": "حديقة القرآن", "reason": "نزهة هادئة مناسبة للعائلات."},
+    ],
+    "summary": "حجز موفق؛ ننصح بحجز الأنشطة مسبقاً في عطلة نهاية الأسبوع لتجنب الزحام.",
+}
+
+
+def seed(app_module, n_bookings):
+    db = app_module.db_manager
+    db.register_user("bench_user", "bench_password")
+    user = db.verify_user("bench_user", "bench_password")
+    for i in range(n_bookings):
+        db.insert_booking(user.id, user.username, f"فندق الواحة {i}", "دبي",
+                          "2026-03-01", "2026-03-05", 450.0 + i, None)
+    for i in range(min(n_bookings, 50)):
+        db.add_favorite(user.id, f"فندق الواحة {i}", "دبي")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    app_module, flask_app = setup_app()
+    seed(app_module, args.bookings)
+
+    fast = flask_app.json
+    default = DefaultJSONProvider(flask_app)
+    client = flask_app.test_client()
+    client.post("/api/login", json={"username": "bench_user", "password": "bench_password"})
+
+    payloads = {}
+    sizes = {}
+    for path in ENDPOINTS:
+        flask_app.json = default
+        escaped = client.get(path, headers={"Accept-Encoding": "identity"})
+        flask_app.json = fast
+        raw = client.get(path, headers={"Accept-Encoding": "identity"})
+        gzipped = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert escaped.status_code == raw.status_code == gzipped.status_code == 200, path
+        payloads[path] = raw.get_json()
+        sizes[path] = (len(escaped.data), len(raw.data), len(gzipped.data))
+    payloads["analysis (report)"] = ANALYSIS_REPORT
+    with flask_app.app_context():
+        escaped, raw = (provider.response(ANALYSIS_REPORT).get_data() for provider in (default, fast))
+    compressed = gzip.compress(raw, app_module.API_GZIP_LEVEL) if len(raw) >= app_module.API_GZIP_MIN_SIZE else raw
+    sizes["analysis (report)"] = (len(escaped), len(raw), len(compressed))
+
+    print(f"encoder: {'orjson' if app_module.orjson else 'json'}  gzip >= {app_module.API_GZIP_MIN_SIZE} bytes")
+    print(f"{'endpoint':<28}{'escaped B':>11}{'utf-8 B':>10}{'gzip B':>9}{'default us':>12}{'fast us':>10}")
+    with flask_app.app_context():
+        for path, payload in payloads.items():
+            before = per_call_us(lambda: default.response(payload), args.iterations)
+            after = per_call_us(lambda: fast.response(payload), args.iterations)
+            escaped, raw, compressed = sizes[path]
+            print(f"{path:<28}{escaped:>11}{raw:>10}{compressed:>9}{before:>12.1f}{after:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
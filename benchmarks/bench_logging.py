@@ -0,0 +1,124 @@
+"""قياس كلفة السجلات على زمن الطلب: print() المتزامن مقابل log_event عبر الطابور (مع العينات ودونها).
+
+مسار قياس صغير يُضاف للتطبيق يسجل حدث نجاح واحداً لكل طلب (كسطر حذف الحجز أو تسجيل الدخول)،
+وتُرسل الطلبات من عدة خيوط عبر Flask test client. المخرج ملف حقيقي خلف قفل واحد مع تأخير
+--sink-latency لكل سطر، كأنبوب stdout يقرؤه مجمع سجلات الحاوية (مشغولاً أحياناً).
+الكلفة لكل طلب = متوسط زمن الطلب في الوضع - متوسطه دون أي سجل.
+
+الاستخدام:
+    python benchmarks/bench_logging.py --threads 8 --requests 2000 --rounds 5 --sink-latency 0.0001
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import bench_env
+
+
+class SlowSink:
+    """ملف سطري بكاتب واحد في كل لحظة: كل سطر مكتمل يكلف latency ثانية (مثل flush لأنبوب ممتلئ)."""
+
+    def __init__(self, path, latency):
+        self.file = open(path, "w", encoding="utf-8")
+        self.latency = latency
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self.file.write(text)
+            if text.endswith("\n"):
+                self.file.flush()
+                self.lines += 1
+                if self.latency:
+                    time.sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self.file.flush()
+
+
+def run_mode(client_factory, threads, requests):
+    def worker(count):
+        client = client_factory()
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            client.delete("/bench/log/42")
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        timings = [t for part in pool.map(worker, [requests // threads] * threads) for t in part]
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {"rps": len(timings) / elapsed, "mean_us": statistics.fmean(timings) * 1e6,
+            "p50_us": timings[len(timings) // 2] * 1e6, "p99_us": timings[int(len(timings) * 0.99)] * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sink-latency", type=float, default=0.0001, help="بالثواني لكل سطر مكتوب.")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="نسبة العينات لوضع queue+sampled.")
+    args = parser.parse_args()
+
+    tmpdir = bench_env()
+    import app as app_module
+    flask_app = app_module.create_app()
+    sink = SlowSink(os.path.join(tmpdir, "bench.log"), args.sink_latency)
+    app_module.log_handler.target.setStream(sink)
+    # سطر الوصول لكل طلب يُلغى هنا حتى يبقى الحدث المقاس وحده
+    app_module.log_sample_rates["http_request"] = 0.0
+    mode = {"name": "none"}
+
+    @flask_app.route("/bench/log/<int:booking_id>", methods=["DELETE"])
+    def bench_log(booking_id):
+        if mode["name"] == "print":
+            # السلوك السابق: print متزامن إلى stdout داخل خيط الطلب
+            print(f"🗑️ تم حذف الحجز (ID: {booking_id}) بواسطة المستخدم (ID: 7)", file=sink)
+        elif mode["name"] != "none":
+            app_module.log_event("booking_deleted", "تم حذف الحجز", booking_id=booking_id, user_id=7)
+        return "", 204
+
+    modes = [("none", None), ("print", None), ("queue", 1.0), ("queue+sampled", args.sample_rate)]
+    run_mode(flask_app.test_client, args.threads, min(args.requests, 500))  # تسخين
+    # الأوضاع بالتناوب في كل جولة، ثم الوسيط عبر الجولات: تذبذب الـ GIL بين الخيوط كبير في الجولة الواحدة
+    rounds = {name: [] for name, _ in modes}
+    for _ in range(args.rounds):
+        for name, rate in modes:
+            mode["name"] = name
+            if rate is not None:
+                app_module.log_sample_rates["booking_deleted"] = rate
+            lines_before, dropped_before = sink.lines, app_module.log_handler.dropped
+            result = run_mode(flask_app.test_client, args.threads, args.requests)
+            # الطلبات انتهت؛ ما بقي في الطابور يكتبه الخيط الخلفي بعدها
+            started = time.perf_counter()
+            while app_module.log_handler.queue.unfinished_tasks:
+                time.sleep(0.001)
+            result.update(drain_ms=(time.perf_counter() - started) * 1000, lines=sink.lines - lines_before,
+                          dropped=app_module.log_handler.dropped - dropped_before)
+            rounds[name].append(result)
+
+    print(f"{args.threads} threads x {args.requests // args.threads} requests x {args.rounds} rounds, "
+          f"sink latency {args.sink_latency * 1e6:.0f}us/line (medians)")
+    print(f"{'mode':<16}{'rps':>9}{'mean us':>10}{'p50 us':>9}{'p99 us':>10}{'overhead us':>13}"
+          f"{'lines':>8}{'dropped':>9}{'drain ms':>10}")
+    medians = {name: {key: statistics.median(r[key] for r in results) for key in results[0]}
+               for name, results in rounds.items()}
+    for name, result in medians.items():
+        overhead = result["mean_us"] - medians["none"]["mean_us"]
+        print(f"{name:<16}{result['rps']:>9.0f}{result['mean_us']:>10.1f}{result['p50_us']:>9.1f}"
+              f"{result['p99_us']:>10.1f}{overhead:>13.1f}{result['lines']:>8.0f}"
+              f"{result['dropped']:>9.0f}{result['drain_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
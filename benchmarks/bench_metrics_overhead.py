@@ -0,0 +1,44 @@
+"""قياس كلفة القياسات: استعلامات SQLite عبر InstrumentedConnection مقابل الاتصال العادي،
+وطلب HTTP كامل مع/بدون تسجيل زمن الطلب.
+
+الاستخدام:
+    python benchmarks/bench_metrics_overhead.py --iterations 20000
+"""
+import argparse
+import sqlite3
+
+from _common import per_call_us, setup_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    app_module, flask_app = setup_app(quiet=False)
+    db_file = app_module.db_manager.db_file
+
+    query = "SELECT id, name, cheapest_price FROM hotels WHERE city = ? ORDER BY cheapest_price LIMIT 20"
+    print(f"{'case':<32}{'plain us':>10}{'metrics us':>12}")
+    timings = []
+    for factory in (sqlite3.Connection, app_module.InstrumentedConnection):
+        conn = sqlite3.connect(db_file, factory=factory)
+        conn.row_factory = sqlite3.Row
+        timings.append(per_call_us(lambda: conn.execute(query, ("دبي",)).fetchall(), args.iterations))
+        conn.close()
+    print(f"{'SELECT hotels LIMIT 20':<32}{timings[0]:>10.2f}{timings[1]:>12.2f}")
+
+    client = flask_app.test_client()
+    with_hooks = per_call_us(lambda: client.get("/api/status"), args.iterations // 10)
+    hooks = flask_app.before_request_funcs[None], flask_app.after_request_funcs[None]
+    saved = [list(funcs) for funcs in hooks]
+    for funcs in hooks:
+        funcs[:] = [f for f in funcs if f.__name__ not in ("start_request_metrics", "record_request_metrics")]
+    without_hooks = per_call_us(lambda: client.get("/api/status"), args.iterations // 10)
+    for funcs, original in zip(hooks, saved):
+        funcs[:] = original
+    print(f"{'GET /api/status':<32}{without_hooks:>10.2f}{with_hooks:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""قياس تكلفة إعداد نماذج Gemini لكل طلب (قبل/بعد ModelRegistry).
+
+يقارن بناء GenerativeModel مع كل طلب (السلوك القديم) بجلبه من السجل،
+دون أي استدعاء فعلي للنموذج.
+
+الاستخدام:
+    python benchmarks/bench_model_setup.py --iterations 2000
+"""
+import argparse
+
+from _common import bench_env, per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    bench_env()
+    import app as app_module
+
+    builders = {"chat": app_module._build_chat_model, "analyze": app_module._build_analyze_model}
+    print(f"{'model':<10}{'rebuild us/req':>16}{'registry us/req':>17}")
+    for name, build in builders.items():
+        before = per_call_us(build, args.iterations)
+        after = per_call_us(lambda: app_module.model_registry.get(name), args.iterations)
+        print(f"{name:<10}{before:>16.1f}{after:>17.2f}")
+    print(app_module.model_registry.stats())
+
+
+if __name__ == "__main__":
+    main()
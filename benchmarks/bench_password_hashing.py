@@ -0,0 +1,92 @@
+"""قياس إنتاجية تسجيل الدخول وزمنه (p50/p99) عند عدة إعدادات لتكلفة تجزئة كلمات المرور.
+
+لكل طريقة/تكلفة: يسجّل المستخدمين بها ثم يرسل طلبات /api/login متزامنة عبر Flask
+test client، مرة بالتجزئة في خيط الطلب (workers=0) ومرة عبر مجمع العمليات، ويطبع
+عدد تسجيلات الدخول في الثانية و p50/p99 بالمللي ثانية وعدد الطلبات المرفوضة (503)
+عند امتلاء طابور التجزئة. يساعد على اختيار أعلى تكلفة تتحملها السعة المطلوبة.
+
+الاستخدام:
+    python benchmarks/bench_password_hashing.py --threads 16 --logins 200 --workers 4
+"""
+import argparse
+import os
+import threading
+import time
+
+from _common import setup_app
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_logins(flask_app, users, threads, logins):
+    latencies = []
+    shed = [0]
+    lock = threading.Lock()
+    per_thread = max(1, logins // threads)
+
+    def worker(idx):
+        client = flask_app.test_client()
+        username = users[idx % len(users)]
+        local, rejected = [], 0
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            resp = client.post("/api/login", json={"username": username, "password": "bench_password"})
+            if resp.status_code == 503:
+                rejected += 1
+                continue
+            assert resp.status_code == 200, resp.status_code
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            shed[0] += rejected
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return len(latencies) / (time.perf_counter() - started), latencies, shed[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=200, help="عدد تسجيلات الدخول لكل إعداد.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="حجم مجمع العمليات.")
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS)
+    args = parser.parse_args()
+
+    # سجلات تسجيل الدخول الناجح لكل طلب تشوش على المخرجات (setup_app يسكتها)
+    app_module, flask_app = setup_app()
+
+    print(f"threads={args.threads} logins={args.logins} pool_workers={args.workers}")
+    print(f"{'method':<24}{'mode':<8}{'logins/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'shed':>6}")
+    for n, method in enumerate(args.methods):
+        users = [f"bench_{n}_{i}" for i in range(args.threads)]
+        for mode, workers in (("inline", 0), ("pool", args.workers)):
+            app_module.password_hasher.close()
+            app_module.password_hasher = app_module.PasswordHasher(method=method, workers=workers)
+            if mode == "inline":
+                for username in users:
+                    assert app_module.db_manager.register_user(username, "bench_password")
+            rate, latencies, shed = run_logins(flask_app, users, args.threads, args.logins)
+            print(f"{method:<24}{mode:<8}{rate:>10.1f}{percentile(latencies, 50) * 1000:>10.1f}"
+                  f"{percentile(latencies, 99) * 1000:>10.1f}{shed:>6}")
+    app_module.password_hasher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""قياس زمن إعادة حساب لقطة الأسعار (PriceEngine) لكتالوج كبير اصطناعي.
+
+يقيس الحساب المتجه لكل الفنادق × المواقع × الأيام (الأرخص، الفارق، إحصاءات المدن) ويقارنه
+بحلقة Python لكل فندق/موقع/يوم على عينة (بنفس نموذج generate_simulated_prices) مُقدّرة للكتالوج كله.
+لا يلمس قاعدة البيانات: الكتابة في جدول الفنادق تحدث بخيط خلفي خارج مسار الطلب.
+
+الاستخدام:
+    python benchmarks/bench_price_engine.py --hotels 100000 --sites 32 --days 14
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _common import bench_env
+
+
+def python_loop(hotels, sites, days):
+    """المقاربة غير المتجهة: سعر لكل (فندق، موقع، يوم) ثم min/max في Python."""
+    for hotel_id, rating in hotels:
+        rng = random.Random(hotel_id)
+        base = rng.randint(150 + int(rating * 50), 450 + int(rating * 50))
+        factors = [rng.uniform(0.95, 1.05) for _ in sites]
+        for day in range(days):
+            prices = {site: round(base * factor * (1.12 if day % 7 in (4, 5) else 1.0))
+                      for site, factor in zip(sites, factors)}
+            cheapest = min(prices, key=prices.get)
+            _ = prices[cheapest], max(prices.values()) - prices[cheapest]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hotels", type=int, default=100000)
+    parser.add_argument("--sites", type=int, default=32)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=2000, help="فنادق حلقة Python المرجعية.")
+    args = parser.parse_args()
+
+    bench_env()
+    import app as app_module
+
+    rng = random.Random(7)
+    hotel_ids = list(range(1, args.hotels + 1))
+    cities = [f"city-{rng.randrange(args.cities)}" for _ in hotel_ids]
+    ratings = [round(rng.uniform(3.0, 5.0), 1) for _ in hotel_ids]
+    sites = app_module.BOOKING_SITES + [f"site-{i}" for i in range(max(args.sites - len(app_module.BOOKING_SITES), 0))]
+    engine = app_module.PriceEngine(sites=sites[:args.sites], days=args.days)
+
+    engine.compute(hotel_ids[:1000], cities[:1000], ratings[:1000])  # استيراد numpy وتسخين
+    timings = []
+    for _ in range(args.runs):
+        snapshot = engine.compute(hotel_ids, cities, ratings)
+        timings.append(snapshot.compute_ms)
+
+    sample = list(zip(hotel_ids[:args.sample], ratings[:args.sample]))
+    started = time.perf_counter()
+    python_loop(sample, engine.sites, args.days)
+    loop_ms = (time.perf_counter() - started) * 1000 * args.hotels / max(len(sample), 1)
+
+    cells = args.hotels * len(engine.sites) * args.days
+    print(f"{args.hotels} hotels x {len(engine.sites)} sites x {args.days} days = {cells / 1e6:.1f}M prices, "
+          f"{len(snapshot.cities)} cities, chunk={engine.chunk}")
+    print(f"{'method':<26}{'median ms':>12}{'max ms':>10}")
+    print(f"{'PriceEngine (numpy)':<26}{statistics.median(timings):>12.1f}{max(timings):>10.1f}")
+    print(f"{'python loop (estimated)':<26}{loop_ms:>12.1f}{'-':>10}")
+    started = time.perf_counter()
+    app_module.price_details(snapshot, hotel_ids[:app_module.PRICE_QUERY_MAX_HOTELS])
+    print(f"price_details for {app_module.PRICE_QUERY_MAX_HOTELS} hotels: {(time.perf_counter() - started) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""حمل قابل للتكرار على كل مسارات الـ API: الإنتاجية و p50/p95/p99 لكل مسار، مع خطوط أساس JSON.
+
+يبني قاعدة بيانات مؤقتة مزروعة بالأحجام المطلوبة، ويستبدل نماذج Gemini بنموذج محلي بديل
+بزمن استجابة ثابت (لا اتصال بالشبكة ولا مفتاح API). كل سيناريو يُشغّل عبر Flask test client
+(كلفة التطبيق وحده) وعبر خادم WSGI حقيقي على localhost (يضيف HTTP و الخيوط والمقابس).
+
+سيناريو analyze يمر على حجوزات العامل بالترتيب: المرور الأول يستدعي النموذج البديل
+والتكرارات تخدمها ذاكرة التحليل المؤقتة، كما يحدث في الإنتاج.
+
+الاستخدام:
+    python benchmarks/bench_routes.py --threads 8 --requests 200 --save benchmarks/baseline.json
+    python benchmarks/bench_routes.py --compare benchmarks/baseline.json --tolerance 0.2
+
+مع --compare يطبع الفرق لكل مسار، ويخرج بالرمز 1 إذا ساءت الإنتاجية أو p99 بأكثر من tolerance.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+
+from _common import ROOT, bench_env
+
+CITIES = ["دبي", "الرياض", "القاهرة", "عمّان", "الدوحة"]
+BENCH_PASSWORD = "bench_password"
+
+STUB_ANALYSIS = json.dumps({
+    "title": "تحليل تجريبي",
+    "price_analysis": "عادل",
+    "activity_suggestions": [{"name": "جولة في المدينة", "reason": "قريبة من الفندق"}] * 3,
+    "summary": "رد من النموذج البديل المحلي.",
+}, ensure_ascii=False)
+
+
+class StubModel:
+    """بديل محلي لـ GenerativeModel: ينتظر latency ثانية (كزمن الشبكة) ثم يعيد رداً بنفس الشكل."""
+
+    def __init__(self, text, latency):
+        self.text = text
+        self.latency = latency
+        self.calls = 0
+
+    def _response(self, text):
+        part = SimpleNamespace(text=text)
+        return SimpleNamespace(
+            text=text,
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+            usage_metadata=SimpleNamespace(prompt_token_count=120, candidates_token_count=80),
+        )
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        response = self._response(self.text)
+        return iter([response]) if stream else response
+
+    def count_tokens(self, prompt):
+        return SimpleNamespace(total_tokens=len(prompt))
+
+
+# ------------------------------------------------------------------
+# طريقتا النقل: نفس الواجهة request(method, path, body) -> status
+# ------------------------------------------------------------------
+class TestClientSession:
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, body=None):
+        return self.client.open(path, method=method, json=body).status_code
+
+
+class HTTPSession:
+    """اتصال keep-alive واحد لكل عامل مع حفظ كوكي الجلسة."""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookies = {}
+
+    def request(self, method, path, body=None):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        self.conn.request(method, path, body=payload, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            cookie = SimpleCookie(header)
+            self.cookies.update({name: morsel.value for name, morsel in cookie.items()})
+        return response.status
+
+
+def start_wsgi_server(flask_app):
+    from werkzeug.serving import make_server
+    # سطر سجل لكل طلب يبطئ الخادم ويغرق المخرجات
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-wsgi", daemon=True).start()
+    return server
+
+
+# ------------------------------------------------------------------
+# البيانات والسيناريوهات
+# ------------------------------------------------------------------
+def seed_user(app_module, username, password_hash, bookings, favorites):
+    db = app_module.db_manager
+    with db.connection() as conn:
+        user_id = conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                               (username, password_hash)).lastrowid
+        conn.commit()
+    records = ((n, {"hotel_name": f"فندق {n}", "city": CITIES[n % len(CITIES)], "check_in": "2026-05-01",
+                    "check_out": "2026-05-04", "price": 300 + n}) for n in range(bookings))
+    app_module.import_booking_records(records, user_id=user_id, user_name=username)
+    if favorites:
+        db.apply_favorites_batch(user_id, [(f"فندق {n}", CITIES[n % len(CITIES)]) for n in range(favorites)], [])
+    with db.connection() as conn:
+        booking_ids = [row["id"] for row in conn.execute(
+            "SELECT id FROM bookings WHERE user_id = ? ORDER BY id", (user_id,))]
+    return user_id, booking_ids
+
+
+def make_scenarios():
+    """كل سيناريو: (الحالات المقبولة، دالة تعيد (method, path, body) من حالة العامل)."""
+
+    def register(state):
+        state.counter += 1
+        return "POST", "/api/register", {"username": f"reg_{state.run}_{state.worker}_{state.counter}",
+                                         "password": BENCH_PASSWORD}
+
+    def delete(state):
+        return "DELETE", f"/api/booking/{state.deletable.pop()}", None
+
+    def analyze(state):
+        state.counter += 1
+        return "POST", "/api/gemini/analyze", {"booking_id": state.booking_ids[state.counter % len(state.booking_ids)]}
+
+    def chat(state):
+        state.counter += 1
+        # رسائل مختلفة حتى لا يدمجها singleflight في استدعاء واحد
+        return "POST", "/api/gemini/chat", {"prompt": f"اقترح فندقاً في {CITIES[state.counter % len(CITIES)]} {state.worker}-{state.counter}"}
+
+    def book(state):
+        # ليلة واحدة بعد كل حجز سابق للعامل: لا تتقاطع فيمر الطلب بفحص التقاطع ثم يُدرج.
+        # فندق من الكتالوج المبذور: الخادم يبحث عنه ويسعّره من لقطة الأسعار
+        state.counter += 1
+        check_in = date(2027, 1, 1) + timedelta(days=2 * state.counter)
+        return "POST", "/api/booking", {
+            "hotel_name": "Grand View Towers", "city": "Dubai", "check_in": check_in.isoformat(),
+            "check_out": (check_in + timedelta(days=1)).isoformat()}
+
+    def toggle(state):
+        state.counter += 1
+        return "POST", "/api/favorites/toggle", {"item_name": f"مفضل {state.counter % 20}", "city": "دبي"}
+
+    return {
+        "register": ({201}, register),
+        "login": ({200}, lambda s: ("POST", "/api/login", {"username": s.username, "password": BENCH_PASSWORD})),
+        "status": ({200}, lambda s: ("GET", "/api/status", None)),
+        "booking_create": ({201}, book),
+        "bookings_list": ({200}, lambda s: ("GET", "/api/bookings", None)),
+        "bookings_range": ({200}, lambda s: ("GET", "/api/bookings?from=2026-05-02&to=2026-05-08", None)),
+        "booking_delete": ({200}, delete),
+        "favorites_toggle": ({200}, toggle),
+        "favorites_list": ({200}, lambda s: ("GET", "/api/favorites", None)),
+        "hotels_search": ({200}, lambda s: ("GET", "/api/hotels/search?city=%D8%AF%D8%A8%D9%8A&limit=20", None)),
+        "chat": ({200}, chat),
+        "analyze": ({200}, analyze),
+    }
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_scenario(make_session, workers, expected, build, requests, warmup):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(workers) + 1)
+
+    def worker(state):
+        session = make_session()
+        session.request("POST", "/api/login", {"username": state.username, "password": BENCH_PASSWORD})
+        for _ in range(warmup):
+            session.request(*build(state))
+        barrier.wait()
+        local, failed = [], 0
+        for _ in range(requests):
+            method, path, body = build(state)
+            started = time.perf_counter()
+            status = session.request(method, path, body)
+            local.append(time.perf_counter() - started)
+            failed += status not in expected
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(state,)) for state in workers]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """يطبع الفرق عن خط الأساس ويعيد قائمة التراجعات."""
+    regressions = []
+    print(f"\nمقارنة بـ {baseline['meta'].get('commit', '?')} (tolerance {tolerance:.0%})")
+    print(f"{'transport':<12}{'scenario':<18}{'rps Δ':>9}{'p99 Δ':>9}")
+    for transport, scenarios in results.items():
+        for name, current in scenarios.items():
+            previous = baseline["results"].get(transport, {}).get(name)
+            if not previous or not previous["rps"] or not previous["p99_ms"]:
+                continue
+            rps_delta = current["rps"] / previous["rps"] - 1
+            p99_delta = current["p99_ms"] / previous["p99_ms"] - 1
+            flag = ""
+            if rps_delta < -tolerance or p99_delta > tolerance:
+                flag = "  <-- regression"
+                regressions.append((transport, name))
+            print(f"{transport:<12}{name:<18}{rps_delta:>+9.1%}{p99_delta:>+9.1%}{flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    scenarios = make_scenarios()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="طلبات مقاسة لكل خيط في كل سيناريو.")
+    parser.add_argument("--warmup", type=int, default=5, help="طلبات إحماء غير مقاسة لكل خيط.")
+    parser.add_argument("--users", type=int, default=1000, help="مستخدمون إضافيون في القاعدة (حجم البيانات).")
+    parser.add_argument("--bookings", type=int, default=50, help="حجوزات مزروعة لكل مستخدم.")
+    parser.add_argument("--favorites", type=int, default=20, help="مفضلات مزروعة لكل مستخدم.")
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="زمن رد النموذج البديل بالثواني.")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:10000",
+                        help="طريقة تجزئة كلمات المرور أثناء القياس (تحدد كلفة login/register).")
+    parser.add_argument("--transports", nargs="+", default=["test_client", "wsgi"], choices=["test_client", "wsgi"])
+    parser.add_argument("--scenarios", nargs="+", default=list(scenarios), choices=list(scenarios))
+    parser.add_argument("--save", help="حفظ النتائج كخط أساس JSON.")
+    parser.add_argument("--compare", help="خط أساس JSON سابق للمقارنة.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    bench_env(PASSWORD_HASH_METHOD=args.hash_method)
+    import app as app_module
+    flask_app = app_module.create_app()
+    # سجلات كل طلب تشوش على المخرجات وتضيف كلفة لا علاقة لها بالمسار
+    app_module.logger.disabled = True
+
+    stubs = {"chat": StubModel("رد تجريبي من النموذج البديل.", args.gemini_latency),
+             "analyze": StubModel(STUB_ANALYSIS, args.gemini_latency),
+             "summarize": StubModel("ملخص تجريبي للمحادثة.", args.gemini_latency)}
+    for name, stub in stubs.items():
+        app_module.model_registry.register(name, lambda stub=stub: stub)
+
+    started = time.perf_counter()
+    password_hash = app_module.password_hasher.hash(BENCH_PASSWORD)
+    for n in range(args.users):
+        seed_user(app_module, f"seed_{n}", password_hash, args.bookings, args.favorites)
+    # كل سيناريو يحتاج حتى requests + warmup حجزاً قابلاً للحذف لكل عامل
+    per_worker = args.requests + args.warmup
+    workers = []
+    for n in range(args.threads):
+        username = f"bench_{n}"
+        user_id, booking_ids = seed_user(app_module, username, password_hash,
+                                         max(args.bookings, 1) + per_worker * len(args.transports), args.favorites)
+        workers.append(SimpleNamespace(worker=n, username=username, user_id=user_id, counter=0, run=0,
+                                       booking_ids=booking_ids[:max(args.bookings, 1)],
+                                       deletable=booking_ids[max(args.bookings, 1):]))
+    print(f"seeded {args.users + args.threads} users x {args.bookings} bookings, {args.favorites} favorites "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    server = start_wsgi_server(flask_app) if "wsgi" in args.transports else None
+    sessions = {
+        "test_client": lambda: TestClientSession(flask_app),
+        "wsgi": lambda: HTTPSession("127.0.0.1", server.server_port),
+    }
+
+    results = {}
+    print(f"{'transport':<12}{'scenario':<18}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for run, transport in enumerate(args.transports):
+        for state in workers:
+            state.run = run
+        results[transport] = {}
+        for name in args.scenarios:
+            expected, build = scenarios[name]
+            result = run_scenario(sessions[transport], workers, expected, build, args.requests, args.warmup)
+            results[transport][name] = result
+            print(f"{transport:<12}{name:<18}{result['rps']:>9.1f}{result['p50_ms']:>9.2f}"
+                  f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['errors']:>8}")
+    if server is not None:
+        server.shutdown()
+    print("stub Gemini calls: " + ", ".join(f"{name}={stub.calls}" for name, stub in stubs.items()))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
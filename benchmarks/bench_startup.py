@@ -0,0 +1,110 @@
+"""قياس زمن التشغيل البارد وزمن جاهزية كل عامل بعد fork.
+
+كل تكرار يشغّل مفسر Python جديداً ويقيس: استيراد app، ثم create_app() (مع الترحيلات)،
+ثم أول طلب، ويطبع الوسيط والأقصى. يقيس أيضاً كلفة استيراد google.generativeai التي كانت
+تُدفع عند كل تشغيل قبل جعله كسولاً. أخيراً يحاكي gunicorn --preload: يبني التطبيق مرة ثم
+يعمل fork لعدة عمال، يخدم كل منهم طلباً يلمس SQLite، ويقيس زمن جاهزيته.
+
+الاستخدام:
+    python benchmarks/bench_startup.py --runs 10 --workers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from _common import ROOT, bench_env
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+flask_app = app_module.create_app({"GEMINI_WARMUP": False})
+created = time.perf_counter()
+assert flask_app.test_client().get("/api/hotels/search?limit=1").status_code == 200
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "total_ms": (served - started) * 1000,
+    "gemini_loaded": "google.generativeai" in sys.modules,
+}))
+"""
+
+GEMINI_IMPORT = """
+import json, time
+started = time.perf_counter()
+import google.generativeai
+print(json.dumps({"gemini_import_ms": (time.perf_counter() - started) * 1000}))
+"""
+
+
+def run_python(code, env):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def preload_fork(workers):
+    """مثل gunicorn --preload: create_app في الأب ثم fork؛ يعيد زمن جاهزية كل عامل بالمللي ثانية."""
+    import app as app_module
+    app_module.logger.disabled = True
+    flask_app = app_module.create_app({"GEMINI_WARMUP": False})
+    timings = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        forked = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = flask_app.test_client().get("/api/hotels/search?limit=1").status_code
+            os.write(write_fd, json.dumps({"status": status, "ms": (time.perf_counter() - forked) * 1000}).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            result = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        assert result["status"] == 200, result
+        timings.append(result["ms"])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    # لقطة الأسعار تُحسب في الخلفية عند التشغيل كما في الإنتاج
+    bench_env(PRICE_AUTO_REFRESH="1")
+    env = dict(os.environ)
+
+    # التشغيل الأول يطبق الترحيلات على ملف جديد؛ نقيسه منفصلاً عن التشغيلات الدافئة
+    first = run_python(COLD_START, env)
+    runs = [run_python(COLD_START, env) for _ in range(args.runs)]
+
+    print(f"runs={args.runs} (first boot with migrations: {first['total_ms']:.0f}ms)")
+    print(f"{'phase':<20}{'median ms':>12}{'max ms':>10}")
+    for phase in ("import_ms", "create_app_ms", "first_request_ms", "total_ms"):
+        values = [run[phase] for run in runs]
+        print(f"{phase:<20}{statistics.median(values):>12.1f}{max(values):>10.1f}")
+    print(f"google.generativeai loaded at boot: {any(run['gemini_loaded'] for run in runs)}")
+    try:
+        gemini = [run_python(GEMINI_IMPORT, env)["gemini_import_ms"] for _ in range(3)]
+        print(f"google.generativeai import (deferred to first AI call): {statistics.median(gemini):.0f}ms")
+    except subprocess.CalledProcessError:
+        print("google.generativeai غير مثبت؛ تم تخطي قياسه.")
+
+    if hasattr(os, "fork") and args.workers > 0:
+        timings = preload_fork(args.workers)
+        print(f"preload + fork: {args.workers} workers ready, "
+              f"median {statistics.median(timings):.1f}ms, max {max(timings):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
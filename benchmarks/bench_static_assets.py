@@ -0,0 +1,78 @@
+"""قياس البايتات المنقولة لتحميل الصفحة الأولى والمتكرر، قبل/بعد flask build-assets.
+
+يحاكي متصفحاً بذاكرة HTTP: يطلب / ثم كل ملف assets/ مذكور في index.html. في الزيارة
+المتكررة يتخطى الملفات المحفوظة بـ immutable، ويعيد التحقق من البقية بـ If-None-Match.
+
+الاستخدام:
+    python benchmarks/bench_static_assets.py --encoding "gzip, br"
+"""
+import argparse
+import gzip
+import os
+import re
+
+from _common import bench_env
+
+ASSET_REF = re.compile(r"""["'(]/?(assets/[^"')?#]+)""")
+
+
+def decode(response):
+    data = response.data
+    encoding = response.headers.get("Content-Encoding")
+    if encoding == "gzip":
+        data = gzip.decompress(data)
+    elif encoding == "br":
+        import brotli
+        data = brotli.decompress(data)
+    return data.decode("utf-8")
+
+
+def visit(client, encoding, cache):
+    """زيارة واحدة؛ cache: url -> (etag, immutable) من الزيارات السابقة. يعيد (طلبات، بايتات)."""
+    requests, transferred = 0, 0
+    urls = ["/"]
+    while urls:
+        url = urls.pop(0)
+        etag, immutable = cache.get(url, (None, False))
+        if immutable:
+            continue
+        headers = {"Accept-Encoding": encoding}
+        if etag:
+            headers["If-None-Match"] = etag
+        response = client.get(url, headers=headers)
+        requests += 1
+        # test client لا يفك الضغط: طول الجسم هو حجم النقل الفعلي
+        transferred += len(response.data)
+        if response.status_code == 200:
+            cache[url] = (response.headers.get("ETag"), "immutable" in response.headers.get("Cache-Control", ""))
+        if url == "/":
+            html = decode(response) if response.status_code == 200 else cache["/html"]
+            cache["/html"] = html
+            urls.extend("/" + ref for ref in dict.fromkeys(ASSET_REF.findall(html)))
+    return requests, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--encoding", default="gzip, deflate, br", help="قيمة Accept-Encoding للمتصفح.")
+    args = parser.parse_args()
+
+    tmpdir = bench_env()
+    import app as app_module
+    flask_app = app_module.create_app()
+
+    build_dir = os.path.join(tmpdir, "static")
+    app_module.build_assets(flask_app.static_folder, build_dir)
+    print(f"Accept-Encoding: {args.encoding}")
+    print(f"{'mode':<10}{'first req':>10}{'first bytes':>13}{'repeat req':>12}{'repeat bytes':>14}")
+    for mode, directory in (("source", os.path.join(tmpdir, "missing")), ("built", build_dir)):
+        app_module.ASSETS_BUILD_DIR = directory
+        client = flask_app.test_client()
+        cache = {}
+        first = visit(client, args.encoding, cache)
+        repeat = visit(client, args.encoding, cache)
+        print(f"{mode:<10}{first[0]:>10}{first[1]:>13}{repeat[0]:>12}{repeat[1]:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""إعدادات gunicorn: تحميل التطبيق مرة في العملية الرئيسية ثم fork للعمال.
+
+كل إعداد يمكن تغييره من متغيرات البيئة، مثل: GUNICORN_WORKERS=8 gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+# preload: الاستيراد و create_app() والترحيلات مرة واحدة، والعمال يرثون الذاكرة (copy-on-write).
+# create_app لا يبقي اتصالات SQLite ولا يستورد Gemini، و DBManager يفتح مجمعاً جديداً في كل عامل.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+
+
+def post_worker_init(worker):
+    import app as restavo
+    if os.environ.get("GEMINI_WARMUP", "1") == "1":
+        restavo.start_gemini_warmup()
+    if os.environ.get("PRICE_AUTO_REFRESH", "1") == "1" and restavo.db_manager is not None:
+        restavo.price_engine.ensure_today(restavo.db_manager)
+    worker.log.info("worker %s ready: %s", worker.pid, restavo.startup_stats)
@@ -90,6 +90,9 @@ async function fetchWithBackoff(url, options, maxRetries = 5) {
     throw new Error('Max retries reached.');
 }
 
+let chatStreamController = null; // 🌟 لإلغاء البث عند إغلاق نافذة الدردشة
+let chatSessionId = null; // 🌟 السجل محفوظ في الخادم: نرسل معرف الجلسة بدل المحادثة كاملة
+
 async function callGeminiApi() {
     // 🌟 تحسين: استخراج الرسالة الأخيرة فقط لإرسالها للخادم
     const lastUserMessage = CHAT_HISTORY.findLast(m => m.role === 'user');
@@ -101,43 +104,111 @@ async function callGeminiApi() {
 
     // 🌟 تحسين: بناء الحمولة التي يتوقعها الخادم
     const payload = {
-        prompt: userPrompt
+        prompt: userPrompt,
+        session_id: chatSessionId
     };
 
+    // 🌟 رسالة النموذج تُضاف فارغة ثم تُملأ تدريجياً مع وصول الأجزاء
+    const modelMessage = { role: "model", parts: [{ text: "" }] };
+    chatStreamController = new AbortController();
+
     try {
-        // 🌟 تحسين: استدعاء نقطة النهاية الآمنة في الخادم (app.py)
-        const response = await fetchWithBackoff(`${API_BASE_URL}/gemini/chat`, {
+        // 🌟 تحسين: استدعاء نقطة النهاية المتدفقة (Server-Sent Events) في الخادم
+        const response = await fetchWithBackoff(`${API_BASE_URL}/gemini/chat/stream`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            // 🌟 ملاحظة: لا نحتاج credentials: 'include' هنا لأن هذا الـ endpoint عام
-            body: JSON.stringify(payload)
+            // 🌟 credentials: 'include' يربط جلسة الدردشة بالمستخدم إن كان مسجلاً دخوله
+            credentials: 'include',
+            body: JSON.stringify(payload),
+            signal: chatStreamController.signal
         });
 
-        const result = await response.json();
+        if (response.status === 404 && chatSessionId) {
+            // انتهت صلاحية الجلسة في الخادم: نبدأ جلسة جديدة بنفس الرسالة
+            chatSessionId = null;
+            return await callGeminiApi();
+        }
 
-        if (response.ok && result.response) {
-            const modelText = result.response;
-            CHAT_HISTORY.push({
-                role: "model",
-                parts: [{ text: modelText }]
-            });
-        } else {
+        if (!response.ok || !response.body) {
+            const result = await response.json().catch(() => ({}));
             console.error("Backend API returned an error:", result);
-            const errorText = result.response || "عذراً، حدث خطأ أثناء معالجة طلبك.";
-            CHAT_HISTORY.push({ role: "model", parts: [{ text: errorText }] });
+            modelMessage.parts[0].text = result.response || "عذراً، حدث خطأ أثناء معالجة طلبك.";
+            CHAT_HISTORY.push(modelMessage);
+            return;
         }
 
+        CHAT_HISTORY.push(modelMessage);
+        renderChat();
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // كل حدث SSE ينتهي بسطر فارغ
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const event = parseSseEvent(rawEvent);
+                if (event.type === 'session') {
+                    chatSessionId = event.data.session_id;
+                    continue;
+                }
+                if (event.type === 'error') {
+                    modelMessage.parts[0].text = event.data.response || "عذراً، حدث خطأ أثناء معالجة طلبك.";
+                } else if (event.type === 'message' && event.data.text) {
+                    modelMessage.parts[0].text += event.data.text;
+                }
+                updateStreamingMessage(modelMessage.parts[0].text);
+            }
+        }
     } catch (error) {
-        console.error("Error calling Backend API:", error);
-        const errorText = "عذراً، لا يمكن الاتصال بالخادم حالياً. يرجى التحقق من اتصالك.";
-        CHAT_HISTORY.push({ role: "model", parts: [{ text: errorText }] });
+        if (error.name === 'AbortError') {
+            // المستخدم أغلق الدردشة: نحتفظ بما وصل حتى الآن
+            if (!modelMessage.parts[0].text) {
+                modelMessage.parts[0].text = "تم إيقاف الرد.";
+            }
+        } else {
+            console.error("Error calling Backend API:", error);
+            const errorText = "عذراً، لا يمكن الاتصال بالخادم حالياً. يرجى التحقق من اتصالك.";
+            if (CHAT_HISTORY.includes(modelMessage)) {
+                modelMessage.parts[0].text = modelMessage.parts[0].text || errorText;
+            } else {
+                CHAT_HISTORY.push({ role: "model", parts: [{ text: errorText }] });
+            }
+        }
     } finally {
+        chatStreamController = null;
         document.getElementById('chat-input').disabled = false;
         document.getElementById('chat-send-btn').disabled = false;
         renderChat();
     }
 }
 
+function parseSseEvent(rawEvent) {
+    let type = 'message';
+    let data = '';
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) type = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+    });
+    return { type, data: data ? JSON.parse(data) : {} };
+}
+
+function updateStreamingMessage(text) {
+    // 🌟 تحديث فقاعة الرد الأخيرة فقط بدلاً من إعادة رسم المحادثة كاملة مع كل جزء
+    const bubbles = document.querySelectorAll('#chat-messages .chat-bubble');
+    const bubble = bubbles[bubbles.length - 1];
+    if (!bubble) return;
+    bubble.innerHTML = text.replace(/\n/g, '<br>');
+    const messagesContainer = document.getElementById('chat-messages');
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+}
+
 function sendMessage() {
     const inputElement = document.getElementById('chat-input');
     const message = inputElement.value.trim();
@@ -168,7 +239,7 @@ function renderChat(isLoading = false) {
 
         const messageHtml = `
             <div class="flex ${isUser ? 'justify-end' : 'justify-start'}">
-                <div class="p-3 rounded-xl max-w-[80%] shadow-md ${isUser
+                <div class="chat-bubble p-3 rounded-xl max-w-[80%] shadow-md ${isUser
                 ? 'bg-blue-500 text-white rounded-bl-sm'
                 : 'bg-gray-100 text-gray-800 rounded-tr-sm'}">
                     ${text.replace(/\n/g, '<br>')}
@@ -450,7 +521,12 @@ function updateFavoriteButton(cardElement, isFavorite) {
 // ----------------------------------------------------------------------
 // 🌟 إصلاح: منطق المفضَّلات (تم إصلاح المصادقة والمنطق)
 // ----------------------------------------------------------------------
-window.toggleFavorite = async (hotelName, city, cardElement) => {
+// 🌟 النقرات المتتالية تُحدّث الواجهة فوراً وتُجمع في طلب واحد إلى /favorites/batch
+const FAVORITES_FLUSH_DELAY_MS = 400;
+const pendingFavorites = new Map(); // hotelName -> { city, isFavorite, previous, cards }
+let favoritesFlushTimer = null;
+
+window.toggleFavorite = (hotelName, city, cardElement) => {
     // 🌟 إصلاح: التحقق من 'currentUser' بدلاً من 'userId'
     if (!currentUser) { 
         openAuthModal();
@@ -458,43 +534,91 @@ window.toggleFavorite = async (hotelName, city, cardElement) => {
         return;
     }
 
-    const isCurrentlyFavorite = userFavorites[hotelName] || false;
+    const isFavorite = !(userFavorites[hotelName] || false);
+    const pending = pendingFavorites.get(hotelName);
+    // نحتفظ بالحالة المؤكدة من الخادم (قبل أول نقرة معلّقة) للتراجع عند الفشل
+    const entry = pending || { previous: !isFavorite, cards: new Set() };
+    entry.city = city;
+    entry.isFavorite = isFavorite;
+    if (cardElement) entry.cards.add(cardElement);
+    pendingFavorites.set(hotelName, entry);
+
+    // تحديث متفائل للواجهة
+    userFavorites[hotelName] = isFavorite;
+    updateFavoriteButton(cardElement, isFavorite);
+
+    clearTimeout(favoritesFlushTimer);
+    favoritesFlushTimer = setTimeout(flushFavorites, FAVORITES_FLUSH_DELAY_MS);
+};
+
+// إرسال التغييرات المعلّقة فوراً عند مغادرة الصفحة
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden' && favoritesFlushTimer) {
+        clearTimeout(favoritesFlushTimer);
+        flushFavorites();
+    }
+});
+
+function applyFavoriteState(hotelName, isFavorite, cards) {
+    userFavorites[hotelName] = isFavorite;
+    cards.forEach(card => updateFavoriteButton(card, isFavorite));
+}
+
+async function flushFavorites() {
+    favoritesFlushTimer = null;
+    if (pendingFavorites.size === 0) return;
+
+    const batch = new Map(pendingFavorites);
+    pendingFavorites.clear();
+    // العناصر التي عادت إلى حالتها الأصلية (نقرتان متتاليتان) لا تحتاج إلى إرسال
+    const items = [];
+    batch.forEach((entry, hotelName) => {
+        if (entry.isFavorite !== entry.previous) {
+            items.push({ item_name: hotelName, city: entry.city, is_favorite: entry.isFavorite });
+        }
+    });
+    if (items.length === 0) return;
+
+    const revert = () => batch.forEach((entry, hotelName) => {
+        // لا نلمس عنصراً نقر عليه المستخدم مجدداً أثناء الطلب
+        if (!pendingFavorites.has(hotelName)) applyFavoriteState(hotelName, entry.previous, entry.cards);
+    });
 
     try {
         // 🌟 إصلاح: إضافة credentials: 'include' لإرسال كوكي الجلسة
-        const response = await fetch(`${API_BASE_URL}/favorites/toggle`, {
+        const response = await fetch(`${API_BASE_URL}/favorites/batch`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             credentials: 'include',
-            body: JSON.stringify({ item_name: hotelName, city: city })
+            keepalive: true, // يكمل الطلب حتى لو أُغلقت الصفحة
+            body: JSON.stringify({ items })
         });
 
         const result = await response.json();
 
         if (response.ok && result.success) {
-            // تحديث الحالة المحلية وقاعدة بيانات Flask
-            userFavorites[hotelName] = result.is_favorite;
-            updateFavoriteButton(cardElement, result.is_favorite);
-
-            // 🌟 تحسين: لا داعي لاستدعاء fetchAndRenderFavorites() هنا
-            // هذا يسبب طلب شبكة غير ضروري. نكتفي بتحديث الواجهة مباشرة.
-            // fetchAndRenderFavorites(); 
-
+            // مطابقة الحالة المحلية مع ما أكده الخادم
+            Object.entries(result.favorites).forEach(([hotelName, isFavorite]) => {
+                if (!pendingFavorites.has(hotelName)) applyFavoriteState(hotelName, isFavorite, batch.get(hotelName).cards);
+            });
         } else if (response.status === 401) {
+            revert();
             openAuthModal();
             showToast("الرجاء تسجيل الدخول لإضافة مفضلة.", true);
         } else {
+            revert();
             showToast(`❌ فشل التفضيل: ${result.message || 'خطأ غير معروف'}`, true);
             console.error("Favorite Toggle Failed:", result);
         }
 
     } catch (error) {
+        revert();
         showToast("❌ فشل الاتصال بخادم المفضلة.", true);
         console.error("Network Error during favorite toggle:", error);
     }
-};
+}
 
 async function fetchAndRenderFavorites() {
     const favoritesListContainer = document.getElementById('favorites-list');
@@ -521,17 +645,25 @@ async function fetchAndRenderFavorites() {
 
     try {
         // 🌟 إصلاح: إضافة credentials: 'include'
-        const response = await fetch(`${API_BASE_URL}/favorites`, {
-            method: 'GET',
-            credentials: 'include' 
-        });
+        // 🌟 المفضلة مرقمة في الخادم: نحتاجها كاملة لتلوين القلوب، فنجمع الصفحات بالمؤشر
+        // (المتصفح يعيد التحقق من كل صفحة بـ ETag تلقائياً، فالصفحات غير المتغيرة تعود 304 بلا محتوى)
+        const favoritesData = []; // [ {id, item_name, city, rating, cheapest_price, image_url}, ... ]
+        let afterId = null;
+        do {
+            const url = afterId ? `${API_BASE_URL}/favorites?after_id=${afterId}` : `${API_BASE_URL}/favorites`;
+            const response = await fetch(url, {
+                method: 'GET',
+                credentials: 'include' 
+            });
 
-        if (response.status === 401) {
-            favoritesListContainer.innerHTML = '<p class="text-center text-red-500 mt-10">فشل المصادقة. يرجى تسجيل الدخول.</p>';
-            return;
-        }
+            if (response.status === 401) {
+                favoritesListContainer.innerHTML = '<p class="text-center text-red-500 mt-10">فشل المصادقة. يرجى تسجيل الدخول.</p>';
+                return;
+            }
 
-        const favoritesData = await response.json(); // [ {item_name, city}, ... ]
+            favoritesData.push(...await response.json());
+            afterId = response.headers.get('X-Next-After-Id');
+        } while (afterId);
 
         // بناء قائمة المفضلة المحلية من البيانات المسترجعة
         const newFavorites = {};
@@ -541,8 +673,16 @@ async function fetchAndRenderFavorites() {
         });
         userFavorites = newFavorites; // تحديث الكائن المحلي
 
-        // فلترة الفنادق المحاكية بناءً على المفضلة المسترجعة
-        const favoriteHotels = SIMULATED_HOTELS.filter(hotel => userFavorites[hotel.name]);
+        // 🌟 بيانات الفندق تأتي من الخادم مع المفضلة (نتجاهل العناصر غير الموجودة في الكتالوج)
+        const favoriteHotels = favoritesData
+            .filter(fav => fav.rating !== null)
+            .map(fav => ({
+                name: fav.item_name,
+                city: fav.city,
+                rating: fav.rating,
+                cheapest_price: fav.cheapest_price,
+                image_url: fav.image_url
+            }));
 
         // ... منطق العرض (renderFavoritesList) ...
         favoritesListContainer.innerHTML = ''; // مسح رسالة التحميل
@@ -625,95 +765,71 @@ function renderPopularHotels(hotels) {
 }
 
 // ----------------------------------------------------------------------
-// محاكاة البيانات ومنطق البحث
-// (لم يتم تغيير هذا الجزء)
+// 🌟 منطق البحث: الكتالوج والأسعار أصبحت في الخادم (/api/hotels/search)
 // ----------------------------------------------------------------------
-const BOOKING_SITES = ["Booking.com", "Expedia", "Hotels.com", "Direct Hotel"];
-
-const RAW_HOTELS_DATA = [
-    { name: "Grand View Towers", city: "Dubai", rating: 4.5, amenities: ["مسبح", "واي فاي مجاني", "صالة رياضية"] },
-    { name: "City Center Inn", city: "Dubai", rating: 3.8, amenities: ["واي فاي مجاني", "فطور مجاني"] },
-    { name: "Luxury Resort Oasis", city: "Abu Dhabi", rating: 5.0, amenities: ["شاطئ خاص", "سبا", "مسبح"] },
-    { name: "The Budget Stay", city: "Abu Dhabi", rating: 3.0, amenities: ["موقف سيارات", "واي فاي مجاني"] },
-    { name: "Nile Panorama Hotel", city: "Cairo", rating: 4.2, amenities: ["إطلالة نهرية", "مطعم"] },
-    { name: "Historical Boutique", city: "Cairo", rating: 4.0, amenities: ["تراس", "فطور مجاني"] },
-    { name: "Palm Beach Hotel", city: "Dubai", rating: 4.7, amenities: ["وصول للشاطئ", "مسبح", "سبا"] },
-    { name: "Desert Sands Villa", city: "Abu Dhabi", rating: 4.1, amenities: ["صالة رياضية", "واي فاي مجاني"] },
-    { name: "Four Seasons Hotel Nile Plaza", city: "Cairo", rating: 4.9, amenities: ["سبا فاخر", "إطلالة على النيل", "مسبح على السطح"] },
-    { name: "Marriott Mena House", city: "Giza", rating: 4.8, amenities: ["إطلالة على الأهرامات", "حدائق", "مطعم فاخر"] },
-    { name: "Sofitel Legend Old Cataract", city: "Aswan", rating: 5.0, amenities: ["تاريخي", "إطلالة على النيل", "مسبح", "خدمة الأجنحة"] },
-    { name: "Rixos Premium Seagate", city: "Sharm El Sheikh", rating: 4.6, amenities: ["شامل كلياً", "أكوا بارك", "وصول للشاطئ"] },
-    { name: "Hilton Luxor Resort & Spa", city: "Luxor", rating: 4.4, amenities: ["سبا", "إطلالة نهرية", "مسبح إنفينيتي"] },
-    { name: "The Oberoi Sahl Hasheesh", city: "Hurghada", rating: 4.8, amenities: ["أجنحة فاخرة", "شاطئ خاص", "غوص"] },
-];
-
-function generateSimulatedPrices(rating) {
-    const basePriceFactor = parseInt(rating * 50);
-    const minBase = 150 + basePriceFactor;
-    const maxBase = 450 + basePriceFactor;
-    const basePrice = Math.floor(Math.random() * (maxBase - minBase + 1)) + minBase;
-    const prices = {};
-    for (const site of BOOKING_SITES) {
-        const variation = Math.random() * (1.05 - 0.95) + 0.95;
-        prices[site] = Math.round(basePrice * variation);
+const SEARCH_PAGE_SIZE = 20;
+let lastSearch = null; // { city, minRating, cityDisplay, nextCursor, count }
+
+async function searchAndCompareDeals(city, minRating, cursor = null) {
+    const params = new URLSearchParams({ city, min_rating: minRating, limit: SEARCH_PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+
+    const response = await fetch(`${API_BASE_URL}/hotels/search?${params}`);
+    if (!response.ok) {
+        throw new Error('فشل البحث عن الفنادق');
     }
-    return prices;
+    // النتائج مرتبة من الأرخص في الخادم: { results: [...], next_cursor }
+    return await response.json();
 }
 
-const SIMULATED_HOTELS = RAW_HOTELS_DATA.map(hotel => {
-    const prices = generateSimulatedPrices(hotel.rating);
-    let cheapestPrice = Infinity;
-    let cheapestSite = "N/A";
-    for (const site in prices) {
-        if (prices[site] < cheapestPrice) {
-            cheapestPrice = prices[site];
-            cheapestSite = site;
-        }
+async function runSearch(city, minRating, cityDisplay) {
+    try {
+        const page = await searchAndCompareDeals(city, minRating);
+        lastSearch = { city, minRating, cityDisplay, nextCursor: page.next_cursor, count: page.results.length };
+        renderResults(page.results, cityDisplay);
+    } catch (error) {
+        console.error("Error searching hotels:", error);
+        showToast("❌ فشل الاتصال بخادم البحث.", true);
     }
-    return {
-        ...hotel,
-        prices,
-        cheapest_price: cheapestPrice,
-        cheapest_site: cheapestSite,
-        image_url: `https://placehold.co/150x150/f0f0f0/333?text=${encodeURIComponent(hotel.city.replace(/\s/g, '+'))}`
-    };
-});
-
-function searchAndCompareDeals(city, minRating) {
-    let matchingHotels = SIMULATED_HOTELS.filter(hotel => {
-        const matchesCity = hotel.city.toLowerCase() === city.toLowerCase();
-        const matchesRating = hotel.rating >= minRating;
-        return matchesCity && matchesRating;
-    });
-    matchingHotels.sort((a, b) => a.cheapest_price - b.cheapest_price);
-
-    // 🌟 تم تبسيط هذا، لا حاجة لاستدعاء logSearchCount إذا لم يكن الخادم يدعمه
-    // if (currentUser) {
-    //    matchingHotels.forEach(hotel => logSearchCount(hotel.name));
-    // }
+}
 
-    return matchingHotels;
+async function loadMoreResults() {
+    if (!lastSearch || !lastSearch.nextCursor) return;
+    try {
+        const page = await searchAndCompareDeals(lastSearch.city, lastSearch.minRating, lastSearch.nextCursor);
+        lastSearch.nextCursor = page.next_cursor;
+        lastSearch.count += page.results.length;
+        renderResults(page.results, lastSearch.cityDisplay, true);
+    } catch (error) {
+        console.error("Error loading more hotels:", error);
+        showToast("❌ فشل تحميل المزيد من النتائج.", true);
+    }
 }
 
-function renderResults(results, cityDisplay) {
+function renderResults(results, cityDisplay, append = false) {
     const titleElement = document.getElementById('results-title');
     const initialMessage = document.getElementById('initial-message');
     const cardsList = document.getElementById('hotel-cards-list');
 
-    cardsList.innerHTML = '';
+    if (!append) {
+        cardsList.innerHTML = '';
+    }
+    document.getElementById('load-more-btn')?.remove();
 
     if (initialMessage) {
         initialMessage.style.display = 'none';
     }
 
-    if (results.length === 0) {
+    if (results.length === 0 && !append) {
         titleElement.textContent = `لم يتم العثور على فنادق في ${cityDisplay}`;
         titleElement.classList.remove('hidden');
         cardsList.innerHTML = `<p class="text-xl text-center mt-8 text-gray-500">نأسف، لا توجد نتائج مطابقة لمعايير البحث في ${cityDisplay}.</p>`;
         return;
     }
 
-    titleElement.textContent = `نتائج البحث في ${cityDisplay} (${results.length} فندق)`;
+    const shownCount = lastSearch ? lastSearch.count : results.length;
+    const moreSuffix = lastSearch && lastSearch.nextCursor ? '+' : '';
+    titleElement.textContent = `نتائج البحث في ${cityDisplay} (${shownCount}${moreSuffix} فندق)`;
     titleElement.classList.remove('hidden');
 
     results.forEach(hotel => {
@@ -802,6 +918,16 @@ function renderResults(results, cityDisplay) {
         `;
         cardsList.insertAdjacentHTML('beforeend', hotelCardHtml);
     });
+
+    // 🌟 ترقيم بالمؤشر: نطلب الصفحة التالية فقط عند الحاجة
+    if (lastSearch && lastSearch.nextCursor) {
+        cardsList.insertAdjacentHTML('beforeend', `
+            <button id="load-more-btn" class="block mx-auto mt-4 brand-color text-white font-bold py-3 px-8 rounded-lg shadow-xl">
+                عرض المزيد من الفنادق
+            </button>
+        `);
+        document.getElementById('load-more-btn').addEventListener('click', loadMoreResults);
+    }
     lucide.createIcons();
 }
 
@@ -818,9 +944,7 @@ document.getElementById('search-form').addEventListener('submit', function (even
     const minRating = parseFloat(ratingInput.value);
 
     // 🌟 ملاحظة: userFavorites يجب أن يكون مُحمّلاً بالفعل
-    const results = searchAndCompareDeals(selectedCity, minRating);
-
-    renderResults(results, cityInput.options[cityInput.selectedIndex].text);
+    runSearch(selectedCity, minRating, cityInput.options[cityInput.selectedIndex].text);
 });
 
 document.addEventListener('DOMContentLoaded', async () => {
@@ -834,8 +958,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     // 3. عرض النتائج الأولية (الآن ستعرف ما هي المفضلة)
     const defaultCity = document.getElementById('city').value;
     const defaultRating = parseFloat(document.getElementById('min_rating').value);
-    const initialResults = searchAndCompareDeals(defaultCity, defaultRating);
-    renderResults(initialResults, document.getElementById('city').options[document.getElementById('city').selectedIndex].text);
+    await runSearch(defaultCity, defaultRating, document.getElementById('city').options[document.getElementById('city').selectedIndex].text);
 
     lucide.createIcons();
 
@@ -924,6 +1047,8 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     chatCloseBtn.addEventListener('click', () => {
         chatWindow.classList.add('hidden');
+        // 🌟 إيقاف أي رد متدفق جارٍ (يُغلق الاتصال فيتوقف التوليد في الخادم)
+        if (chatStreamController) chatStreamController.abort();
     });
 
     chatInput.addEventListener('input', () => {
@@ -960,7 +1085,13 @@ window.handleDeleteBooking = async (bookingId) => {
         const result = await response.json();
         if (response.ok) {
             showToast(result.message);
-            await fetchAndRenderBookings(); // تحديث القائمة
+            // 🌟 إزالة البطاقة محلياً بدلاً من إعادة تحميل السجل كاملاً
+            document.getElementById(`booking-card-${bookingId}`)?.remove();
+            loadedBookingsCount = Math.max(loadedBookingsCount - 1, 0);
+            updateBookingsTitle();
+            if (loadedBookingsCount === 0 && !bookingsNextAfterId) {
+                document.getElementById('bookings-list').innerHTML = `<div class="text-center p-10"><p>لا يوجد لديك أي حجوزات حالياً.</p></div>`;
+            }
         } else {
             showToast(`❌ فشل الإلغاء: ${result.message}`, true);
         }
@@ -1007,6 +1138,68 @@ window.analyzeBooking = async (bookingId) => {
     }
 };
 
+let bookingsNextAfterId = null; // 🌟 مؤشر الصفحة التالية من ترويسة X-Next-After-Id
+let loadedBookingsCount = 0;
+
+function updateBookingsTitle() {
+    const suffix = bookingsNextAfterId ? '+' : '';
+    document.getElementById('bookings-title').textContent = `حجوزاتي المؤكدة (${loadedBookingsCount}${suffix})`;
+}
+
+function renderBookingCards(container, bookings) {
+    bookings.forEach(booking => {
+        const cardHtml = `
+            <div id="booking-card-${booking.id}" class="bg-white p-4 rounded-lg shadow-md border flex flex-col sm:flex-row items-start gap-4">
+                <img src="${booking.hotel_image_url || 'https://placehold.co/150x150'}" alt="${booking.hotel_name}" class="rounded-md w-full sm:w-24 h-24 object-cover">
+                <div class="flex-grow">
+                    <h4 class="text-xl font-bold">${booking.hotel_name}</h4>
+                    <p class="text-md text-gray-600">${booking.city}</p>
+                    <div class="text-sm text-gray-500 mt-2">
+                        <span><strong>الوصول:</strong> ${booking.check_in}</span> | <span><strong>المغادرة:</strong> ${booking.check_out}</span>
+                    </div>
+                </div>
+                <div class="flex flex-col items-end gap-2 self-stretch justify-between w-full sm:w-auto">
+                    <div class="text-2xl font-extrabold text-green-600">$${booking.price}</div>
+                    <div class="flex gap-2">
+                        <button class="bg-blue-100 text-blue-700 hover:bg-blue-200 text-xs font-bold py-2 px-3 rounded-lg" onclick="window.analyzeBooking(${booking.id})">تحليل AI</button>
+                        <button class="bg-red-100 text-red-700 hover:bg-red-200 text-xs font-bold py-2 px-3 rounded-lg" onclick="window.handleDeleteBooking(${booking.id})">إلغاء</button>
+                    </div>
+                </div>
+            </div>`;
+        container.insertAdjacentHTML('beforeend', cardHtml);
+    });
+}
+
+async function fetchBookingsPage(afterId = null) {
+    const url = afterId ? `${API_BASE_URL}/bookings?after_id=${afterId}` : `${API_BASE_URL}/bookings`;
+    const response = await fetch(url, { credentials: 'include' });
+    if (!response.ok) { throw new Error('فشل جلب الحجوزات'); }
+    bookingsNextAfterId = response.headers.get('X-Next-After-Id');
+    return await response.json();
+}
+
+function renderLoadMoreBookings(container) {
+    document.getElementById('bookings-load-more')?.remove();
+    if (!bookingsNextAfterId) return;
+    container.insertAdjacentHTML('beforeend', `
+        <button id="bookings-load-more" class="block mx-auto mt-2 text-sm font-bold brand-text py-2 px-4 rounded-lg border">
+            عرض حجوزات أقدم
+        </button>
+    `);
+    document.getElementById('bookings-load-more').addEventListener('click', async () => {
+        try {
+            const bookings = await fetchBookingsPage(bookingsNextAfterId);
+            loadedBookingsCount += bookings.length;
+            document.getElementById('bookings-load-more')?.remove();
+            renderBookingCards(container, bookings);
+            updateBookingsTitle();
+            renderLoadMoreBookings(container);
+        } catch (error) {
+            showToast(`❌ ${error.message}`, true);
+        }
+    });
+}
+
 async function fetchAndRenderBookings() {
     const container = document.getElementById('bookings-list');
     if (!container) return;
@@ -1018,11 +1211,10 @@ async function fetchAndRenderBookings() {
     }
 
     try {
-        const response = await fetch(`${API_BASE_URL}/bookings`, { credentials: 'include' });
-        if (!response.ok) { throw new Error('فشل جلب الحجوزات'); }
-        const bookings = await response.json();
-        
-        document.getElementById('bookings-title').textContent = `حجوزاتي المؤكدة (${bookings.length})`;
+        // 🌟 الصفحة الأولى فقط؛ الصفحات الأقدم تُطلب عند الحاجة
+        const bookings = await fetchBookingsPage();
+        loadedBookingsCount = bookings.length;
+        updateBookingsTitle();
         container.innerHTML = '';
 
         if (bookings.length === 0) {
@@ -1030,32 +1222,9 @@ async function fetchAndRenderBookings() {
             return;
         }
 
-        bookings.forEach(booking => {
-            const cardHtml = `
-                <div class="bg-white p-4 rounded-lg shadow-md border flex flex-col sm:flex-row items-start gap-4">
-                    <img src="${booking.hotel_image_url || 'https://placehold.co/150x150'}" alt="${booking.hotel_name}" class="rounded-md w-full sm:w-24 h-24 object-cover">
-                    <div class="flex-grow">
-                        <h4 class="text-xl font-bold">${booking.hotel_name}</h4>
-                        <p class="text-md text-gray-600">${booking.city}</p>
-                        <div class="text-sm text-gray-500 mt-2">
-                            <span><strong>الوصول:</strong> ${booking.check_in}</span> | <span><strong>المغادرة:</strong> ${booking.check_out}</span>
-                        </div>
-                    </div>
-                    <div class="flex flex-col items-end gap-2 self-stretch justify-between w-full sm:w-auto">
-                        <div class="text-2xl font-extrabold text-green-600">$${booking.price}</div>
-                        <div class="flex gap-2">
-                            <button class="bg-blue-100 text-blue-700 hover:bg-blue-200 text-xs font-bold py-2 px-3 rounded-lg" onclick="window.analyzeBooking(${booking.id})">تحليل AI</button>
-                            <button class="bg-red-100 text-red-700 hover:bg-red-200 text-xs font-bold py-2 px-3 rounded-lg" onclick="window.handleDeleteBooking(${booking.id})">إلغاء</button>
-                        </div>
-                    </div>
-                </div>`;
-            container.insertAdjacentHTML('beforeend', cardHtml);
-        });
+        renderBookingCards(container, bookings);
+        renderLoadMoreBookings(container);
     } catch (error) {
         container.innerHTML = `<p class="text-center text-red-500 mt-10">${error.message}</p>`;
     }
-<<<<<<< HEAD
-}
-=======
 }
->>>>>>> 9bd2d8d55bf9254d1298665f3a13d2fdb9312f0d
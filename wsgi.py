@@ -0,0 +1,10 @@
+"""نقطة دخول WSGI للإنتاج.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+التجهيز المسبق لـ Gemini يتم داخل كل عامل (post_worker_init في gunicorn.conf.py)
+لا هنا، لأن هذه الوحدة قد تُحمّل في العملية الرئيسية قبل fork (preload_app).
+"""
+from app import create_app
+
+app = create_app({"GEMINI_WARMUP": False})